@@ -0,0 +1,350 @@
+from backend import models, timeindex, storage as storage_backends
+from typing import Dict, Iterable, Iterator, List, Optional
+from bisect import bisect_right
+from datetime import datetime, timezone
+import argparse
+import json
+import logging
+import mmap
+import os
+import struct
+import time
+import zlib
+import orjson
+
+logger = logging.getLogger("nova-archive")
+
+# --- History Archives ---
+# Bulk export and import of a whole store (sessions, messages, summaries, threads, topics)
+# as one file of independently compressed JSONL chunks plus a footer index:
+#
+#   header frame | chunk 0 | chunk 1 | ... | footer frame (index JSON, index length, FOOTER_MAGIC)
+#
+# Each chunk holds up to NOVA_ARCHIVE_CHUNK_DOCUMENTS documents of one collection. The index
+# lists every chunk's collection, byte range, document count and the min/max of the
+# collection's ORDER_FIELDS, so readers can memory-map the file and decompress only the
+# chunks they need: one collection, a time range or the n-th document. Export and import
+# stream page by page and chunk by chunk, so memory is bounded by one page plus one chunk.
+#
+# Chunks are zstd frames (the `zstandard` package, listed in requirements.txt). Without it,
+# archives whose name doesn't end in .zst fall back to zlib, and writing a .zst archive fails
+# instead of producing a file zstd tools can't read; the codec is recorded in the index. The
+# header and footer are zstd skippable frames, so a zstd archive is also a plain .jsonl.zst
+# stream: `zstd -dc backup.jsonl.zst | jq ...`.
+ARCHIVE_VERSION = 1
+HEADER_MAGIC = b"NOVAARC1"
+FOOTER_MAGIC = b"NOVAIDX1"
+SKIPPABLE_FRAME = 0x184D2A50
+CHUNK_DOCUMENTS = int(os.environ.get("NOVA_ARCHIVE_CHUNK_DOCUMENTS", "5000"))
+ZSTD_LEVEL = 3
+ZLIB_LEVEL = 6
+# Firestore commits at most 500 writes at once; each imported message can add two time
+# bucket writes, so message batches stay well below that
+IMPORT_BATCH = 200
+ORDER_FIELDS = {
+    "sessions": "created_at",
+    "messages": "timestamp",
+    "summaries": "timestamp",
+    "threads": "updated_at",
+    "topic_sessions": "timestamp",
+}
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+def default_codec(path: Optional[str] = None) -> str:
+    if zstandard is not None:
+        return "zstd"
+    if path and path.endswith(".zst"):
+        raise RuntimeError(f"Writing {path} needs the zstandard package; install it or use a name without .zst for a zlib archive")
+    return "zlib"
+
+def _compress(codec: str, data: bytes) -> bytes:
+    if codec == "zstd":
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(data)
+    return zlib.compress(data, ZLIB_LEVEL)
+
+def _decompress(codec: str, data) -> bytes:
+    if codec == "zstd":
+        if zstandard is None:
+            raise RuntimeError("This archive is zstd-compressed; install the zstandard package to read it")
+        return zstandard.ZstdDecompressor().decompress(data)
+    return zlib.decompress(data)
+
+def _skippable_frame(payload: bytes) -> bytes:
+    return struct.pack("<II", SKIPPABLE_FRAME, len(payload)) + payload
+
+class ArchiveWriter:
+    """
+    Writes an archive sequentially (no seeking). The file appears at `path` only once
+    close() has written the index.
+    """
+    def __init__(self, path: str, codec: Optional[str] = None, chunk_documents: int = CHUNK_DOCUMENTS):
+        self.path = path
+        self.codec = codec or default_codec(path)
+        if self.codec == "zstd" and zstandard is None:
+            raise RuntimeError("The zstd codec needs the zstandard package")
+        self.chunk_documents = chunk_documents
+        self._tmp = f"{path}.{os.getpid()}.tmp"
+        self._file = open(self._tmp, "wb")
+        self._offset = 0
+        self._chunks: List[dict] = []
+        self._counts: Dict[str, int] = {}
+        self._collection: Optional[str] = None
+        self._lines: List[bytes] = []
+        self._range = [None, None]
+        self.index: Optional[dict] = None
+        self._write(_skippable_frame(HEADER_MAGIC))
+
+    def _write(self, data: bytes):
+        self._file.write(data)
+        self._offset += len(data)
+
+    def write(self, collection: str, doc: dict):
+        if collection != self._collection:
+            self._flush()
+            self._collection = collection
+        self._lines.append(orjson.dumps(doc))
+        field = ORDER_FIELDS.get(collection)
+        value = doc.get(field) if field else None
+        if value is not None:
+            low, high = self._range
+            self._range = [value if low is None or value < low else low, value if high is None or value > high else high]
+        if len(self._lines) >= self.chunk_documents:
+            self._flush()
+
+    def write_many(self, collection: str, docs: Iterable[dict]):
+        for doc in docs:
+            self.write(collection, doc)
+
+    def _flush(self):
+        if not self._lines:
+            return
+        raw = b"\n".join(self._lines) + b"\n"
+        data = _compress(self.codec, raw)
+        self._chunks.append({
+            "collection": self._collection,
+            "offset": self._offset,
+            "length": len(data),
+            "documents": len(self._lines),
+            "raw_bytes": len(raw),
+            "min": self._range[0],
+            "max": self._range[1],
+        })
+        self._counts[self._collection] = self._counts.get(self._collection, 0) + len(self._lines)
+        self._write(data)
+        self._lines = []
+        self._range = [None, None]
+
+    def close(self) -> dict:
+        """
+        Writes the footer index, moves the archive into place and returns the index.
+        """
+        if self.index is not None:
+            return self.index
+        self._flush()
+        index = {
+            "version": ARCHIVE_VERSION,
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "codec": self.codec,
+            "collections": self._counts,
+            "chunks": self._chunks,
+        }
+        body = orjson.dumps(index)
+        self._write(_skippable_frame(body + struct.pack("<I", len(body)) + FOOTER_MAGIC))
+        self._file.close()
+        os.replace(self._tmp, self.path)
+        self.index = index
+        return index
+
+    def abort(self):
+        self._file.close()
+        os.remove(self._tmp)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+        return False
+
+class ArchiveReader:
+    """
+    Random-access reader over a memory-mapped archive. Only the chunks that are read are
+    decompressed, and document() parses only the line it returns; the most recently
+    decompressed chunk is kept for sequential document() calls.
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, "rb")
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        header = _skippable_frame(HEADER_MAGIC)
+        if self._mmap[:len(header)] != header or self._mmap[-len(FOOTER_MAGIC):] != FOOTER_MAGIC:
+            self.close()
+            raise ValueError(f"{path} is not a Nova archive")
+        end = len(self._mmap) - len(FOOTER_MAGIC)
+        (length,) = struct.unpack("<I", self._mmap[end - 4:end])
+        self.index = orjson.loads(self._mmap[end - 4 - length:end - 4])
+        if self.index["version"] > ARCHIVE_VERSION:
+            self.close()
+            raise ValueError(f"{path} is archive version {self.index['version']}; this reader supports {ARCHIVE_VERSION}")
+        self.codec = self.index["codec"]
+        self.chunks = self.index["chunks"]
+        # Per collection: chunk numbers and the ordinal of each chunk's first document
+        self._by_collection: Dict[str, List[int]] = {}
+        self._starts: Dict[str, List[int]] = {}
+        for number, chunk in enumerate(self.chunks):
+            numbers = self._by_collection.setdefault(chunk["collection"], [])
+            starts = self._starts.setdefault(chunk["collection"], [])
+            starts.append(starts[-1] + self.chunks[numbers[-1]]["documents"] if numbers else 0)
+            numbers.append(number)
+        self._cached = (None, None)
+
+    @property
+    def collections(self) -> Dict[str, int]:
+        return dict(self.index["collections"])
+
+    def count(self, collection: str) -> int:
+        return self.index["collections"].get(collection, 0)
+
+    def _lines(self, number: int) -> List[bytes]:
+        if self._cached[0] != number:
+            chunk = self.chunks[number]
+            raw = _decompress(self.codec, self._mmap[chunk["offset"]:chunk["offset"] + chunk["length"]])
+            self._cached = (number, raw.splitlines())
+        return self._cached[1]
+
+    def read_chunk(self, number: int) -> List[dict]:
+        return [orjson.loads(line) for line in self._lines(number)]
+
+    def iter_documents(self, collection: str) -> Iterator[dict]:
+        for number in self._by_collection.get(collection, []):
+            yield from self.read_chunk(number)
+
+    def iter_chunks(self, collection: str) -> Iterator[List[dict]]:
+        for number in self._by_collection.get(collection, []):
+            yield self.read_chunk(number)
+
+    def document(self, collection: str, position: int) -> dict:
+        """
+        The document at `position` (0-based, export order) of `collection`.
+        """
+        if not 0 <= position < self.count(collection):
+            raise IndexError(f"{collection} has {self.count(collection)} documents")
+        starts = self._starts[collection]
+        slot = bisect_right(starts, position) - 1
+        return orjson.loads(self._lines(self._by_collection[collection][slot])[position - starts[slot]])
+
+    def iter_range(self, collection: str, start: Optional[str] = None, end: Optional[str] = None) -> Iterator[dict]:
+        """
+        Documents whose ORDER_FIELDS value is in [start, end), skipping chunks whose
+        min/max lie outside the range without decompressing them.
+        """
+        field = ORDER_FIELDS[collection]
+        for number in self._by_collection.get(collection, []):
+            chunk = self.chunks[number]
+            if chunk["max"] is None or (start and chunk["max"] < start) or (end and chunk["min"] >= end):
+                continue
+            for doc in self.read_chunk(number):
+                value = doc.get(field)
+                if value is not None and (not start or value >= start) and (not end or value < end):
+                    yield doc
+
+    def close(self):
+        self._cached = (None, None)
+        self._mmap.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+# --- Export / Import ---
+def _storage(storage):
+    if storage is not None:
+        return storage
+    from backend import firebase
+    return firebase.get_storage()
+
+def export_archive(path: str, collections: Iterable[str] = storage_backends.ARCHIVE_COLLECTIONS, storage=None, codec: Optional[str] = None) -> dict:
+    """
+    Streams the given collections of the store into an archive at `path`. Returns the index.
+    """
+    storage = _storage(storage)
+    start = time.monotonic()
+    with ArchiveWriter(path, codec=codec) as writer:
+        for collection in collections:
+            writer.write_many(collection, storage.export_documents(collection))
+    index = writer.index
+    logger.info(f"Exported {index['collections']} to {path} ({os.path.getsize(path)} bytes) in {time.monotonic() - start:.1f}s")
+    return index
+
+def import_archive(path: str, collections: Optional[Iterable[str]] = None, storage=None, batch_size: int = IMPORT_BATCH) -> Dict[str, int]:
+    """
+    Loads an archive into the store in batched writes, rebuilding the time buckets of the
+    imported messages. Returns the number of documents imported per collection.
+    """
+    storage = _storage(storage)
+    start = time.monotonic()
+    imported = {}
+    with ArchiveReader(path) as reader:
+        wanted = [c for c in storage_backends.ARCHIVE_COLLECTIONS if c in reader.collections and (collections is None or c in collections)]
+        for collection in wanted:
+            batch = []
+            for doc in reader.iter_documents(collection):
+                batch.append(doc)
+                if len(batch) >= batch_size:
+                    _import_batch(storage, collection, batch)
+                    batch = []
+            if batch:
+                _import_batch(storage, collection, batch)
+            imported[collection] = reader.count(collection)
+    if imported.get("messages"):
+        _invalidate_search_snapshot()
+    logger.info(f"Imported {imported} from {path} in {time.monotonic() - start:.1f}s")
+    return imported
+
+def _import_batch(storage, collection: str, docs: List[dict]):
+    storage.import_documents(collection, docs)
+    if collection == "messages":
+        storage.save_messages([], {}, timeindex.buckets_for([models.Message(**doc) for doc in docs]))
+
+def _invalidate_search_snapshot():
+    # Imported messages are older than the snapshot's watermark, so catch-up would miss them
+    from backend import search
+    path = search.snapshot_path()
+    if path and os.path.exists(path):
+        os.remove(path)
+        logger.info(f"Removed search snapshot {path}; the index is rebuilt on next start")
+
+def main():
+    parser = argparse.ArgumentParser(description="Export, import or inspect Nova history archives.")
+    parser.add_argument("command", choices=("export", "import", "info"))
+    parser.add_argument("path")
+    parser.add_argument("--collections", help="comma-separated subset of " + ", ".join(storage_backends.ARCHIVE_COLLECTIONS))
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    collections = args.collections.split(",") if args.collections else None
+    if args.command == "export":
+        export_archive(args.path, collections or storage_backends.ARCHIVE_COLLECTIONS)
+    elif args.command == "import":
+        print(json.dumps(import_archive(args.path, collections)))
+    else:
+        with ArchiveReader(args.path) as reader:
+            index = dict(reader.index)
+            chunks = index.pop("chunks")
+            index["chunks"] = len(chunks)
+            index["bytes"] = os.path.getsize(args.path)
+            index["raw_bytes"] = sum(chunk["raw_bytes"] for chunk in chunks)
+            print(json.dumps(index, indent=2))
+
+if __name__ == "__main__":
+    main()
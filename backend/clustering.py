@@ -0,0 +1,202 @@
+from backend import models, retrieval
+from typing import List, Optional
+from collections import Counter, OrderedDict
+from datetime import datetime, timedelta, timezone
+import logging
+import os
+import threading
+import numpy as np
+
+logger = logging.getLogger("nova-clustering")
+
+# --- Online Topic Clustering ---
+# Each session keeps one centroid per thread. A new message joins the most similar thread
+# when the cosine similarity clears CLUSTER_SIMILARITY, otherwise it starts a new thread.
+# Thread ids are never reused, so /threads/cluster keeps thread identity stable.
+CLUSTER_SIMILARITY = float(os.environ.get("NOVA_CLUSTER_SIMILARITY", "0.25"))
+# Gemini relabels a thread only when it has grown by this factor since its last label
+RELABEL_GROWTH = 2
+RELABEL_MIN_MESSAGES = 4
+# Sessions whose cluster state stays in memory (least recently used are dropped and reloaded
+# from their stored threads on next use)
+CLUSTER_SESSIONS = int(os.environ.get("NOVA_CLUSTER_SESSIONS", "256"))
+CATCHUP_MARGIN = timedelta(minutes=10)
+
+_STOPWORDS = {
+    "the", "a", "an", "and", "or", "but", "to", "of", "in", "on", "for", "with", "is", "are", "was",
+    "were", "be", "it", "its", "this", "that", "i", "you", "me", "my", "your", "we", "so", "do", "did",
+    "have", "has", "had", "at", "as", "about", "just", "what", "how", "not", "no", "yes", "can", "im",
+    "i'm", "it's", "don't", "nova",
+}
+
+def keyword_label(messages: List[models.Message]) -> str:
+    """
+    Cheap local label: the most frequent non-stopword token in the thread.
+    """
+    counts = Counter(
+        token for m in messages for token in retrieval.tokenize(m.text)
+        if token not in _STOPWORDS and len(token) > 2
+    )
+    return counts.most_common(1)[0][0] if counts else "general"
+
+class ThreadState:
+    def __init__(self, thread: models.Thread, centroid: np.ndarray, labeled_size: int):
+        self.thread = thread
+        self.centroid = centroid
+        self.labeled_size = labeled_size
+
+class SessionClusters:
+    def __init__(self, session_id: str):
+        self.session_id = session_id
+        self.threads: List[ThreadState] = []
+        self.assigned = set()
+        self.next_idx = 0
+        # Newest clustered message timestamp; cluster_session reads only messages after it
+        self.watermark: Optional[str] = None
+        self.loaded = False
+        self.lock = threading.Lock()
+
+def _snapshot(ts: ThreadState) -> models.Thread:
+    return ts.thread.model_copy(update={"messages": list(ts.thread.messages)})
+
+class ClusteringEngine:
+    """
+    Assigns messages to per-session topic threads incrementally. Session state is rebuilt
+    from the stored threads the first time a session is seen by this process, and the
+    CLUSTER_SESSIONS most recently used sessions are kept. Each session has its own lock;
+    Gemini relabeling runs outside it.
+    """
+    def __init__(self, max_sessions: int = CLUSTER_SESSIONS):
+        self._lock = threading.Lock()
+        self._sessions: "OrderedDict[str, SessionClusters]" = OrderedDict()
+        self.max_sessions = max_sessions
+
+    def _embed(self, messages: List[models.Message]) -> np.ndarray:
+        return retrieval.store.embedder.embed([m.text for m in messages])
+
+    def _load(self, state: SessionClusters):
+        from backend import firebase
+        for thread in sorted(firebase.get_threads_by_session(state.session_id), key=lambda t: t.thread_id):
+            centroid = self._embed(thread.messages).sum(axis=0) if thread.messages else np.zeros(retrieval.store.embedder.dim, dtype=np.float32)
+            state.threads.append(ThreadState(thread, centroid, len(thread.messages)))
+            state.assigned.update(m.message_id for m in thread.messages)
+            state.watermark = max([state.watermark or ""] + [m.timestamp for m in thread.messages]) or None
+            suffix = thread.thread_id.rsplit("-", 1)[-1]
+            if suffix.isdigit():
+                state.next_idx = max(state.next_idx, int(suffix) + 1)
+        state.loaded = True
+
+    def state(self, session_id: str) -> SessionClusters:
+        """
+        The session's loaded state, marked most recently used.
+        """
+        with self._lock:
+            state = self._sessions.get(session_id)
+            if state is None:
+                state = self._sessions[session_id] = SessionClusters(session_id)
+                # Sessions being clustered right now are never evicted
+                for idle in [sid for sid, s in self._sessions.items() if not s.lock.locked()]:
+                    if len(self._sessions) <= self.max_sessions:
+                        break
+                    if idle != session_id:
+                        del self._sessions[idle]
+            else:
+                self._sessions.move_to_end(session_id)
+        with state.lock:
+            if not state.loaded:
+                self._load(state)
+        return state
+
+    def assign(self, session_id: str, messages: List[models.Message]) -> List[models.Thread]:
+        """
+        Assigns messages not yet clustered to threads and returns the threads that changed.
+        """
+        state = self.state(session_id)
+        with state.lock:
+            new = [m for m in messages if m.message_id not in state.assigned and m.text]
+            if not new:
+                return []
+            now = datetime.now(timezone.utc).isoformat()
+            changed = {}
+            for message, vector in zip(new, self._embed(new)):
+                best, best_score = None, CLUSTER_SIMILARITY
+                for ts in state.threads:
+                    norm = np.linalg.norm(ts.centroid)
+                    score = float(vector @ ts.centroid / norm) if norm else 0.0
+                    if score >= best_score:
+                        best, best_score = ts, score
+                if best is None:
+                    thread = models.Thread(
+                        thread_id=f"{session_id}-thread-{state.next_idx}",
+                        session_id=session_id,
+                        topic="",
+                        messages=[],
+                        created_at=now,
+                        updated_at=now,
+                    )
+                    state.next_idx += 1
+                    best = ThreadState(thread, np.zeros_like(vector), 0)
+                    state.threads.append(best)
+                best.thread.messages.append(message)
+                best.thread.updated_at = now
+                best.centroid = best.centroid + vector
+                state.assigned.add(message.message_id)
+                state.watermark = max(state.watermark or "", message.timestamp)
+                changed[best.thread.thread_id] = best
+            relabel = [(ts, list(ts.thread.messages)) for ts in changed.values() if self._needs_label(ts)]
+        for ts, thread_messages in relabel:
+            from backend import llm
+            topic = llm.gemini_label_topic(thread_messages)
+            if topic:
+                with state.lock:
+                    ts.thread.topic = topic
+        with state.lock:
+            return [_snapshot(ts) for ts in changed.values()]
+
+    def _needs_label(self, ts: ThreadState) -> bool:
+        """
+        Gives a new thread its keyword label and claims a Gemini relabel (called with the
+        session lock held) when the thread has grown enough since its last one.
+        """
+        size = len(ts.thread.messages)
+        if not ts.thread.topic:
+            ts.thread.topic = keyword_label(ts.thread.messages)
+        if size >= RELABEL_MIN_MESSAGES and size >= ts.labeled_size * RELABEL_GROWTH:
+            ts.labeled_size = size
+            return True
+        return False
+
+    def threads(self, session_id: str) -> List[models.Thread]:
+        with self._lock:
+            state = self._sessions.get(session_id)
+        if state is None:
+            return []
+        with state.lock:
+            return [_snapshot(ts) for ts in state.threads]
+
+engine = ClusteringEngine()
+
+def _new_messages(session_id: str, watermark: Optional[str]) -> List[models.Message]:
+    from backend import firebase
+    if watermark is None:
+        return firebase.get_messages(session_id=session_id)
+    # Messages can be saved slightly out of timestamp order; already assigned ones are skipped
+    after = (datetime.fromisoformat(watermark) - CATCHUP_MARGIN).isoformat(timespec="microseconds")
+    messages = []
+    while True:
+        page = list(firebase.iter_messages_page(session_id, limit=firebase.MAX_MESSAGE_PAGE_SIZE, after=after))
+        messages += page
+        if len(page) < firebase.MAX_MESSAGE_PAGE_SIZE:
+            return messages
+        after = page[-1].timestamp
+
+def cluster_session(session_id: str) -> List[models.Thread]:
+    """
+    Clusters the session's messages newer than its watermark, persists only the changed
+    threads, and returns all of the session's threads.
+    """
+    from backend import firebase
+    messages = _new_messages(session_id, engine.state(session_id).watermark)
+    for thread in engine.assign(session_id, messages):
+        firebase.save_thread(thread)
+    return engine.threads(session_id)
@@ -0,0 +1,156 @@
+from backend import metrics
+from typing import Optional, Sequence
+from functools import lru_cache
+import os
+import re
+
+# --- Prompt Context Assembly ---
+# Packs the pieces of a Groq prompt into a token budget so long sessions never overflow
+# the model window. Token counts are a fast local estimate (no tokenizer download) and are
+# memoized per text, so re-assembling a prompt from mostly unchanged history is cheap.
+MODEL_CONTEXT_TOKENS = int(os.environ.get("NOVA_MODEL_CONTEXT_TOKENS", "8192"))
+REPLY_TOKENS = 256
+SAFETY_MARGIN_TOKENS = 256
+PROMPT_TOKEN_BUDGET = int(os.environ.get("NOVA_PROMPT_TOKEN_BUDGET", "0"))
+# The newest turns are packed before anything else except the user's message
+MIN_RECENT_TURNS = 4
+
+_TOKEN_RE = re.compile(r"\w+|[^\w\s]")
+SUMMARY_HEADER = "Summary of earlier conversation:"
+RETRIEVED_HEADER = "Relevant earlier messages:"
+
+@lru_cache(maxsize=16384)
+def count_tokens(text: str) -> int:
+    """
+    Estimates llama-style token count: words and punctuation marks, with long words
+    counted as several pieces, scaled by 5/4 so the estimate errs on the high side.
+    """
+    return (sum(1 + len(piece) // 8 for piece in _TOKEN_RE.findall(text)) * 5 + 3) // 4
+
+def default_budget(system_prompt: str = "") -> int:
+    """
+    Tokens available for the user prompt once the system prompt and reply are reserved.
+    """
+    if PROMPT_TOKEN_BUDGET:
+        return PROMPT_TOKEN_BUDGET
+    return MODEL_CONTEXT_TOKENS - REPLY_TOKENS - SAFETY_MARGIN_TOKENS - count_tokens(system_prompt)
+
+def _truncate(text: str, tokens: int) -> str:
+    """
+    Keeps roughly the first `tokens` tokens of text (used for a single oversized item).
+    """
+    if tokens <= 0:
+        return ""
+    if count_tokens(text) <= tokens:
+        return text
+    # One piece is left for the ellipsis
+    limit = tokens * 4 // 5 - 1
+    if limit <= 0:
+        return ""
+    used = 0
+    for piece in _TOKEN_RE.finditer(text):
+        used += 1 + len(piece.group()) // 8
+        if used > limit:
+            return text[:piece.start()].rstrip() + " …"
+    return text
+
+def _turn(item) -> tuple:
+    """
+    Normalizes a history entry (models.Message or a local_history dict) to (id, speaker line).
+    """
+    if isinstance(item, dict):
+        text, mood, message_id = item.get("text", ""), item.get("mood", "user"), item.get("message_id")
+    else:
+        text, mood, message_id = item.text, getattr(item, "mood", "user"), getattr(item, "message_id", None)
+    line = f"User: {text}" if (mood or "user") == "user" else f"Nova: {text}"
+    return message_id or line, line
+
+def without_pending_message(history: Sequence, user_message: str) -> list:
+    """
+    Drops the last history entry when it is the user message being sent, since clients
+    usually append it to their local history before posting.
+    """
+    history = list(history)
+    if history:
+        _, line = _turn(history[-1])
+        if line == f"User: {user_message}":
+            return history[:-1]
+    return history
+
+@metrics.timed("prompt.assemble")
+def assemble_prompt(
+    user_message: str,
+    history: Sequence = (),
+    retrieved: Sequence = (),
+    summaries: Sequence[str] = (),
+    quoted_text: Optional[str] = None,
+    budget: Optional[int] = None,
+) -> str:
+    """
+    Builds the Groq user prompt within `budget` tokens. Packing priority:
+    1. the user's message, 2. quoted text, 3. the newest MIN_RECENT_TURNS turns,
+    4. retrieved messages (most relevant first), 5. session summary bullets,
+    6. older turns, newest first. Sections are then rendered in reading order.
+    """
+    budget = default_budget() if budget is None else budget
+    user_line = f"User: {user_message}"
+    user_line = _truncate(user_line, budget)
+    remaining = budget - count_tokens(user_line)
+
+    quoted_line = ""
+    if quoted_text:
+        quoted_line = _truncate(f'Replying to: "{quoted_text}"', min(remaining, budget // 4))
+        remaining -= count_tokens(quoted_line)
+
+    turns = [_turn(item) for item in history]
+    seen = {key for key, _ in turns}
+    recent_keep = []
+    older_keep = []
+    retrieved_keep = []
+    summary_keep = []
+
+    def take(line: str, header: str = "") -> bool:
+        nonlocal remaining
+        cost = count_tokens(line) + 1
+        if header:
+            # The first line of a section also pays for its header
+            cost += count_tokens(header) + 1
+        if cost > remaining:
+            return False
+        remaining -= cost
+        return True
+
+    split = max(0, len(turns) - MIN_RECENT_TURNS)
+    for index in range(len(turns) - 1, split - 1, -1):
+        if not take(turns[index][1]):
+            break
+        recent_keep.append(index)
+    for item in retrieved:
+        key, line = _turn(item)
+        if key in seen:
+            continue
+        seen.add(key)
+        if take(line, "" if retrieved_keep else RETRIEVED_HEADER):
+            retrieved_keep.append(line)
+    for bullet in summaries:
+        line = f"- {bullet}"
+        if take(line, "" if summary_keep else SUMMARY_HEADER):
+            summary_keep.append(line)
+    if len(recent_keep) == len(turns) - split:
+        for index in range(split - 1, -1, -1):
+            if not take(turns[index][1]):
+                break
+            older_keep.append(index)
+
+    sections = []
+    if summary_keep:
+        sections.append(SUMMARY_HEADER + "\n" + "\n".join(summary_keep))
+    if retrieved_keep:
+        sections.append(RETRIEVED_HEADER + "\n" + "\n".join(retrieved_keep))
+    kept = sorted(recent_keep + older_keep)
+    if kept:
+        sections.append("\n".join(turns[i][1] for i in kept))
+    if quoted_line:
+        sections.append(quoted_line)
+    sections.append(user_line)
+    return "\n".join(sections)
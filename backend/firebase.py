@@ -1,82 +1,272 @@
-from backend import models
+from backend import models, retrieval, search, jobs, metrics, timeindex, storage as storage_backends
 from typing import List, Optional
+from collections import OrderedDict, deque
 import uuid
 import os
 import logging
+import threading
+import time
 from dotenv import load_dotenv
 from datetime import datetime, timezone
-import firebase_admin
-from firebase_admin import credentials, firestore
 
 load_dotenv()
 
 # --- Topic Logic ---
+# Session summaries live in /topics/{topic}/sessions/{session_id}. Keying by session_id makes
+# re-analysis of a session an idempotent overwrite, and each upsert is a blind O(1) batch write
+# (no read-modify-write of a growing array), so concurrent workers cannot clobber each other.
 def upsert_topic_session_summary(topic: str, session_id: str, summary: list, timestamp: str, message_ids: list):
     """
-    Upserts a topic document in /topics/{topic} with a new session summary.
-    If the topic exists, appends to the sessions array. If not, creates it.
+    Upserts /topics/{topic} and its /sessions/{session_id} summary document in one batch.
     Each session summary includes session_id, summary, timestamp, message_ids.
     """
-    topic_ref = db.collection("topics").document(topic)
-    doc = topic_ref.get()
-    session_obj = {
-        "session_id": session_id,
-        "summary": summary,
-        "timestamp": timestamp,
-        "message_ids": message_ids or [],
-    }
-    if doc.exists:
-        data = doc.to_dict()
-        sessions = data.get("sessions", [])
-        # Prevent duplicate session summaries
-        if not any(s["session_id"] == session_id for s in sessions):
-            sessions.append(session_obj)
-            topic_ref.update({"sessions": sessions})
-            logger.info(f"Appended session summary to topic '{topic}' for session {session_id}")
-    else:
-        topic_ref.set({
-            "topic": topic,
-            "sessions": [session_obj]
-        })
-        logger.info(f"Created topic '{topic}' with first session summary {session_id}")
+    session_obj = models.TopicSession(
+        session_id=session_id,
+        summary=summary,
+        timestamp=timestamp,
+        message_ids=message_ids or [],
+    )
+    get_storage().upsert_topic_session(topic, session_obj.model_dump())
+    logger.debug("Upserted session summary %s under topic '%s'", session_id, topic)
+
+def get_topic_sessions(topic: str, limit: int = 20, before: Optional[str] = None) -> List[models.TopicSession]:
+    """
+    Returns one page of a topic's session summaries, newest first. Pass the oldest
+    timestamp of the previous page as `before` to continue.
+    """
+    sessions = [models.TopicSession(**doc) for doc in get_storage().query_topic_sessions(topic, limit, before=before)]
+    logger.debug("Fetched %d session summaries for topic '%s'", len(sessions), topic)
+    return sessions
+
+def migrate_legacy_topic_sessions() -> int:
+    """
+    Moves session summaries stored in the old embedded `sessions` array of each topic
+    document into the sessions subcollection. Safe to re-run. Returns the number moved.
+    """
+    return get_storage().migrate_legacy_topics()
 
 # --- Logging Setup ---
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("nova-firebase")
 
-# Read credentials path from environment variables
-cred_path = os.environ.get("YOUR_FIREBASE_CREDENTIALS_JSON")
-if not firebase_admin._apps:
-    cred = credentials.Certificate(cred_path)
-    firebase_admin.initialize_app(cred)
-db = firestore.client()
+# Raw reads and writes go through the configured storage backend (Firestore by default;
+# see backend/storage.py). Firestore credentials are read from YOUR_FIREBASE_CREDENTIALS_JSON.
+# Every backend call is timed as a storage.<method> span (see backend/metrics.py). Per-call
+# logs are at debug level with lazy arguments, so they cost nothing on the hot path unless enabled.
+# The backend (and with it the Firebase SDK) is created on first use or by the app's background
+# warmup, so importing this module stays cheap.
+_storage = None
+_storage_lock = threading.Lock()
+
+def get_storage() -> storage_backends.Storage:
+    global _storage
+    if _storage is None:
+        with _storage_lock:
+            if _storage is None:
+                _storage = metrics.Traced(storage_backends.create_storage(), "storage")
+    return _storage
 
 SESSION_TIMEOUT_HOURS = 2
 
+# --- Session / Message Cache ---
+# Write-through cache in front of Firestore for the active session and a bounded ring of
+# recent messages per session. Entries expire after a TTL so other workers' writes are
+# picked up eventually; sessions beyond MESSAGE_CACHE_MAX_SESSIONS are evicted LRU-first.
+SESSION_CACHE_TTL_SECONDS = int(os.environ.get("NOVA_SESSION_CACHE_TTL", "30"))
+MESSAGE_CACHE_TTL_SECONDS = int(os.environ.get("NOVA_MESSAGE_CACHE_TTL", "300"))
+MESSAGE_CACHE_MAX_SESSIONS = int(os.environ.get("NOVA_MESSAGE_CACHE_MAX_SESSIONS", "256"))
+RECENT_MESSAGES_PER_SESSION = int(os.environ.get("NOVA_RECENT_MESSAGES_PER_SESSION", "200"))
+
+class SessionCache:
+    """
+    Holds the active session and per-session recent message rings.
+    A ring is marked complete when it is known to hold the whole session
+    (a session created here, or one loaded in full that fit in the ring).
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._active = None
+        self._active_expires = 0.0
+        self._rings = OrderedDict()
+        self.stats = {"session_hits": 0, "session_misses": 0, "message_hits": 0, "message_misses": 0}
+
+    def get_active(self) -> Optional[models.Session]:
+        with self._lock:
+            if self._active is not None and time.monotonic() < self._active_expires:
+                self.stats["session_hits"] += 1
+                return self._active
+            self.stats["session_misses"] += 1
+            return None
+
+    def set_active(self, session: models.Session):
+        with self._lock:
+            self._active = session
+            self._active_expires = time.monotonic() + SESSION_CACHE_TTL_SECONDS
+
+    def touch(self, session_id: str, last_activity: str):
+        with self._lock:
+            if self._active is not None and self._active.session_id == session_id:
+                self._active = self._active.model_copy(update={"last_activity": last_activity})
+
+    def start_ring(self, session_id: str, messages: List[models.Message] = (), complete: bool = True):
+        with self._lock:
+            ring = deque(messages, maxlen=RECENT_MESSAGES_PER_SESSION)
+            complete = complete and len(messages) <= RECENT_MESSAGES_PER_SESSION
+            self._rings[session_id] = [ring, complete, time.monotonic() + MESSAGE_CACHE_TTL_SECONDS]
+            self._rings.move_to_end(session_id)
+            while len(self._rings) > MESSAGE_CACHE_MAX_SESSIONS:
+                self._rings.popitem(last=False)
+
+    def append(self, message: models.Message):
+        with self._lock:
+            entry = self._rings.get(message.session_id)
+            if entry is None:
+                return
+            ring = entry[0]
+            if len(ring) == ring.maxlen:
+                entry[1] = False
+            ring.append(message)
+            self._rings.move_to_end(message.session_id)
+
+    def get_messages(self, session_id: str, limit: Optional[int] = None) -> Optional[List[models.Message]]:
+        """
+        Returns cached messages for a session, or None on a miss. Without a limit the ring must
+        hold the whole session; with one, it must be complete or hold at least `limit` messages.
+        """
+        with self._lock:
+            entry = self._rings.get(session_id)
+            if entry is not None and time.monotonic() >= entry[2]:
+                del self._rings[session_id]
+                entry = None
+            if entry is None or not (entry[1] or (limit is not None and len(entry[0]) >= limit)):
+                self.stats["message_misses"] += 1
+                return None
+            self._rings.move_to_end(session_id)
+            self.stats["message_hits"] += 1
+            messages = list(entry[0])
+            return messages[-limit:] if limit is not None else messages
+
+    def clear(self):
+        with self._lock:
+            self._active = None
+            self._rings.clear()
+
+session_cache = SessionCache()
+
+# --- Message-by-id Cache ---
+# Shared id-keyed LRU for hydrating message-id references (e.g. threads). Saved and loaded
+# messages are written through, so hydrating recent threads rarely needs a read at all.
+MESSAGE_ID_CACHE_SIZE = int(os.environ.get("NOVA_MESSAGE_ID_CACHE_SIZE", "20000"))
+
+class MessageCache:
+    def __init__(self, size: int = MESSAGE_ID_CACHE_SIZE):
+        self.size = size
+        self._lock = threading.Lock()
+        self._messages = OrderedDict()
+        self.stats = {"id_hits": 0, "id_misses": 0}
+
+    def get_many(self, message_ids: List[str]) -> dict:
+        found = {}
+        with self._lock:
+            for message_id in message_ids:
+                message = self._messages.get(message_id)
+                if message is None:
+                    self.stats["id_misses"] += 1
+                    continue
+                self._messages.move_to_end(message_id)
+                found[message_id] = message
+                self.stats["id_hits"] += 1
+        return found
+
+    def put_many(self, messages: List[models.Message]):
+        with self._lock:
+            for message in messages:
+                self._messages[message.message_id] = message
+                self._messages.move_to_end(message.message_id)
+            while len(self._messages) > self.size:
+                self._messages.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._messages.clear()
+
+message_cache = MessageCache()
+
+def get_cache_stats() -> dict:
+    """
+    Returns hit/miss counters for the session, recent-message and message-by-id caches.
+    """
+    return {**session_cache.stats, **message_cache.stats}
+
+# --- Activity Coalescing ---
+# Optional: with NOVA_ACTIVITY_COALESCE_MS > 0, last_activity bumps are buffered and flushed
+# as one batch per interval, so concurrent turns on the same session cost a single write.
+ACTIVITY_COALESCE_MS = int(os.environ.get("NOVA_ACTIVITY_COALESCE_MS", "0"))
+
+class ActivityCoalescer:
+    """
+    Merges last_activity updates per session and flushes the newest timestamp of each
+    from a background thread every `interval` seconds.
+    """
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def bump(self, session_id: str, timestamp: str):
+        with self._lock:
+            if timestamp > self._pending.get(session_id, ""):
+                self._pending[session_id] = timestamp
+
+    def flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return
+        try:
+            get_storage().update_session_activity(pending)
+        except Exception as e:
+            logger.error(f"Failed to flush last_activity for {len(pending)} sessions: {e}")
+
+    def _run(self):
+        while not self._wake.wait(self.interval):
+            self.flush()
+
+activity_coalescer = ActivityCoalescer(ACTIVITY_COALESCE_MS / 1000) if ACTIVITY_COALESCE_MS > 0 else None
+
 # --- Session Logic ---
 def get_active_session() -> models.Session:
     """
     Returns the most recent active session (within SESSION_TIMEOUT_HOURS), or creates a new one.
     Always uses UTC for timestamps. Logs session creation and retrieval.
+    Served from the session cache when possible, so the hot path does no Firestore reads.
     """
-    sessions_ref = db.collection("sessions").order_by("last_activity", direction=firestore.Query.DESCENDING).limit(1)
-    docs = list(sessions_ref.stream())
     now = datetime.now(timezone.utc)
-    if docs:
-        session = docs[0].to_dict()
+    cached = session_cache.get_active()
+    if cached is not None:
+        last_activity = datetime.fromisoformat(cached.last_activity)
+        if (now - last_activity).total_seconds() / 3600 < SESSION_TIMEOUT_HOURS:
+            return cached
+    session = get_storage().latest_session()
+    if session:
         last_activity = datetime.fromisoformat(session["last_activity"])
         diff_hours = (now - last_activity).total_seconds() / 3600
         if diff_hours < SESSION_TIMEOUT_HOURS:
-            logger.info(f"Returning active session {session['session_id']} (last activity {last_activity}, {diff_hours:.2f}h ago)")
-            return models.Session(**session)
+            logger.debug("Returning active session %s (last activity %s, %.2fh ago)", session['session_id'], last_activity, diff_hours)
+            # Sessions first seen through an activity bump have no created_at
+            session_obj = models.Session(**{"created_at": session["last_activity"], **session})
+            session_cache.set_active(session_obj)
+            return session_obj
         else:
             logger.info(f"Session {session['session_id']} expired ({diff_hours:.2f}h since last activity). Creating new session.")
-            # Analyze the just-ended session for topic summaries
+            # Queue topic analysis of the just-ended session; the job workers run it off the request path
             try:
-                from backend import llm
-                llm.gemini_analyze_session_topics(session["session_id"])
+                jobs.enqueue("analyze_session", {"session_id": session["session_id"]}, key=f"analyze_session:{session['session_id']}")
             except Exception as e:
-                logger.error(f"Failed to analyze session topics for session {session['session_id']}: {e}")
+                logger.error(f"Failed to enqueue topic analysis for session {session['session_id']}: {e}")
     # Create new session
     session_id = str(uuid.uuid4())
     session_obj = models.Session(
@@ -84,7 +274,10 @@ def get_active_session() -> models.Session:
         created_at=now.isoformat(),
         last_activity=now.isoformat(),
     )
-    db.collection("sessions").document(session_id).set(session_obj.model_dump())
+    get_storage().create_session(session_obj.model_dump())
+    session_cache.set_active(session_obj)
+    session_cache.start_ring(session_id)
+    retrieval.store.mark_loaded(session_id)
     logger.info(f"Created new session {session_id} at {now.isoformat()}")
     return session_obj
 
@@ -93,26 +286,88 @@ def update_session_activity(session_id: str):
     Updates the last_activity timestamp for a session to now (UTC ISO format).
     """
     now = datetime.now(timezone.utc).isoformat()
-    db.collection("sessions").document(session_id).update({"last_activity": now})
-    logger.info(f"Updated session {session_id} last_activity to {now}")
+    if activity_coalescer is not None:
+        activity_coalescer.bump(session_id, now)
+    else:
+        get_storage().update_session_activity({session_id: now})
+    session_cache.touch(session_id, now)
+    logger.debug("Updated session %s last_activity to %s", session_id, now)
 
 # --- Message Logic ---
 def get_messages(session_id: Optional[str] = None) -> List[models.Message]:
     """
     Returns all messages for a session (chronological), or all messages if session_id is None.
+    Per-session reads are served from the message cache when it holds the whole session.
     """
     if session_id:
-        msgs_ref = db.collection("messages").where("session_id", "==", session_id).order_by("timestamp")
-    else:
-        msgs_ref = db.collection("messages").order_by("timestamp")
-    messages = [models.Message(**doc.to_dict()) for doc in msgs_ref.stream()]
-    logger.info(f"Fetched {len(messages)} messages for session {session_id}")
+        cached = session_cache.get_messages(session_id)
+        if cached is not None:
+            return cached
+    messages = [models.Message(**doc) for doc in get_storage().query_messages(session_id=session_id)]
+    if session_id:
+        session_cache.start_ring(session_id, messages)
+        message_cache.put_many(messages)
+    logger.debug("Fetched %d messages for session %s", len(messages), session_id)
     return messages
 
-def save_message(msg: models.MessageCreate) -> models.Message:
+MESSAGE_PAGE_SIZE = 100
+MAX_MESSAGE_PAGE_SIZE = 1000
+
+def iter_messages_page(
+    session_id: Optional[str] = None,
+    limit: int = MESSAGE_PAGE_SIZE,
+    before: Optional[str] = None,
+    after: Optional[str] = None,
+):
     """
-    Saves a message to Firestore, ensuring session is valid and last_activity is updated.
-    Returns the saved Message object.
+    Yields one page of messages in chronological order using timestamp cursors.
+    - after: the `limit` oldest messages newer than this timestamp (incremental "since" sync)
+    - before: the `limit` newest messages older than this timestamp (scroll-back)
+    - neither: the `limit` newest messages
+    Pages are served from the message cache when it holds the whole session.
+    """
+    limit = max(1, min(limit, MAX_MESSAGE_PAGE_SIZE))
+    if session_id:
+        cached = session_cache.get_messages(session_id)
+        if cached is not None:
+            if after:
+                yield from [m for m in cached if m.timestamp > after][:limit]
+            else:
+                yield from [m for m in cached if not before or m.timestamp < before][-limit:]
+            return
+    if after:
+        for doc in get_storage().query_messages(session_id=session_id, limit=limit, after=after):
+            yield models.Message(**doc)
+        return
+    page = [models.Message(**doc) for doc in get_storage().query_messages(session_id=session_id, limit=limit, before=before, descending=True)]
+    yield from reversed(page)
+
+def get_messages_page(
+    session_id: Optional[str] = None,
+    limit: int = MESSAGE_PAGE_SIZE,
+    before: Optional[str] = None,
+    after: Optional[str] = None,
+) -> List[models.Message]:
+    """
+    List form of iter_messages_page.
+    """
+    messages = list(iter_messages_page(session_id=session_id, limit=limit, before=before, after=after))
+    logger.debug("Fetched page of %d messages for session %s (before=%s, after=%s)", len(messages), session_id, before, after)
+    return messages
+
+def get_recent_messages(session_id: str, limit: int = 20) -> List[models.Message]:
+    """
+    Returns up to `limit` of the newest messages of a session (chronological), from the cache when warm.
+    """
+    cached = session_cache.get_messages(session_id, limit=limit)
+    if cached is not None:
+        return cached
+    return get_messages(session_id=session_id)[-limit:]
+
+def new_message(msg: models.MessageCreate) -> models.Message:
+    """
+    Builds a Message (id, session, UTC timestamp) from a MessageCreate without writing it.
+    Pair with save_messages_batch to persist several messages in one round trip.
     """
     # Determine session
     if msg.session_id:
@@ -120,49 +375,214 @@ def save_message(msg: models.MessageCreate) -> models.Message:
     else:
         session = get_active_session()
         session_id = session.session_id
-    now = datetime.now(timezone.utc).isoformat()
-    message_id = str(uuid.uuid4())
-    message = models.Message(
-        message_id=message_id,
+    return models.Message(
+        message_id=str(uuid.uuid4()),
         session_id=session_id,
         text=msg.text,
         quoted_reply_to=msg.quoted_reply_to,
         quoted_text=msg.quoted_text,
-        timestamp=now,
+        timestamp=datetime.now(timezone.utc).isoformat(),
         tags=msg.tags or [],
         mood=msg.mood or "user",
     )
-    db.collection("messages").document(message_id).set(message.model_dump())
-    update_session_activity(session_id)
-    logger.info(f"Saved message {message_id} to session {session_id} at {now}")
+
+def save_messages_batch(messages: List[models.Message]) -> List[models.Message]:
+    """
+    Writes messages plus one last_activity bump per session and their time bucket entries
+    in a single atomic batch. When activity coalescing is enabled the bump is handed to the
+    coalescer instead.
+    """
+    if not messages:
+        return []
+    latest = {}
+    for message in messages:
+        latest[message.session_id] = max(latest.get(message.session_id, ""), message.timestamp)
+    get_storage().save_messages(
+        [m.model_dump() for m in messages],
+        latest if activity_coalescer is None else {},
+        timeindex.buckets_for(messages),
+    )
+    for session_id, timestamp in latest.items():
+        if activity_coalescer is not None:
+            activity_coalescer.bump(session_id, timestamp)
+        session_cache.touch(session_id, timestamp)
+    for message in messages:
+        session_cache.append(message)
+    message_cache.put_many(messages)
+    retrieval.index_messages(messages)
+    search.index_messages(messages)
+    logger.debug("Saved %d messages in one batch to sessions %s", len(messages), list(latest))
+    return messages
+
+def get_messages_by_ids(message_ids: List[str]) -> List[models.Message]:
+    """
+    Returns the messages for `message_ids` in the given order, skipping ids that no longer
+    exist. Cached messages cost nothing; the rest are fetched with one batched read.
+    """
+    found = message_cache.get_many(message_ids)
+    missing = [message_id for message_id in dict.fromkeys(message_ids) if message_id not in found]
+    if missing:
+        fetched = [models.Message(**doc) for doc in get_storage().get_messages_by_ids(missing)]
+        message_cache.put_many(fetched)
+        found.update((m.message_id, m) for m in fetched)
+    return [found[message_id] for message_id in message_ids if message_id in found]
+
+# --- Time Buckets ---
+def get_time_buckets(granularity: str, start: str, end: str) -> List[dict]:
+    """
+    Hour or day buckets starting in [start, end), oldest first (see backend/timeindex.py).
+    """
+    return list(get_storage().query_time_buckets(granularity, start, end))
+
+def set_time_bucket_summary(bucket_id: str, summary: List[str], summarized_count: int):
+    get_storage().set_bucket_summary(bucket_id, summary, summarized_count)
+
+# Firestore commits at most 500 writes per batch; each bucket entry is one write
+BUCKET_WRITE_BATCH = 500
+
+def _save_buckets(messages: List[models.Message]):
+    items = list(timeindex.buckets_for(messages).items())
+    for start in range(0, len(items), BUCKET_WRITE_BATCH):
+        get_storage().save_messages([], {}, dict(items[start:start + BUCKET_WRITE_BATCH]))
+
+def rebuild_time_buckets(chunk_size: int = 500) -> int:
+    """
+    Backfills the time buckets from every stored message, for data written before the
+    index existed. Safe to re-run: bucket entries are idempotent. Returns the message count.
+    A chunk of sparse messages can touch two buckets per message, so its bucket writes are
+    committed in batches of BUCKET_WRITE_BATCH.
+    """
+    count = 0
+    chunk = []
+    for doc in get_storage().query_messages():
+        chunk.append(models.Message(**doc))
+        if len(chunk) >= chunk_size:
+            _save_buckets(chunk)
+            count += len(chunk)
+            chunk = []
+    if chunk:
+        _save_buckets(chunk)
+        count += len(chunk)
+    logger.info(f"Rebuilt time buckets for {count} messages")
+    return count
+
+def save_message(msg: models.MessageCreate) -> models.Message:
+    """
+    Saves a message to Firestore, ensuring session is valid and last_activity is updated.
+    The message and the session bump are committed in one batch and written through to the cache.
+    Returns the saved Message object.
+    """
+    message = new_message(msg)
+    save_messages_batch([message])
     return message
 
 # --- Summary Logic ---
 def get_summaries(session_id: Optional[str] = None) -> List[models.SessionSummary]:
-    if session_id:
-        summaries_ref = db.collection("summaries").where("session_id", "==", session_id).order_by("timestamp")
-    else:
-        summaries_ref = db.collection("summaries").order_by("timestamp")
-    summaries = [models.SessionSummary(**doc.to_dict()) for doc in summaries_ref.stream()]
-    logger.info(f"Fetched {len(summaries)} summaries for session {session_id}")
+    summaries = [models.SessionSummary(**doc) for doc in get_storage().query_summaries(session_id=session_id)]
+    logger.debug("Fetched %d summaries for session %s", len(summaries), session_id)
     return summaries
 
 def save_summary(summary: models.SessionSummary):
-    db.collection("summaries").add(summary.model_dump())
-    logger.info(f"Saved summary for session {summary.session_id} at {summary.timestamp}")
+    get_storage().add_summary(summary.model_dump())
+    logger.debug("Saved summary for session %s at %s", summary.session_id, summary.timestamp)
+
+def get_summary_cache_entry(session_id: str) -> Optional[models.SummaryCacheEntry]:
+    """
+    Returns the persisted summary memo for a session, or None.
+    """
+    doc = get_storage().get_summary_cache(session_id)
+    return models.SummaryCacheEntry(**doc) if doc else None
+
+def save_summary_cache_entry(entry: models.SummaryCacheEntry):
+    get_storage().set_summary_cache(entry.session_id, entry.model_dump())
+    logger.debug("Saved summary memo for session %s (%d messages)", entry.session_id, entry.message_count)
+
+# --- Thread Logic ---
+# Threads are stored as headers (models.ThreadHeader): ordered message ids plus topic, count
+# and last activity, so a thread never holds a stale copy of a message. Listing threads reads
+# headers only, O(threads); messages are hydrated on demand with one batched read for all the
+# requested threads. Documents written before this layout embedded full messages; they are
+# read as headers transparently and rewritten by migrate_legacy_threads.
+def thread_header(thread: models.Thread) -> models.ThreadHeader:
+    return models.ThreadHeader(
+        thread_id=thread.thread_id,
+        session_id=thread.session_id,
+        topic=thread.topic,
+        message_ids=[m.message_id for m in thread.messages],
+        message_count=len(thread.messages),
+        last_message_at=max((m.timestamp for m in thread.messages), default=None),
+        created_at=thread.created_at,
+        updated_at=thread.updated_at,
+    )
+
+def _header_from_doc(doc: dict) -> models.ThreadHeader:
+    if "message_ids" not in doc and "messages" in doc:
+        return thread_header(models.Thread(**doc))
+    return models.ThreadHeader(**doc)
 
 def save_thread(thread: models.Thread):
-    db.collection("threads").document(thread.thread_id).set(thread.model_dump())
-    logger.info(f"Saved thread {thread.thread_id} (topic: {thread.topic})")
-
-def get_threads_by_topic(topic: str):
-    threads_ref = db.collection("threads").where("topic", "==", topic)
-    threads = [models.Thread(**doc.to_dict()) for doc in threads_ref.stream()]
-    logger.info(f"Fetched {len(threads)} threads for topic '{topic}'")
-    return threads
-
-def get_all_threads():
-    threads_ref = db.collection("threads")
-    threads = [models.Thread(**doc.to_dict()) for doc in threads_ref.stream()]
-    logger.info(f"Fetched {len(threads)} threads (all topics)")
-    return threads
\ No newline at end of file
+    get_storage().save_thread(thread_header(thread).model_dump())
+    logger.debug("Saved thread %s (topic: %s)", thread.thread_id, thread.topic)
+
+def get_thread_headers(topic: Optional[str] = None, session_id: Optional[str] = None) -> List[models.ThreadHeader]:
+    headers = [_header_from_doc(doc) for doc in get_storage().query_threads(topic=topic, session_id=session_id)]
+    logger.debug("Fetched %d thread headers (topic=%s, session=%s)", len(headers), topic, session_id)
+    return headers
+
+def get_thread_header(thread_id: str) -> Optional[models.ThreadHeader]:
+    doc = get_storage().get_thread(thread_id)
+    return _header_from_doc(doc) if doc else None
+
+def hydrate_threads(headers: List[models.ThreadHeader]) -> List[models.Thread]:
+    """
+    Builds full Threads from headers with a single batched message read across all of them.
+    """
+    messages = {m.message_id: m for m in get_messages_by_ids([i for h in headers for i in h.message_ids])}
+    return [
+        models.Thread(
+            thread_id=h.thread_id,
+            session_id=h.session_id,
+            topic=h.topic,
+            messages=[messages[i] for i in h.message_ids if i in messages],
+            created_at=h.created_at,
+            updated_at=h.updated_at,
+        )
+        for h in headers
+    ]
+
+def get_thread(thread_id: str) -> Optional[models.Thread]:
+    header = get_thread_header(thread_id)
+    return hydrate_threads([header])[0] if header else None
+
+def get_thread_messages(thread_id: str, offset: int = 0, limit: Optional[int] = None) -> Optional[List[models.Message]]:
+    """
+    Hydrates one slice of a thread's messages, or returns None if the thread does not exist.
+    """
+    header = get_thread_header(thread_id)
+    if header is None:
+        return None
+    end = None if limit is None else offset + limit
+    return get_messages_by_ids(header.message_ids[offset:end])
+
+def get_threads_by_topic(topic: str) -> List[models.Thread]:
+    return hydrate_threads(get_thread_headers(topic=topic))
+
+def get_threads_by_session(session_id: str) -> List[models.Thread]:
+    return hydrate_threads(get_thread_headers(session_id=session_id))
+
+def get_all_threads() -> List[models.Thread]:
+    return hydrate_threads(get_thread_headers())
+
+def migrate_legacy_threads() -> int:
+    """
+    Rewrites thread documents that still embed full messages as headers. Safe to re-run.
+    Returns the number rewritten.
+    """
+    migrated = 0
+    for doc in list(get_storage().query_threads()):
+        if "message_ids" not in doc:
+            get_storage().save_thread(_header_from_doc(doc).model_dump())
+            migrated += 1
+    if migrated:
+        logger.info(f"Migrated {migrated} legacy threads to message-id references")
+    return migrated
@@ -0,0 +1,213 @@
+from typing import Callable, Dict, Optional
+from collections import deque
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger("nova-jobs")
+
+# --- Durable Job Queue ---
+# Slow background work (e.g. Gemini topic analysis when a session ends) is recorded in a
+# local SQLite table and run by a small worker pool, so the request that triggers it returns
+# immediately and the work survives restarts. Each job carries an idempotency key; enqueuing
+# a key that already exists is a no-op. Done jobs are deleted once they are older than
+# JOB_RETENTION_HOURS (their keys can then be enqueued again), so the table stays small;
+# failed jobs are kept for inspection.
+JOBS_DB_PATH = os.environ.get("NOVA_JOBS_DB", "nova_jobs.sqlite3")
+JOB_WORKERS = int(os.environ.get("NOVA_JOB_WORKERS", "2"))
+JOB_MAX_ATTEMPTS = int(os.environ.get("NOVA_JOB_MAX_ATTEMPTS", "5"))
+JOB_RETENTION_HOURS = float(os.environ.get("NOVA_JOB_RETENTION_HOURS", "24"))
+JOB_PRUNE_INTERVAL_SECONDS = 600.0
+JOB_RETRY_BASE_SECONDS = 2.0
+JOB_POLL_SECONDS = 1.0
+LATENCY_WINDOW = 500
+
+_handlers: Dict[str, Callable[[dict], object]] = {}
+
+def register(kind: str, handler: Callable[[dict], object]):
+    """
+    Registers the function that runs jobs of `kind`. It receives the job payload dict.
+    """
+    _handlers[kind] = handler
+
+class JobQueue:
+    """
+    SQLite-backed queue. Job status moves pending -> running -> done, or back to pending
+    with exponential backoff on failure, until JOB_MAX_ATTEMPTS is reached (failed).
+    """
+    def __init__(self, path: str = JOBS_DB_PATH):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " kind TEXT NOT NULL,"
+            " idempotency_key TEXT NOT NULL UNIQUE,"
+            " payload TEXT NOT NULL,"
+            " status TEXT NOT NULL DEFAULT 'pending',"
+            " attempts INTEGER NOT NULL DEFAULT 0,"
+            " run_after REAL NOT NULL,"
+            " enqueued_at REAL NOT NULL,"
+            " finished_at REAL,"
+            " last_error TEXT)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_ready ON jobs (status, run_after)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_finished ON jobs (status, finished_at)")
+        # Jobs left running by a previous process were interrupted; run them again
+        self._conn.execute("UPDATE jobs SET status = 'pending' WHERE status = 'running'")
+        self._wake = threading.Event()
+        self._latencies = deque(maxlen=LATENCY_WINDOW)
+        self.pruned_at = 0.0
+        self.prune()
+
+    def enqueue(self, kind: str, payload: dict, key: str) -> bool:
+        """
+        Adds a job unless one with the same idempotency key exists. Returns True if added.
+        """
+        now = time.time()
+        with self._lock:
+            cur = self._conn.execute(
+                "INSERT OR IGNORE INTO jobs (kind, idempotency_key, payload, run_after, enqueued_at) VALUES (?, ?, ?, ?, ?)",
+                (kind, key, json.dumps(payload), now, now),
+            )
+        added = cur.rowcount == 1
+        if added:
+            self._wake.set()
+            logger.info(f"Enqueued {kind} job {key}")
+        return added
+
+    def claim(self) -> Optional[tuple]:
+        """
+        Atomically marks the oldest ready job as running and returns (id, kind, payload, attempts, enqueued_at).
+        """
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    "SELECT id, kind, payload, attempts, enqueued_at FROM jobs"
+                    " WHERE status = 'pending' AND run_after <= ? ORDER BY run_after LIMIT 1",
+                    (time.time(),),
+                ).fetchone()
+                if row is not None:
+                    self._conn.execute("UPDATE jobs SET status = 'running', attempts = attempts + 1 WHERE id = ?", (row[0],))
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        if row is None:
+            return None
+        return row[0], row[1], json.loads(row[2]), row[3] + 1, row[4]
+
+    def complete(self, job_id: int, enqueued_at: float):
+        now = time.time()
+        with self._lock:
+            self._conn.execute("UPDATE jobs SET status = 'done', finished_at = ?, last_error = NULL WHERE id = ?", (now, job_id))
+            self._latencies.append(now - enqueued_at)
+
+    def fail(self, job_id: int, attempts: int, error: str):
+        now = time.time()
+        with self._lock:
+            if attempts >= JOB_MAX_ATTEMPTS:
+                self._conn.execute("UPDATE jobs SET status = 'failed', finished_at = ?, last_error = ? WHERE id = ?", (now, error, job_id))
+            else:
+                retry_at = now + JOB_RETRY_BASE_SECONDS * (2 ** (attempts - 1))
+                self._conn.execute("UPDATE jobs SET status = 'pending', run_after = ?, last_error = ? WHERE id = ?", (retry_at, error, job_id))
+
+    def prune(self, max_age: Optional[float] = None) -> int:
+        """
+        Deletes done jobs that finished more than `max_age` seconds ago (default
+        JOB_RETENTION_HOURS). Returns the number deleted.
+        """
+        now = time.time()
+        max_age = JOB_RETENTION_HOURS * 3600 if max_age is None else max_age
+        with self._lock:
+            cur = self._conn.execute("DELETE FROM jobs WHERE status = 'done' AND finished_at < ?", (now - max_age,))
+            self.pruned_at = now
+        if cur.rowcount:
+            logger.info(f"Pruned {cur.rowcount} done jobs")
+        return cur.rowcount
+
+    def wait(self, timeout: float):
+        self._wake.wait(timeout)
+        self._wake.clear()
+
+    def stats(self) -> dict:
+        """
+        Depth of the pending, running and failed jobs (an index range count; done jobs are
+        not counted) and latency (enqueue to completion, seconds) of recent jobs.
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT status, COUNT(*) FROM jobs WHERE status IN ('pending', 'running', 'failed') GROUP BY status"
+            ).fetchall()
+            latencies = sorted(self._latencies)
+        depth = {"pending": 0, "running": 0, "failed": 0}
+        depth.update(dict(rows))
+        result = {"depth": depth, "completed_recent": len(latencies)}
+        if latencies:
+            result["latency_p50"] = latencies[len(latencies) // 2]
+            result["latency_p95"] = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+        return result
+
+_queue = None
+_queue_lock = threading.Lock()
+_workers = []
+_stop = threading.Event()
+
+def get_queue() -> JobQueue:
+    global _queue
+    if _queue is None:
+        with _queue_lock:
+            if _queue is None:
+                _queue = JobQueue()
+    return _queue
+
+def enqueue(kind: str, payload: dict, key: str) -> bool:
+    return get_queue().enqueue(kind, payload, key)
+
+def _worker():
+    q = get_queue()
+    while not _stop.is_set():
+        job = q.claim()
+        if job is None:
+            if time.time() - q.pruned_at >= JOB_PRUNE_INTERVAL_SECONDS:
+                q.prune()
+            q.wait(JOB_POLL_SECONDS)
+            continue
+        job_id, kind, payload, attempts, enqueued_at = job
+        handler = _handlers.get(kind)
+        try:
+            if handler is None:
+                raise RuntimeError(f"No handler registered for job kind '{kind}'")
+            handler(payload)
+            q.complete(job_id, enqueued_at)
+            logger.info(f"Job {job_id} ({kind}) done after {attempts} attempt(s)")
+        except Exception as e:
+            q.fail(job_id, attempts, str(e))
+            logger.error(f"Job {job_id} ({kind}) attempt {attempts} failed: {e}")
+
+def start_workers(count: int = JOB_WORKERS):
+    """
+    Starts the worker pool (bounded concurrency: at most `count` jobs run at once).
+    """
+    _stop.clear()
+    while len(_workers) < count:
+        worker = threading.Thread(target=_worker, daemon=True, name=f"nova-job-{len(_workers)}")
+        worker.start()
+        _workers.append(worker)
+
+def stop_workers(timeout: float = 5.0):
+    _stop.set()
+    if _queue is not None:
+        _queue._wake.set()
+    for worker in _workers:
+        worker.join(timeout)
+    _workers.clear()
+
+def stats() -> dict:
+    return get_queue().stats()
@@ -1,10 +1,16 @@
-from backend import models, firebase
+from backend import models, firebase, jobs, retrieval, metrics
 import datetime
 import os
+import threading
+import time
+import asyncio
+import hashlib
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor, wait as wait_futures
 from dotenv import load_dotenv
-import requests
-import google.generativeai as genai
+import httpx
 import json
+import numpy as np
 load_dotenv()
 
 GROQ_API_KEY = os.environ.get("YOUR_GROQ_API_KEY")
@@ -14,80 +20,494 @@ GEMINI_API_KEY = os.environ.get("YOUR_GEMINI_API_KEY")
 # You can switch to 'models/gemini-1.5-pro-latest' for higher quality if desired
 GEMINI_MODEL = 'models/gemini-1.5-flash-latest'
 
-def gemini_analyze_session_topics(session_id: str):
+# --- Provider Clients ---
+# One pooled HTTP/2 client for Groq and one long-lived Gemini model handle are shared
+# by every request. Both are created on first use, or by the app's background warmup
+# (init_clients + warm_clients), never at import time.
+GROQ_API_URL = os.environ.get("NOVA_GROQ_API_URL", "https://api.groq.com/openai/v1/chat/completions")
+GROQ_MAX_CONNECTIONS = int(os.environ.get("NOVA_GROQ_MAX_CONNECTIONS", "200"))
+GROQ_TIMEOUT = 20
+GROQ_STREAM_TIMEOUT = 60
+# Rate-limited (429) and server error (5xx) responses are retried with exponential backoff,
+# honoring Retry-After up to GROQ_RETRY_AFTER_MAX seconds. Streams are only retried before
+# their first byte is read.
+GROQ_MAX_RETRIES = int(os.environ.get("NOVA_GROQ_MAX_RETRIES", "2"))
+GROQ_RETRY_BACKOFF = 0.25
+GROQ_RETRY_AFTER_MAX = 2.0
+
+SYSTEM_PROMPT = (
+    "You are Nova, a helpful, emotionally intelligent, humanlike chatbot. "
+    "You sound natural and friendly — like texting with a friend on WhatsApp. "
+    "You remember what the user said in past sessions if summaries are provided. "
+    "You can quote earlier messages if needed, but NEVER hallucinate.\n\n"
+    "Always keep replies appropriately sized — short when the user just needs a nudge or confirmation, "
+    "longer when explanation or empathy is needed. "
+    "You're aware of time references like 'yesterday', 'last Friday', etc.\n\n"
+    "If you're unsure whether something was said before, say so clearly. Don’t make things up."
+)
+
+class GroqProvider:
+    """
+    Async client for Groq's OpenAI-compatible chat completions API over a shared connection pool.
+    Any OpenAI-compatible server can be targeted by passing a different url.
+    """
+    def __init__(self, api_key: str, url: str = GROQ_API_URL, model: str = None, client: httpx.AsyncClient = None):
+        self.api_key = api_key
+        self.url = url
+        self.model = model or GROQ_MODEL
+        self.name = f"groq:{self.model}"
+        # Providers for other Groq models reuse the first provider's connection pool
+        self._owns_client = client is None
+        self.client = client or httpx.AsyncClient(
+            http2=True,
+            timeout=httpx.Timeout(GROQ_TIMEOUT, connect=5),
+            limits=httpx.Limits(max_connections=GROQ_MAX_CONNECTIONS, max_keepalive_connections=GROQ_MAX_CONNECTIONS // 4),
+            headers={"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"},
+        )
+
+    def _payload(self, prompt: str, stream: bool = False) -> dict:
+        data = {
+            "model": self.model,
+            "messages": [
+                {"role": "system", "content": SYSTEM_PROMPT},
+                {"role": "user", "content": prompt}
+            ],
+            "max_tokens": 256,
+            "temperature": 0.7
+        }
+        if stream:
+            data["stream"] = True
+        return data
+
+    @staticmethod
+    def _should_retry(resp: httpx.Response, attempt: int) -> bool:
+        return attempt < GROQ_MAX_RETRIES and (resp.status_code == 429 or resp.status_code >= 500)
+
+    @staticmethod
+    def _retry_delay(resp: httpx.Response, attempt: int) -> float:
+        try:
+            return min(float(resp.headers["retry-after"]), GROQ_RETRY_AFTER_MAX)
+        except (KeyError, ValueError):
+            return GROQ_RETRY_BACKOFF * (2 ** attempt)
+
+    def _trace_hook(self, start: float, trace, streaming: bool):
+        """
+        httpcore trace extension recording the queue (waiting for a pooled connection),
+        connect (new connections only) and, when not streaming, first_token phases.
+        """
+        state = {"queued": True, "connect_started": None}
+
+        async def hook(event: str, info: dict):
+            now = time.perf_counter()
+            if state["queued"]:
+                state["queued"] = False
+                metrics.record_llm_phase(self.name, "queue", now - start, trace)
+            if event == "connection.connect_tcp.started":
+                state["connect_started"] = now
+            elif state["connect_started"] is not None and not event.startswith("connection."):
+                metrics.record_llm_phase(self.name, "connect", now - state["connect_started"], trace)
+                state["connect_started"] = None
+            if not streaming and event.endswith("receive_response_headers.complete"):
+                metrics.record_llm_phase(self.name, "first_token", now - start, trace)
+        return hook
+
+    async def complete(self, prompt: str) -> str:
+        trace = metrics.current_trace()
+        start = time.perf_counter()
+        extensions = {"trace": self._trace_hook(start, trace, streaming=False)} if trace is not False else None
+        for attempt in range(GROQ_MAX_RETRIES + 1):
+            resp = await self.client.post(self.url, json=self._payload(prompt), extensions=extensions)
+            if not self._should_retry(resp, attempt):
+                break
+            await asyncio.sleep(self._retry_delay(resp, attempt))
+        resp.raise_for_status()
+        text = resp.json()["choices"][0]["message"]["content"].strip()
+        if trace is not False:
+            metrics.record_llm_phase(self.name, "total", time.perf_counter() - start, trace)
+        return text
+
+    async def stream(self, prompt: str):
+        """
+        Yields text deltas as they arrive from the server-sent event stream.
+        """
+        trace = metrics.current_trace()
+        start = time.perf_counter()
+        extensions = {"trace": self._trace_hook(start, trace, streaming=True)} if trace is not False else None
+        first = True
+        for attempt in range(GROQ_MAX_RETRIES + 1):
+            async with self.client.stream("POST", self.url, json=self._payload(prompt, stream=True), timeout=GROQ_STREAM_TIMEOUT, extensions=extensions) as resp:
+                retry = self._should_retry(resp, attempt)
+                if not retry:
+                    resp.raise_for_status()
+                    async for line in resp.aiter_lines():
+                        if not line:
+                            continue
+                        if line.startswith("data: "):
+                            line = line[6:]
+                        if line.strip() == "[DONE]":
+                            break
+                        try:
+                            chunk = json.loads(line)
+                            delta = chunk["choices"][0]["delta"].get("content", "")
+                        except Exception:
+                            continue
+                        if delta:
+                            if first and trace is not False:
+                                metrics.record_llm_phase(self.name, "first_token", time.perf_counter() - start, trace)
+                            first = False
+                            yield delta
+            if not retry:
+                break
+            await asyncio.sleep(self._retry_delay(resp, attempt))
+        if trace is not False:
+            metrics.record_llm_phase(self.name, "total", time.perf_counter() - start, trace)
+
+    async def warm(self):
+        """
+        Opens a pooled connection (TCP, TLS, HTTP/2 setup) with a cheap GET of the models
+        listing, so the first chat request does not pay for the handshake. Errors are ignored.
+        """
+        try:
+            await self.client.get(self.url.rsplit("/chat/completions", 1)[0] + "/models", timeout=5)
+        except Exception as e:
+            print(f"Groq warmup failed: {e}")
+
+    async def aclose(self):
+        if self._owns_client:
+            await self.client.aclose()
+
+# --- Gemini Rate Limiting ---
+GEMINI_RATE_PER_MINUTE = float(os.environ.get("NOVA_GEMINI_RATE_PER_MINUTE", "60"))
+GEMINI_BURST = int(os.environ.get("NOVA_GEMINI_BURST", "10"))
+GEMINI_CALL_TIMEOUT = float(os.environ.get("NOVA_GEMINI_CALL_TIMEOUT", "30"))
+
+class TokenBucket:
+    """
+    Thread-safe token bucket. reserve() books the next token and returns how long the
+    caller must wait before using it, so sync and async callers can share one bucket.
+    """
+    def __init__(self, rate_per_second: float, burst: int):
+        self.rate = rate_per_second
+        self.capacity = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            return 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+
+gemini_rate_limiter = TokenBucket(GEMINI_RATE_PER_MINUTE / 60, GEMINI_BURST)
+
+class GeminiProvider:
+    """
+    Wraps a single configured GenerativeModel so genai.configure runs once per process.
+    Every call first takes a token from the provider-wide rate limiter.
+    """
+    def __init__(self, api_key: str, model: str = GEMINI_MODEL, limiter: TokenBucket = None):
+        # The SDK (and its gRPC stack) is slow to import, so it is loaded with the first provider
+        import google.generativeai as genai
+        genai.configure(api_key=api_key)
+        self.model = genai.GenerativeModel(model)
+        self.name = f"gemini:{model}"
+        self.limiter = limiter or gemini_rate_limiter
+
+    def _record(self, trace, wait: float, start: float):
+        # Gemini answers in one piece, so the first token arrives with the whole reply
+        if trace is not False:
+            total = wait + time.perf_counter() - start
+            metrics.record_llm_phase(self.name, "queue", wait, trace)
+            metrics.record_llm_phase(self.name, "first_token", total, trace)
+            metrics.record_llm_phase(self.name, "total", total, trace)
+
+    def complete_sync(self, prompt: str, timeout: float = GEMINI_CALL_TIMEOUT) -> str:
+        trace = metrics.current_trace()
+        wait = self.limiter.reserve()
+        time.sleep(wait)
+        start = time.perf_counter()
+        response = self.model.generate_content(prompt, request_options={"timeout": timeout})
+        self._record(trace, wait, start)
+        return response.text.strip()
+
+    async def complete(self, prompt: str, timeout: float = GEMINI_CALL_TIMEOUT) -> str:
+        trace = metrics.current_trace()
+        wait = self.limiter.reserve()
+        await asyncio.sleep(wait)
+        start = time.perf_counter()
+        response = await self.model.generate_content_async(prompt, request_options={"timeout": timeout})
+        self._record(trace, wait, start)
+        return response.text.strip()
+
+_groq_provider = None
+_gemini_provider = None
+_provider_lock = threading.RLock()
+
+def get_groq_provider() -> GroqProvider:
+    global _groq_provider
+    if _groq_provider is None:
+        with _provider_lock:
+            if _groq_provider is None:
+                _groq_provider = GroqProvider(GROQ_API_KEY)
+    return _groq_provider
+
+def get_gemini_provider() -> GeminiProvider:
+    global _gemini_provider
+    if _gemini_provider is None:
+        with _provider_lock:
+            if _gemini_provider is None:
+                _gemini_provider = GeminiProvider(GEMINI_API_KEY)
+    return _gemini_provider
+
+def init_clients():
+    """
+    Builds the shared provider clients up front (called from the app lifespan).
+    """
+    if GROQ_API_KEY:
+        get_groq_provider()
+    if GEMINI_API_KEY:
+        get_gemini_provider()
+    get_router()
+
+async def warm_clients():
+    """
+    Pre-opens the Groq connection pool. Called from the app's background warmup.
+    """
+    if GROQ_API_KEY:
+        await get_groq_provider().warm()
+
+async def close_clients():
+    global _groq_provider, _router
+    if _groq_provider is not None:
+        await _groq_provider.aclose()
+        _groq_provider = None
+    _router = None
+
+def gemini_generate(prompt: str, timeout: float = GEMINI_CALL_TIMEOUT) -> str:
+    """
+    Runs a Gemini prompt on the shared model handle and returns the stripped response text.
+    """
+    return get_gemini_provider().complete_sync(prompt, timeout=timeout)
+
+# --- Session Topic Analysis ---
+# How per-cluster summaries are produced when a session ends:
+# - "sequential": one Gemini call per cluster, one after another
+# - "parallel": one call per cluster, at most GEMINI_CONCURRENCY in flight
+# - "batch": a single structured call that summarizes every cluster at once
+SUMMARIZE_MODE = os.environ.get("NOVA_SUMMARIZE_MODE", "parallel")
+GEMINI_CONCURRENCY = int(os.environ.get("NOVA_GEMINI_CONCURRENCY", "4"))
+
+_gemini_executor = ThreadPoolExecutor(max_workers=GEMINI_CONCURRENCY, thread_name_prefix="nova-gemini")
+
+def _chat_text(messages) -> str:
+    return "\n".join([
+        f"User: {m.text}" if getattr(m, 'mood', 'user') == 'user' else f"Nova: {m.text}" for m in messages
+    ])
+
+def summarize_cluster(cluster) -> tuple:
+    """
+    Asks Gemini for the topic and bullet summary of one cluster. Returns (topic, summary).
+    """
+    prompt = (
+        "You are a memory agent for a chat system.\n"
+        "Given the following conversation,\n"
+        "1. Identify the main topic as a lowercase string.\n"
+        "2. Summarize the discussion as bullet points.\n"
+        "Respond in strict JSON as: {\"topic\": \"...\", \"summary\": [\"...\"]} \n"
+        f"Chat:\n{_chat_text(cluster)}"
+    )
+    parsed = json.loads(gemini_generate(prompt))
+    return parsed.get("topic"), parsed.get("summary")
+
+def summarize_clusters_batch(clusters) -> list:
+    """
+    Summarizes every cluster in one Gemini call. Returns [(topic, summary), ...] aligned with clusters.
+    """
+    sections = "\n\n".join([f"Conversation {i}:\n{_chat_text(cluster)}" for i, cluster in enumerate(clusters)])
+    prompt = (
+        "You are a memory agent for a chat system.\n"
+        "For each numbered conversation below,\n"
+        "1. Identify the main topic as a lowercase string.\n"
+        "2. Summarize the discussion as bullet points.\n"
+        "Respond in strict JSON as a list with one entry per conversation, in order: "
+        "[{\"conversation\": 0, \"topic\": \"...\", \"summary\": [\"...\"]}, ...]\n\n"
+        f"{sections}"
+    )
+    parsed = json.loads(gemini_generate(prompt, timeout=GEMINI_CALL_TIMEOUT * 2))
+    results = [(None, None)] * len(clusters)
+    for i, entry in enumerate(parsed):
+        idx = entry.get("conversation", i)
+        if isinstance(idx, int) and 0 <= idx < len(clusters):
+            results[idx] = (entry.get("topic"), entry.get("summary"))
+    return results
+
+def summarize_clusters(clusters, mode: str = None) -> list:
+    """
+    Produces (topic, summary) per cluster using the configured mode. Failed clusters yield (None, None).
+    """
+    mode = mode or SUMMARIZE_MODE
+    if mode == "batch":
+        try:
+            return summarize_clusters_batch(clusters)
+        except Exception as e:
+            print(f"Gemini batch summarization error: {e}")
+            return [(None, None)] * len(clusters)
+    results = []
+    if mode == "parallel":
+        futures = [_gemini_executor.submit(summarize_cluster, cluster) for cluster in clusters]
+        # One deadline for the whole set: a call timeout per wave of GEMINI_CONCURRENCY calls
+        waves = -(-len(futures) // GEMINI_CONCURRENCY)
+        _, unfinished = wait_futures(futures, timeout=GEMINI_CALL_TIMEOUT * waves)
+        if unfinished:
+            print(f"Gemini topic clustering error: {len(unfinished)} of {len(futures)} clusters timed out")
+        for future in futures:
+            if future in unfinished:
+                future.cancel()
+                results.append((None, None))
+                continue
+            try:
+                results.append(future.result())
+            except Exception as e:
+                print(f"Gemini topic clustering error: {e}")
+                results.append((None, None))
+        return results
+    for cluster in clusters:
+        try:
+            results.append(summarize_cluster(cluster))
+        except Exception as e:
+            print(f"Gemini topic clustering error: {e}")
+            results.append((None, None))
+    return results
+
+def gemini_analyze_session_topics(session_id: str, mode: str = None):
     """
     After a session break, cluster messages by topic, summarize each topic, and upsert to Firestore /topics/{topic}.
+    Clusters are summarized according to SUMMARIZE_MODE unless `mode` is given.
     """
     messages = firebase.get_messages(session_id=session_id)
     if not messages:
         return []
     # Cluster messages by topic using Gemini
-    clusters = cluster_messages_by_topic_gemini(messages)
+    clusters = [cluster for cluster in cluster_messages_by_topic_gemini(messages) if cluster]
     now = datetime.datetime.now(datetime.timezone.utc).isoformat()
-    for cluster in clusters:
-        if not cluster:
-            continue
-        # Compose topic-specific chat text
-        chat_text = "\n".join([
-            f"User: {m.text}" if getattr(m, 'mood', 'user') == 'user' else f"Nova: {m.text}" for m in cluster
-        ])
-        # Ask Gemini for topic and summary for this cluster
-        prompt = (
-            "You are a memory agent for a chat system.\n"
-            "Given the following conversation,\n"
-            "1. Identify the main topic as a lowercase string.\n"
-            "2. Summarize the discussion as bullet points.\n"
-            "Respond in strict JSON as: {\"topic\": \"...\", \"summary\": [\"...\"]} \n"
+    for cluster, (topic, summary) in zip(clusters, summarize_clusters(clusters, mode)):
+        if topic and summary:
+            firebase.upsert_topic_session_summary(
+                topic=topic,
+                session_id=session_id,
+                summary=summary,
+                timestamp=now,
+                message_ids=[m.message_id for m in cluster]
+            )
+    return True
+
+jobs.register("analyze_session", lambda payload: gemini_analyze_session_topics(payload["session_id"]))
+
+# --- Session Summary Memoization ---
+# Summaries are keyed by a fingerprint of the session's message ids and last timestamp.
+# An unchanged session returns its cached summary (memory LRU first, then the persisted
+# Firestore tier) with no Gemini call and no write. When new messages arrive, the summary
+# is extended from the previous one plus only the new messages.
+SUMMARY_CACHE_SIZE = int(os.environ.get("NOVA_SUMMARY_CACHE_SIZE", "512"))
+
+def summary_fingerprint(messages) -> str:
+    digest = hashlib.sha1()
+    for m in messages:
+        digest.update(m.message_id.encode("utf-8"))
+    digest.update((messages[-1].timestamp if messages else "").encode("utf-8"))
+    return digest.hexdigest()
+
+class SummaryCache:
+    """
+    LRU of session_id -> models.SummaryCacheEntry in front of the persisted tier.
+    """
+    def __init__(self, size: int = SUMMARY_CACHE_SIZE):
+        self.size = size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "persisted_hits": 0, "misses": 0, "incremental": 0}
+
+    def get(self, session_id: str):
+        with self._lock:
+            entry = self._entries.get(session_id)
+            if entry is not None:
+                self._entries.move_to_end(session_id)
+            return entry
+
+    def put(self, entry: models.SummaryCacheEntry):
+        with self._lock:
+            self._entries[entry.session_id] = entry
+            self._entries.move_to_end(entry.session_id)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+summary_cache = SummaryCache()
+
+_SUMMARY_RULES = (
+    "- Extract main discussion points as bullet points\n"
+    "- Identify main topics as lowercase strings\n"
+    "- NEVER hallucinate content not in the session\n\n"
+    "Respond in strict JSON format as:\n"
+    "{\n"
+    "  \"summary\": [\"...\", \"...\"],\n"
+    "  \"topics\": [\"...\"]\n"
+    "}\n\n"
+)
+
+def _summary_prompt(messages, previous: models.SessionSummary = None) -> str:
+    chat_text = "\n".join([
+        f"User: {m.text}" if m.mood == 'user' else f"Nova: {m.text}" for m in messages
+    ])
+    if previous is None:
+        return (
+            "You are a context-sensitive memory agent for a long-term human-AI chat system.\n"
+            "Your goal is to summarize a session of messages exchanged between the user and an assistant named Nova.\n\n"
+            + _SUMMARY_RULES +
             f"Chat:\n{chat_text}"
         )
-        try:
-            genai.configure(api_key=GEMINI_API_KEY)
-            model = genai.GenerativeModel(GEMINI_MODEL)
-            response = model.generate_content(prompt)
-            gemini_text = response.text.strip()
-            parsed = json.loads(gemini_text)
-            topic = parsed.get("topic")
-            summary = parsed.get("summary")
-            message_ids = [m.message_id for m in cluster if hasattr(m, 'message_id')]
-            if topic and summary:
-                firebase.upsert_topic_session_summary(
-                    topic=topic,
-                    session_id=session_id,
-                    summary=summary,
-                    timestamp=now,
-                    message_ids=message_ids
-                )
-        except Exception as e:
-            print(f"Gemini topic clustering error: {e}")
-    return True
+    return (
+        "You are a context-sensitive memory agent for a long-term human-AI chat system.\n"
+        "Below is the existing summary of a session between the user and an assistant named Nova, "
+        "followed by the messages exchanged since. Update the summary so it covers the whole session.\n\n"
+        + _SUMMARY_RULES +
+        f"Existing summary:\n{json.dumps({'summary': previous.summary, 'topics': previous.topics})}\n\n"
+        f"New messages:\n{chat_text}"
+    )
 
 def generate_summary(session_id: str) -> models.SessionSummary:
     messages = firebase.get_messages(session_id=session_id)
+    fingerprint = summary_fingerprint(messages)
+    entry = summary_cache.get(session_id)
+    if entry is not None and entry.fingerprint == fingerprint:
+        summary_cache.stats["hits"] += 1
+        return entry.summary
+    if entry is None:
+        entry = firebase.get_summary_cache_entry(session_id)
+        if entry is not None:
+            summary_cache.put(entry)
+            if entry.fingerprint == fingerprint:
+                summary_cache.stats["persisted_hits"] += 1
+                return entry.summary
+    summary_cache.stats["misses"] += 1
+    failed = False
     if not messages:
         summary = ["No messages in this session."]
         topics = []
     else:
-        chat_text = "\n".join([
-            f"User: {m.text}" if m.mood == 'user' else f"Nova: {m.text}" for m in messages
-        ])
-        prompt = (
-            "You are a context-sensitive memory agent for a long-term human-AI chat system.\n"
-            "Your goal is to summarize a session of messages exchanged between the user and an assistant named Nova.\n\n"
-            "- Extract main discussion points as bullet points\n"
-            "- Identify main topics as lowercase strings\n"
-            "- NEVER hallucinate content not in the session\n\n"
-            "Respond in strict JSON format as:\n"
-            "{\n"
-            "  \"summary\": [\"...\", \"...\"],\n"
-            "  \"topics\": [\"...\"]\n"
-            "}\n\n"
-            f"Chat:\n{chat_text}"
-        )
+        previous = None
+        new_messages = messages
+        if entry is not None and entry.last_timestamp:
+            newer = [m for m in messages if m.timestamp > entry.last_timestamp]
+            # Extend only when the session just grew; edits or deletions need a full pass
+            if newer and len(messages) - len(newer) == entry.message_count:
+                previous, new_messages = entry.summary, newer
+                summary_cache.stats["incremental"] += 1
+        prompt = _summary_prompt(new_messages, previous)
         try:
-            genai.configure(api_key=GEMINI_API_KEY)
-            model = genai.GenerativeModel(GEMINI_MODEL)
-            response = model.generate_content(prompt)
-            gemini_text = response.text.strip()
+            gemini_text = gemini_generate(prompt)
             try:
                 parsed = json.loads(gemini_text)
                 summary = parsed.get("summary") or [gemini_text]
@@ -98,6 +518,7 @@ def generate_summary(session_id: str) -> models.SessionSummary:
         except Exception as e:
             summary = [f"[Gemini API error: {e}]"]
             topics = []
+            failed = True
     summary_obj = models.SessionSummary(
         summary=summary,
         timestamp=datetime.datetime.now(datetime.timezone.utc).isoformat(),
@@ -105,112 +526,427 @@ def generate_summary(session_id: str) -> models.SessionSummary:
         session_id=session_id,
     )
     firebase.save_summary(summary_obj)
+    if not failed:
+        entry = models.SummaryCacheEntry(
+            session_id=session_id,
+            fingerprint=fingerprint,
+            last_timestamp=messages[-1].timestamp if messages else "",
+            message_count=len(messages),
+            summary=summary_obj,
+        )
+        summary_cache.put(entry)
+        firebase.save_summary_cache_entry(entry)
     return summary_obj
 
 # --- Groq LLaMA Dialog ---
 # You can switch to another Groq model if desired
 GROQ_MODEL = 'llama3-70b-8192'
 
-def generate_dialog_response(prompt: str) -> str:
-    if not GROQ_API_KEY:
-        return "[Groq API key not set]"
-    try:
-        url = "https://api.groq.com/openai/v1/chat/completions"
-        headers = {
-            "Authorization": f"Bearer {GROQ_API_KEY}",
-            "Content-Type": "application/json"
-        }
-        system_prompt_text = {
-            "role": "system",
-            "content": (
-                "You are Nova, a helpful, emotionally intelligent, humanlike chatbot. "
-                "You sound natural and friendly — like texting with a friend on WhatsApp. "
-                "You remember what the user said in past sessions if summaries are provided. "
-                "You can quote earlier messages if needed, but NEVER hallucinate.\n\n"
-                "Always keep replies appropriately sized — short when the user just needs a nudge or confirmation, "
-                "longer when explanation or empathy is needed. "
-                "You're aware of time references like 'yesterday', 'last Friday', etc.\n\n"
-                "If you're unsure whether something was said before, say so clearly. Don’t make things up."
-            )
-        }
-        data = {
-            "model": GROQ_MODEL,
-            "messages": [
-                system_prompt_text,
-                {"role": "user", "content": prompt}
-            ],
-            "max_tokens": 256,
-            "temperature": 0.7
-        }
-        resp = requests.post(url, headers=headers, json=data, timeout=20)
-        resp.raise_for_status()
-        reply = resp.json()["choices"][0]["message"]["content"]
-        return reply.strip()
-    except Exception as e:
-        return f"[Groq API error: {e}]"
+GROQ_FALLBACK_MODELS = [m for m in os.environ.get("NOVA_GROQ_FALLBACK_MODELS", "llama3-8b-8192").split(",") if m]
+
+# --- Dialog Router ---
+# Dialog requests go to the first healthy backend in configured order (the primary Groq model,
+# GROQ_FALLBACK_MODELS, then Gemini). A backend is demoted behind the healthy ones only while
+# its rolling p95 is over the SLO; the demotion lapses after BREAKER_COOLDOWN without new
+# samples, so a recovered primary gets traffic back. If the chosen backend has not answered
+# (or, when streaming, produced a first token) within HEDGE_DELAY, the same request is hedged
+# to the next one; the first success wins and the loser is cancelled. Backends that keep
+# failing are skipped by a circuit breaker until a cooldown passes, after which a single
+# trial request is let through. When every backend fails, LLMUnavailable is raised instead of
+# returning an error string, so error text is never stored as a Nova message.
+HEDGE_DELAY = float(os.environ.get("NOVA_LLM_HEDGE_DELAY_MS", "1500")) / 1000
+MAX_IN_FLIGHT = 2
+STATS_WINDOW = 200
+MIN_SAMPLES = 5
+BREAKER_CONSECUTIVE_FAILURES = 5
+BREAKER_ERROR_RATE = 0.5
+BREAKER_COOLDOWN = float(os.environ.get("NOVA_LLM_BREAKER_COOLDOWN", "30"))
+SLO_P95 = float(os.environ.get("NOVA_LLM_SLO_P95_MS", "8000")) / 1000
+SLO_FIRST_TOKEN_P95 = float(os.environ.get("NOVA_LLM_SLO_FIRST_TOKEN_P95_MS", "3000")) / 1000
 
-def generate_dialog_response_stream(prompt: str):
+class LLMUnavailable(Exception):
+    """Raised when no dialog backend could produce a reply."""
+
+class GeminiDialogBackend:
     """
-    Streams Groq's reply token by token using OpenAI-compatible API's stream mode.
-    Yields: text chunks as they arrive.
+    Adapts the shared Gemini provider to the dialog backend interface (complete/stream).
+    Gemini answers in one piece, so stream() yields a single chunk.
     """
-    if not GROQ_API_KEY:
-        yield "[Groq API key not set]"
-        return
-    try:
-        url = "https://api.groq.com/openai/v1/chat/completions"
-        headers = {
-            "Authorization": f"Bearer {GROQ_API_KEY}",
-            "Content-Type": "application/json"
-        }
-        system_prompt_text = {
-            "role": "system",
-            "content": (
-                "You are Nova, a helpful, emotionally intelligent, humanlike chatbot. "
-                "You sound natural and friendly — like texting with a friend on WhatsApp. "
-                "You remember what the user said in past sessions if summaries are provided. "
-                "You can quote earlier messages if needed, but NEVER hallucinate.\n\n"
-                "Always keep replies appropriately sized — short when the user just needs a nudge or confirmation, "
-                "longer when explanation or empathy is needed. "
-                "You're aware of time references like 'yesterday', 'last Friday', etc.\n\n"
-                "If you're unsure whether something was said before, say so clearly. Don’t make things up."
-            )
-        }
-        data = {
-            "model": GROQ_MODEL,
-            "messages": [
-                system_prompt_text,
-                {"role": "user", "content": prompt}
-            ],
-            "max_tokens": 256,
-            "temperature": 0.7,
-            "stream": True
+    def __init__(self, provider: GeminiProvider):
+        self.provider = provider
+        self.name = f"gemini:{GEMINI_MODEL}"
+
+    async def complete(self, prompt: str) -> str:
+        return await self.provider.complete(f"{SYSTEM_PROMPT}\n\n{prompt}")
+
+    async def stream(self, prompt: str):
+        yield await self.complete(prompt)
+
+class BackendStats:
+    """
+    Rolling latency/outcome window for one backend plus its circuit breaker state.
+    """
+    def __init__(self, window: int = STATS_WINDOW):
+        self.latencies = deque(maxlen=window)
+        self.first_token = deque(maxlen=window)
+        self.outcomes = deque(maxlen=window)
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self.trial_in_flight = False
+        self.last_sample_at = None
+
+    @staticmethod
+    def percentile(samples, q: float):
+        if len(samples) < MIN_SAMPLES:
+            return None
+        ordered = sorted(samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+    def error_rate(self) -> float:
+        return (self.outcomes.count(False) / len(self.outcomes)) if self.outcomes else 0.0
+
+    def available(self) -> bool:
+        """
+        Whether a call may be launched now. Has no side effects; acquire() takes the slot.
+        """
+        if self.opened_at is None:
+            return True
+        return time.monotonic() - self.opened_at >= BREAKER_COOLDOWN and not self.trial_in_flight
+
+    def acquire(self) -> bool:
+        """
+        Claims the right to launch a call. A half-open breaker admits a single trial call
+        until record() or release_trial() ends it.
+        """
+        if not self.available():
+            return False
+        if self.opened_at is not None:
+            self.trial_in_flight = True
+        return True
+
+    def release_trial(self):
+        self.trial_in_flight = False
+
+    def over_slo(self, streaming: bool = False) -> bool:
+        """
+        Whether the rolling p95 is over its SLO. Stale windows (no sample for BREAKER_COOLDOWN)
+        don't count, so a demoted backend is tried again and re-measured.
+        """
+        if self.last_sample_at is None or time.monotonic() - self.last_sample_at >= BREAKER_COOLDOWN:
+            return False
+        p95 = self.percentile(self.first_token if streaming else self.latencies, 0.95)
+        return p95 is not None and p95 > (SLO_FIRST_TOKEN_P95 if streaming else SLO_P95)
+
+    def record(self, ok: bool, latency: float = None, first_token: bool = False):
+        self.outcomes.append(ok)
+        self.trial_in_flight = False
+        if ok:
+            (self.first_token if first_token else self.latencies).append(latency)
+            self.last_sample_at = time.monotonic()
+            self.consecutive_failures = 0
+            self.opened_at = None
+            return
+        self.consecutive_failures += 1
+        if self.consecutive_failures >= BREAKER_CONSECUTIVE_FAILURES or (
+            len(self.outcomes) >= MIN_SAMPLES * 2 and self.error_rate() >= BREAKER_ERROR_RATE
+        ):
+            self.opened_at = time.monotonic()
+
+    def snapshot(self) -> dict:
+        return {
+            "p50": self.percentile(self.latencies, 0.5),
+            "p95": self.percentile(self.latencies, 0.95),
+            "first_token_p50": self.percentile(self.first_token, 0.5),
+            "first_token_p95": self.percentile(self.first_token, 0.95),
+            "error_rate": self.error_rate(),
+            "circuit_open": self.opened_at is not None,
+            "over_slo": self.over_slo(),
         }
-        with requests.post(url, headers=headers, json=data, stream=True, timeout=60) as resp:
-            resp.raise_for_status()
-            for line in resp.iter_lines():
-                if line:
-                    try:
-                        if line.startswith(b'data: '):
-                            line = line[6:]
-                        if line.strip() == b"[DONE]":
-                            break
-                        chunk = json.loads(line)
-                        delta = chunk["choices"][0]["delta"].get("content", "")
-                        if delta:
-                            yield delta
-                    except Exception:
-                        continue
-    except Exception as e:
-        yield f"[Groq API error: {e}]"
 
-def gemini_analyze_and_store(user_message, groq_reply, session_id):
+class LLMRouter:
+    """
+    Routes dialog calls across backends exposing `name`, `async complete(prompt)` and
+    `stream(prompt)` (an async iterator of text chunks).
+    """
+    def __init__(self, backends, hedge_delay: float = HEDGE_DELAY):
+        self.backends = list(backends)
+        self.hedge_delay = hedge_delay
+        self.stats = {b.name: BackendStats() for b in self.backends}
+
+    def ranked(self, streaming: bool = False) -> list:
+        """
+        Available backends in configured order, with those over their latency SLO moved
+        behind the rest. Read-only: breaker trial slots are taken when a call is launched.
+        """
+        candidates = [b for b in self.backends if self.stats[b.name].available()]
+        return sorted(candidates, key=lambda b: self.stats[b.name].over_slo(streaming))
+
+    async def _timed_complete(self, backend, prompt: str) -> str:
+        stats = self.stats[backend.name]
+        start = time.monotonic()
+        try:
+            reply = await backend.complete(prompt)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            stats.record(False)
+            raise
+        finally:
+            # A cancelled hedge loser records nothing; give its trial slot back
+            stats.release_trial()
+        stats.record(True, time.monotonic() - start)
+        return reply
+
+    async def _first_chunk(self, backend, prompt: str):
+        stats = self.stats[backend.name]
+        start = time.monotonic()
+        chunks = backend.stream(prompt).__aiter__()
+        try:
+            first = await chunks.__anext__()
+        except StopAsyncIteration:
+            first = None
+        except asyncio.CancelledError:
+            await chunks.aclose()
+            raise
+        except Exception:
+            stats.record(False)
+            raise
+        finally:
+            stats.release_trial()
+        stats.record(True, time.monotonic() - start, first_token=True)
+        return chunks, first
+
+    async def _race(self, launch_call, streaming: bool):
+        """
+        Runs launch_call(backend) on the best backend, hedging to the next one after
+        hedge_delay and failing over immediately on errors. Returns (backend, result).
+        """
+        candidates = self.ranked(streaming)
+        if not candidates:
+            raise LLMUnavailable("no dialog backend available")
+        pending = {}
+        errors = []
+        next_index = 0
+
+        def launch():
+            """
+            Starts the next candidate whose breaker still admits a call; False if none is left.
+            """
+            nonlocal next_index
+            while next_index < len(candidates):
+                backend = candidates[next_index]
+                next_index += 1
+                stats = self.stats[backend.name]
+                if stats.acquire():
+                    task = asyncio.create_task(launch_call(backend))
+                    # A task cancelled before it started never reaches its finally
+                    task.add_done_callback(lambda t, stats=stats: t.cancelled() and stats.release_trial())
+                    pending[task] = backend
+                    return True
+            return False
+
+        if not launch():
+            raise LLMUnavailable("no dialog backend available")
+        try:
+            while pending:
+                can_hedge = next_index < len(candidates) and len(pending) < MAX_IN_FLIGHT
+                done, _ = await asyncio.wait(pending, timeout=self.hedge_delay if can_hedge else None, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    launch()
+                    continue
+                winner = None
+                for task in done:
+                    backend = pending.pop(task)
+                    if task.exception() is not None:
+                        errors.append(f"{backend.name}: {task.exception()}")
+                    elif winner is None:
+                        winner = (backend, task.result())
+                    elif streaming:
+                        await task.result()[0].aclose()
+                if winner is not None:
+                    return winner
+                if not pending and next_index < len(candidates):
+                    launch()
+            raise LLMUnavailable("; ".join(errors))
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def complete(self, prompt: str) -> str:
+        _, reply = await self._race(lambda backend: self._timed_complete(backend, prompt), streaming=False)
+        return reply
+
+    async def stream(self, prompt: str):
+        """
+        Yields the reply of whichever backend produced a first token first.
+        """
+        backend, (chunks, first) = await self._race(lambda b: self._first_chunk(b, prompt), streaming=True)
+        try:
+            if first is None:
+                return
+            yield first
+            async for chunk in chunks:
+                yield chunk
+        except Exception as e:
+            self.stats[backend.name].record(False)
+            raise LLMUnavailable(f"{backend.name}: {e}") from e
+        finally:
+            await chunks.aclose()
+
+    def snapshot(self) -> dict:
+        return {name: stats.snapshot() for name, stats in self.stats.items()}
+
+_router = None
+
+def get_router() -> LLMRouter:
+    """
+    Builds the default router: the primary Groq model, GROQ_FALLBACK_MODELS, then Gemini.
+    Backends whose API key is missing are left out.
+    """
+    global _router
+    if _router is None:
+        with _provider_lock:
+            if _router is None:
+                backends = []
+                if GROQ_API_KEY:
+                    primary = get_groq_provider()
+                    backends.append(primary)
+                    backends += [GroqProvider(GROQ_API_KEY, model=m, client=primary.client) for m in GROQ_FALLBACK_MODELS if m != primary.model]
+                if GEMINI_API_KEY:
+                    backends.append(GeminiDialogBackend(get_gemini_provider()))
+                _router = LLMRouter(backends)
+    return _router
+
+# --- Response Cache ---
+# Opt-in (NOVA_RESPONSE_CACHE=1) cache for cheap conversational turns ("hi", "thanks", "ok").
+# Only short messages are eligible. Entries are keyed by the normalized message plus a hash of
+# the context that can change the right answer (quoted text, Nova's previous turn), so a
+# session whose context differs simply misses. An optional semantic tier reuses a reply when
+# the message embedding is close enough to a cached one under the same context.
+RESPONSE_CACHE_ENABLED = os.environ.get("NOVA_RESPONSE_CACHE", "0") == "1"
+RESPONSE_CACHE_SEMANTIC = os.environ.get("NOVA_RESPONSE_CACHE_SEMANTIC", "0") == "1"
+RESPONSE_CACHE_SIZE = int(os.environ.get("NOVA_RESPONSE_CACHE_SIZE", "2048"))
+RESPONSE_CACHE_TTL = float(os.environ.get("NOVA_RESPONSE_CACHE_TTL", "3600"))
+RESPONSE_CACHE_SIMILARITY = float(os.environ.get("NOVA_RESPONSE_CACHE_SIMILARITY", "0.9"))
+RESPONSE_CACHE_MAX_WORDS = 6
+
+class ResponseCache:
+    """
+    TTL + LRU cache of replies with an exact tier and an optional embedding-similarity tier.
+    """
+    def __init__(self, size: int = RESPONSE_CACHE_SIZE, ttl: float = RESPONSE_CACHE_TTL, semantic: bool = RESPONSE_CACHE_SEMANTIC):
+        self.size = size
+        self.ttl = ttl
+        self.semantic = semantic
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._miss_latency = deque(maxlen=100)
+        self.stats = {"hits": 0, "semantic_hits": 0, "misses": 0, "bypassed": 0, "latency_saved_seconds": 0.0}
+
+    @staticmethod
+    def normalize(message: str) -> str:
+        return " ".join(retrieval.tokenize(message))
+
+    @staticmethod
+    def context_hash(context: str) -> str:
+        return hashlib.sha1(ResponseCache.normalize(context or "").encode("utf-8")).hexdigest()
+
+    def key(self, message: str, context: str = ""):
+        """
+        Returns the cache key for a turn, or None (and counts a bypass) if it is not eligible.
+        """
+        normalized = self.normalize(message)
+        if not normalized or len(normalized.split()) > RESPONSE_CACHE_MAX_WORDS:
+            self.stats["bypassed"] += 1
+            return None
+        return normalized, self.context_hash(context)
+
+    def get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] > now:
+                self._entries.move_to_end(key)
+                self._hit("hits")
+                return entry[0]
+            if entry is not None:
+                del self._entries[key]
+            if self.semantic:
+                reply = self._semantic_lookup(key, now)
+                if reply is not None:
+                    self._hit("semantic_hits")
+                    return reply
+            self.stats["misses"] += 1
+            return None
+
+    def _semantic_lookup(self, key, now: float):
+        candidates = [(k, e) for k, e in self._entries.items() if k[1] == key[1] and e[1] > now]
+        if not candidates:
+            return None
+        query = retrieval.store.embedder.embed([key[0]])[0]
+        scores = np.stack([e[2] for _, e in candidates]) @ query
+        best = int(np.argmax(scores))
+        return candidates[best][1][0] if scores[best] >= RESPONSE_CACHE_SIMILARITY else None
+
+    def _hit(self, kind: str):
+        self.stats[kind] += 1
+        if self._miss_latency:
+            self.stats["latency_saved_seconds"] += sum(self._miss_latency) / len(self._miss_latency)
+
+    def put(self, key, reply: str, latency: float):
+        vector = retrieval.store.embedder.embed([key[0]])[0] if self.semantic else None
+        with self._lock:
+            self._entries[key] = (reply, time.monotonic() + self.ttl, vector)
+            self._entries.move_to_end(key)
+            self._miss_latency.append(latency)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+response_cache = ResponseCache()
+
+async def generate_dialog_response(prompt: str, cache_message: str = None, cache_context: str = "") -> str:
+    """
+    Returns Nova's reply from the fastest healthy backend. Raises LLMUnavailable if none answer.
+    Pass the raw user message as cache_message (and what the reply depends on as cache_context)
+    to use the response cache when it is enabled.
+    """
+    key = response_cache.key(cache_message, cache_context) if RESPONSE_CACHE_ENABLED and cache_message else None
+    if key is not None:
+        cached = response_cache.get(key)
+        if cached is not None:
+            return cached
+    start = time.monotonic()
+    reply = await get_router().complete(prompt)
+    if key is not None and reply:
+        response_cache.put(key, reply, time.monotonic() - start)
+    return reply
+
+async def generate_dialog_response_stream(prompt: str, cache_message: str = None, cache_context: str = ""):
+    """
+    Streams Nova's reply token by token using OpenAI-compatible API's stream mode.
+    Yields: text chunks as they arrive. Raises LLMUnavailable if no backend answers.
+    A response cache hit is yielded as a single chunk.
+    """
+    key = response_cache.key(cache_message, cache_context) if RESPONSE_CACHE_ENABLED and cache_message else None
+    if key is not None:
+        cached = response_cache.get(key)
+        if cached is not None:
+            yield cached
+            return
+    start = time.monotonic()
+    chunks = []
+    async for delta in get_router().stream(prompt):
+        chunks.append(delta)
+        yield delta
+    if key is not None and chunks:
+        response_cache.put(key, "".join(chunks), time.monotonic() - start)
+
+def gemini_analyze_and_store(user_msg: models.Message, nova_msg: models.Message):
     """
     Gemini acts as the intelligent backend: analyzes the conversation, clusters, and stores relevant info in the DB.
     """
-    # Example: Save both user and Groq messages to DB, update threads, etc.
-    firebase.save_message(models.MessageCreate(session_id=session_id, text=user_message, mood='user'))
-    firebase.save_message(models.MessageCreate(session_id=session_id, text=groq_reply, mood='nova'))
+    # Save both user and Groq messages to DB in one batch, update threads, etc.
+    firebase.save_messages_batch([user_msg, nova_msg])
     # Optionally, update threads or summaries here using Gemini logic
     # ...
     return "ok"
@@ -242,11 +978,25 @@ def cluster_messages_by_topic_gemini(messages):
         "\nRespond in strict JSON as: [[0,1],[2,3,4],...]"
     )
     try:
-        genai.configure(api_key=GEMINI_API_KEY)
-        model = genai.GenerativeModel(GEMINI_MODEL)
-        response = model.generate_content(prompt)
-        clusters = json.loads(response.text.strip())
+        clusters = json.loads(gemini_generate(prompt))
         # Map indices back to messages
         return [[messages[i] for i in cluster] for cluster in clusters]
     except Exception as e:
-        return [messages]  # fallback: all in one cluster
\ No newline at end of file
+        return [messages]  # fallback: all in one cluster
+
+def gemini_label_topic(messages) -> str:
+    """
+    Asks Gemini for a short lowercase topic label for a thread. Returns None on failure.
+    """
+    chat_text = "\n".join([f"User: {m.text}" if getattr(m, 'mood', 'user') == 'user' else f"Nova: {m.text}" for m in messages])
+    prompt = (
+        "You are a memory agent for a chat system.\n"
+        "Give the main topic of the following conversation as a short lowercase label (1-3 words).\n"
+        "Respond with the label only.\n"
+        f"Chat:\n{chat_text}"
+    )
+    try:
+        return gemini_generate(prompt).strip().strip('"').lower() or None
+    except Exception as e:
+        print(f"Gemini topic labeling error: {e}")
+        return None
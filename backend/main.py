@@ -1,13 +1,193 @@
-from fastapi import FastAPI, HTTPException, Query, Body
+from fastapi import FastAPI, HTTPException, Query, Body, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse
+from fastapi.responses import StreamingResponse, PlainTextResponse, JSONResponse
+from contextlib import asynccontextmanager
+from starlette.concurrency import run_in_threadpool
+import asyncio
 import threading
-from backend import firebase, models, llm
+import queue
+import json
+import os
+import time
+from backend import firebase, models, llm, retrieval, search, clustering, jobs, metrics, timeindex, responses
 from typing import List, Optional
 from backend.models import Thread, Message
-import datetime
+from backend.context import assemble_prompt, default_budget, without_pending_message
 
-app = FastAPI()
+# --- Startup and Readiness ---
+# Nothing slow happens at import or before the server starts listening: the storage backend
+# (Firebase SDK), the Gemini SDK and the Groq connection pool are built by a background
+# warmup task. Requests arriving earlier still work, since every client is also created on
+# first use. Load balancers should route traffic once GET /ready returns 200.
+_warmup = {"state": "pending", "seconds": None, "components": {}}
+
+async def warm_up():
+    start = time.monotonic()
+    _warmup["state"] = "warming"
+    steps = (
+        ("storage", lambda: run_in_threadpool(firebase.get_storage)),
+        ("llm_clients", lambda: run_in_threadpool(llm.init_clients)),
+        ("groq_connection", llm.warm_clients),
+    )
+    failed = False
+    for name, step in steps:
+        step_start = time.monotonic()
+        try:
+            await step()
+            _warmup["components"][name] = {"ok": True, "seconds": round(time.monotonic() - step_start, 3)}
+        except Exception as e:
+            failed = True
+            _warmup["components"][name] = {"ok": False, "error": str(e)}
+            print(f"Warmup step {name} failed: {e}")
+    _warmup["seconds"] = round(time.monotonic() - start, 3)
+    _warmup["state"] = "failed" if failed else "ready"
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    warmup_task = asyncio.create_task(warm_up())
+    # Not part of readiness: a first build over a large history can take a while
+    search_task = asyncio.create_task(run_in_threadpool(search.load_index))
+    jobs.start_workers()
+    yield
+    warmup_task.cancel()
+    jobs.stop_workers()
+    if search_task.done() and search.status()["state"] == "ready":
+        await run_in_threadpool(search.save_snapshot)
+    await llm.close_clients()
+
+app = FastAPI(lifespan=lifespan)
+
+# --- Post-processing Queue ---
+# Exchanges whose stream was cut short by a client disconnect are handed to a small fixed
+# pool of workers instead of one daemon thread per request, so a burst of chats cannot
+# pile up threads.
+POSTPROCESS_QUEUE_SIZE = int(os.environ.get("NOVA_POSTPROCESS_QUEUE_SIZE", "256"))
+POSTPROCESS_WORKERS = int(os.environ.get("NOVA_POSTPROCESS_WORKERS", "2"))
+
+_postprocess_queue = queue.Queue(maxsize=POSTPROCESS_QUEUE_SIZE)
+_postprocess_workers = []
+_postprocess_lock = threading.Lock()
+
+def _postprocess_worker():
+    while True:
+        user_msg, nova_msg = _postprocess_queue.get()
+        try:
+            llm.gemini_analyze_and_store(user_msg, nova_msg)
+        except Exception as e:
+            print(f"Gemini background error: {e}")
+        finally:
+            _postprocess_queue.task_done()
+
+def enqueue_postprocess(user_msg: Message, nova_msg: Message):
+    """
+    Queues a finished exchange for gemini_analyze_and_store. Workers are started on first use.
+    Never blocks, since it is called from the event loop; a full queue drops the exchange.
+    """
+    with _postprocess_lock:
+        while len(_postprocess_workers) < POSTPROCESS_WORKERS:
+            worker = threading.Thread(target=_postprocess_worker, daemon=True)
+            worker.start()
+            _postprocess_workers.append(worker)
+    try:
+        _postprocess_queue.put_nowait((user_msg, nova_msg))
+    except queue.Full:
+        print(f"Post-processing queue full, dropping exchange for session {user_msg.session_id}")
+
+# --- Server-Sent Events ---
+# /chat/stream speaks SSE with typed events:
+#   start        {"user_message_id", "nova_message_id"}  ids the messages will be saved under
+#   first_token  {"ms"}                                   time to first token
+#   delta        {"text"}                                 reply text, coalesced into frames
+#   saved        {"messages": [user, nova]}               after both messages are persisted
+#   error        {"detail"}                               no backend could answer; nothing is saved
+#   done         {"ms", "chars"}                          end of stream
+SSE_FRAME_SECONDS = float(os.environ.get("NOVA_SSE_FRAME_MS", "30")) / 1000
+_STREAM_END = object()
+
+def sse_event(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+async def sse_reply_stream(request: Request, prompt: str, user_msg: Message, nova_msg: Message, cache_context: str = ""):
+    """
+    Streams the reply as SSE while accumulating it. Tiny deltas are coalesced into frames of
+    about SSE_FRAME_SECONDS. When the upstream stream ends the exchange is saved in one batch
+    and a `saved` event is sent. If the client disconnects, the upstream call is cancelled and
+    the partial reply is queued for post-processing instead; a disconnect before the first
+    token saves nothing, like an error.
+    """
+    start = time.monotonic()
+    chunks = []
+    pending = asyncio.Queue()
+
+    async def produce():
+        try:
+            async for chunk in llm.generate_dialog_response_stream(prompt, cache_message=user_msg.text, cache_context=cache_context):
+                await pending.put(chunk)
+            await pending.put(_STREAM_END)
+        except llm.LLMUnavailable as e:
+            await pending.put(e)
+
+    producer = asyncio.create_task(produce())
+    getter = None
+    finished = False
+    try:
+        yield sse_event("start", {"user_message_id": user_msg.message_id, "nova_message_id": nova_msg.message_id})
+        frame = []
+        frame_started = None
+        while True:
+            timeout = None if frame_started is None else max(0.0, frame_started + SSE_FRAME_SECONDS - time.monotonic())
+            # A pending get() is reused across frame timeouts so no chunk is ever dropped
+            if getter is None:
+                getter = asyncio.ensure_future(pending.get())
+            done, _ = await asyncio.wait({getter}, timeout=timeout)
+            item = None
+            if done:
+                item, getter = getter.result(), None
+            if isinstance(item, str):
+                if not chunks:
+                    yield sse_event("first_token", {"ms": round((time.monotonic() - start) * 1000, 1)})
+                chunks.append(item)
+                frame.append(item)
+                if frame_started is None:
+                    frame_started = time.monotonic()
+                if time.monotonic() - frame_started < SSE_FRAME_SECONDS:
+                    continue
+            if frame:
+                yield sse_event("delta", {"text": "".join(frame)})
+                frame, frame_started = [], None
+            if await request.is_disconnected():
+                break
+            if isinstance(item, llm.LLMUnavailable):
+                print(f"LLM unavailable in /chat/stream: {item}")
+                finished = True
+                yield sse_event("error", {"detail": "Sorry, I can't reply right now. Please try again in a moment."})
+                break
+            if item is _STREAM_END:
+                nova_msg.text = "".join(chunks)
+                await run_in_threadpool(firebase.save_messages_batch, [user_msg, nova_msg])
+                finished = True
+                yield sse_event("saved", {"messages": [user_msg.model_dump(), nova_msg.model_dump()]})
+                break
+        yield sse_event("done", {"ms": round((time.monotonic() - start) * 1000, 1), "chars": len(nova_msg.text)})
+    finally:
+        producer.cancel()
+        if getter is not None:
+            getter.cancel()
+        if not finished and chunks:
+            nova_msg.text = "".join(chunks)
+            enqueue_postprocess(user_msg, nova_msg)
+
+def reply_cache_context(quoted_text: Optional[str], history: list) -> str:
+    """
+    What a cached reply to a short message depends on: the quoted text and Nova's previous turn.
+    """
+    last_nova = ""
+    for m in reversed(history):
+        mood = m.get('mood') if isinstance(m, dict) else m.mood
+        if mood == 'nova':
+            last_nova = m.get('text', '') if isinstance(m, dict) else m.text
+            break
+    return f"{quoted_text or ''}\n{last_nova}"
 
 # Allow CORS for frontend
 app.add_middleware(
@@ -17,25 +197,47 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# Outermost, so request timings include every other middleware
+app.add_middleware(metrics.TracingMiddleware)
 
-@app.get("/messages", response_model=List[models.Message])
-def get_messages(session_id: Optional[str] = Query(None)):
+@app.get("/messages")
+def get_messages(
+    request: Request,
+    session_id: Optional[str] = Query(None),
+    limit: int = Query(firebase.MESSAGE_PAGE_SIZE, ge=1, le=firebase.MAX_MESSAGE_PAGE_SIZE),
+    before: Optional[str] = Query(None),
+    after: Optional[str] = Query(None),
+):
+    """
+    Streams one page of messages as NDJSON (one Message per line, chronological).
+    Use `before` with the oldest timestamp seen to scroll back, and `after` with the
+    newest timestamp seen to sync only what is new.
+    """
     try:
-        return firebase.get_messages(session_id=session_id)
+        page = firebase.iter_messages_page(session_id=session_id, limit=limit, before=before, after=after)
+        # Pull the first message eagerly so storage errors still surface as a 500
+        first = next(page, None)
     except Exception as e:
         print("ERROR in /messages:", e)
         raise HTTPException(status_code=500, detail=str(e))
 
+    def messages():
+        if first is None:
+            return
+        yield first
+        yield from page
+
+    return responses.ndjson_response(request, messages())
+
 @app.post("/message", response_model=List[models.Message])
-def post_message(msg: models.MessageCreate):
-    print("POST /message called with :", msg)
+async def post_message(msg: models.MessageCreate):
     try:
-        # Save user message
-        user_msg = firebase.save_message(msg)
+        # Build user message; both sides of the turn are written in one batch below
+        user_msg = await run_in_threadpool(firebase.new_message, msg)
         # Generate Nova reply using Groq
-        prompt = msg.text
-        nova_reply_text = llm.generate_dialog_response(prompt)
-        nova_msg = firebase.save_message(models.MessageCreate(
+        prompt = assemble_prompt(msg.text, quoted_text=msg.quoted_text, budget=default_budget(llm.SYSTEM_PROMPT))
+        nova_reply_text = await llm.generate_dialog_response(prompt, cache_message=msg.text, cache_context=msg.quoted_text or "")
+        nova_msg = firebase.new_message(models.MessageCreate(
             session_id=user_msg.session_id,
             text=nova_reply_text,
             quoted_reply_to=user_msg.message_id,
@@ -43,58 +245,101 @@ def post_message(msg: models.MessageCreate):
             tags=[],
             mood="nova",
         ))
+        await run_in_threadpool(firebase.save_messages_batch, [user_msg, nova_msg])
         return [user_msg, nova_msg]
+    except llm.LLMUnavailable as e:
+        print("LLM unavailable in /message:", e)
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         print("ERROR in /message:", e)
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.post("/threads/cluster", response_model=List[Thread])
+@app.post("/threads/cluster", response_model=List[models.ThreadHeader])
 def cluster_threads(session_id: str):
-    messages = firebase.get_messages(session_id=session_id)
-    clusters = llm.cluster_messages_by_topic_gemini(messages)
-    threads = []
-    now = datetime.datetime.now(datetime.timezone.utc).isoformat()  # Convert to string
-    for idx, cluster in enumerate(clusters):
-        thread = Thread(
-            thread_id=f"{session_id}-thread-{idx}",
-            topic=f"Topic {idx+1}",  # Optionally use topic detection
-            messages=cluster,
-            created_at=now,
-            updated_at=now
-        )
-        firebase.save_thread(thread)
-        threads.append(thread)
-    return threads
-
-@app.get("/threads", response_model=List[Thread])
-def get_all_threads():
-    return firebase.get_all_threads()
-
-@app.get("/threads/by-topic", response_model=List[Thread])
-def get_threads_by_topic(topic: str):
-    return firebase.get_threads_by_topic(topic)
+    """
+    Assigns the session's new messages to existing topic threads (or new ones) and
+    returns the headers of all of its threads. Only threads that changed are written.
+    """
+    return [firebase.thread_header(t) for t in clustering.cluster_session(session_id)]
+
+# Thread listings return headers (message ids, topic, counts) without message bodies;
+# fetch a thread or a slice of its messages to hydrate it.
+# Read endpoints below return models built from storage through responses.json_response,
+# skipping response_model re-validation; response_model only documents the shape.
+@app.get("/threads", response_model=List[models.ThreadHeader])
+def get_all_threads(request: Request, session_id: Optional[str] = Query(None)):
+    return responses.json_response(request, firebase.get_thread_headers(session_id=session_id))
+
+@app.get("/threads/by-topic", response_model=List[models.ThreadHeader])
+def get_threads_by_topic(request: Request, topic: str):
+    return responses.json_response(request, firebase.get_thread_headers(topic=topic))
+
+@app.get("/threads/{thread_id}", response_model=Thread)
+def get_thread(request: Request, thread_id: str):
+    thread = firebase.get_thread(thread_id)
+    if thread is None:
+        raise HTTPException(status_code=404, detail="Thread not found")
+    return responses.json_response(request, thread)
+
+@app.get("/threads/{thread_id}/messages", response_model=List[Message])
+def get_thread_messages(request: Request, thread_id: str, offset: int = Query(0, ge=0), limit: int = Query(100, ge=1, le=firebase.MAX_MESSAGE_PAGE_SIZE)):
+    messages = firebase.get_thread_messages(thread_id, offset=offset, limit=limit)
+    if messages is None:
+        raise HTTPException(status_code=404, detail="Thread not found")
+    return responses.json_response(request, messages)
+
+@app.get("/topics/{topic}/sessions", response_model=List[models.TopicSession])
+def get_topic_sessions(request: Request, topic: str, limit: int = Query(20, ge=1, le=100), before: Optional[str] = Query(None)):
+    """
+    Pages through a topic's session summaries, newest first.
+    """
+    try:
+        return responses.json_response(request, firebase.get_topic_sessions(topic, limit=limit, before=before))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+SMART_CONTEXT_K = 8
+SMART_RECENT_TURNS = 10
 
 @app.post("/message-smart", response_model=List[Message])
-def post_message_smart(msg: models.MessageCreate):
-    # Save user message
-    user_msg = firebase.save_message(msg)
-    # Fetch relevant thread context using topic clustering
-    all_msgs = firebase.get_messages(session_id=user_msg.session_id)
-    clusters = llm.cluster_messages_by_topic_gemini(all_msgs)
-    # Find the first cluster as the best thread (fallback)
-    best_thread = clusters[0] if clusters else []
-    context = "\n".join([getattr(m, 'text', '') for m in best_thread if hasattr(m, 'text')]) if best_thread else ""
+async def post_message_smart(msg: models.MessageCreate):
+    # Build user message; it is saved together with Nova's reply
+    user_msg = await run_in_threadpool(firebase.new_message, msg)
+    # Fetch relevant context by local semantic search over the session (no LLM call)
+    best_thread = await run_in_threadpool(retrieval.retrieve_context, user_msg.session_id, msg.text, SMART_CONTEXT_K)
+    recent = await run_in_threadpool(firebase.get_recent_messages, user_msg.session_id, SMART_RECENT_TURNS)
+    # "What did we talk about yesterday?": read only that period's time buckets
+    recall = await run_in_threadpool(timeindex.recall, msg.text)
+    retrieved = list(best_thread)
+    summary_points = []
+    if recall:
+        retrieved = recall.context() + retrieved
+        summary_points = recall.summaries
     # Use Gemini for extra context if needed (e.g., if context is sparse)
-    if not context or len(best_thread) < 2:
-        summary = llm.generate_summary(user_msg.session_id)
-        context += "\n" + "\n".join(summary.summary)
-    # Compose prompt for Groq (Llama)
-    prompt = f"Context: {context}\nUser: {msg.text}"
-    nova_reply_text = llm.generate_dialog_response(prompt)
+    elif len(best_thread) < 2:
+        summary = await run_in_threadpool(llm.generate_summary, user_msg.session_id)
+        summary_points = summary.summary
+    # Compose prompt for Groq (Llama) within the model's token budget
+    prompt = assemble_prompt(
+        msg.text,
+        history=recent,
+        retrieved=retrieved,
+        summaries=summary_points,
+        quoted_text=msg.quoted_text,
+        budget=default_budget(llm.SYSTEM_PROMPT),
+    )
+    cache_context = reply_cache_context(msg.quoted_text, recent)
+    if recall:
+        cache_context += f"\n{recall.cache_key()}"
+    try:
+        nova_reply_text = await llm.generate_dialog_response(prompt, cache_message=msg.text, cache_context=cache_context)
+    except llm.LLMUnavailable as e:
+        print("LLM unavailable in /message-smart:", e)
+        raise HTTPException(status_code=503, detail=str(e))
     # Post-process for human-like texting (simple version)
     if nova_reply_text:
         nova_reply_text = nova_reply_text.replace("\n", " ").strip()
-    nova_msg = firebase.save_message(models.MessageCreate(
+    nova_msg = firebase.new_message(models.MessageCreate(
         session_id=user_msg.session_id,
         text=nova_reply_text,
         quoted_reply_to=user_msg.message_id,
@@ -102,12 +347,13 @@ def post_message_smart(msg: models.MessageCreate):
         tags=[],
         mood="nova",
     ))
+    await run_in_threadpool(firebase.save_messages_batch, [user_msg, nova_msg])
     return [user_msg, nova_msg]
 
 @app.get("/summary", response_model=List[models.SessionSummary])
-def get_summary(session_id: Optional[str] = Query(None)):
+def get_summary(request: Request, session_id: Optional[str] = Query(None)):
     try:
-        return firebase.get_summaries(session_id=session_id)
+        return responses.json_response(request, firebase.get_summaries(session_id=session_id))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -129,34 +375,171 @@ def create_session():
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/chat/stream")
-def chat_stream(
+async def chat_stream(
+    request: Request,
     user_message: str = Body(...),
     local_history: list = Body(...),
-    session_id: str = Body(...)
+    session_id: str = Body(...),
+    quoted_text: Optional[str] = Body(None),
+    quoted_reply_to: Optional[str] = Body(None),
 ):
     """
-    Streaming chat endpoint:
-    1. Streams Groq's reply as it is generated.
-    2. After streaming, Gemini analyzes and stores the conversation in the background.
+    Streaming chat endpoint (Server-Sent Events):
+    1. Streams Groq's reply as it is generated (a single upstream call per turn).
+    2. After streaming, both messages are saved in one batch and their ids are sent.
+    Only as much of local_history as fits the token budget is sent, newest turns first.
     """
-    context = "\n".join([f"User: {m['text']}" if m.get('mood', 'user') == 'user' else f"Nova: {m['text']}" for m in local_history])
-    prompt = f"{context}\nUser: {user_message}"
-    stream = llm.generate_dialog_response_stream(prompt)
+    local_history = without_pending_message(local_history, user_message)
+    recall = await run_in_threadpool(timeindex.recall, user_message)
+    prompt = assemble_prompt(
+        user_message,
+        history=local_history,
+        retrieved=recall.context() if recall else (),
+        summaries=recall.summaries if recall else (),
+        quoted_text=quoted_text,
+        budget=default_budget(llm.SYSTEM_PROMPT),
+    )
+    cache_context = reply_cache_context(quoted_text, local_history)
+    if recall:
+        cache_context += f"\n{recall.cache_key()}"
+    # Ids are assigned up front so the client can reference the messages before they are saved
+    user_msg = firebase.new_message(models.MessageCreate(
+        session_id=session_id, text=user_message, quoted_reply_to=quoted_reply_to, quoted_text=quoted_text, mood="user",
+    ))
+    nova_msg = firebase.new_message(models.MessageCreate(
+        session_id=session_id, text="", quoted_reply_to=user_msg.message_id, quoted_text=user_message, mood="nova",
+    ))
+    stream = sse_reply_stream(request, prompt, user_msg, nova_msg, cache_context=cache_context)
+    return StreamingResponse(stream, media_type="text/event-stream", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
 
-    def background_gemini():
-        # Wait for the full reply to be streamed, then analyze/store
-        full_reply = "".join([chunk for chunk in llm.generate_dialog_response_stream(prompt)])
-        try:
-            llm.gemini_analyze_and_store(user_message, full_reply, session_id)
-        except Exception as e:  # More specific exception can be used if known
-            print(f"Gemini background error: {e}")
+@app.get("/search")
+def search_messages(
+    request: Request,
+    q: str = Query(..., min_length=1),
+    session_id: Optional[str] = Query(None),
+    mood: Optional[str] = Query(None, description="user or nova"),
+    start: Optional[str] = Query(None, description="ISO timestamp, inclusive"),
+    end: Optional[str] = Query(None, description="ISO timestamp, exclusive"),
+    when: Optional[str] = Query(None, description="Relative time such as 'yesterday' or 'last week', instead of start/end"),
+    limit: int = Query(20, ge=1, le=search.SEARCH_MAX_LIMIT),
+):
+    """
+    Full-text search over all messages, BM25-ranked, with [start, end] character offsets of
+    the matched terms in each message for highlighting.
+    """
+    if search.status()["state"] == "loading":
+        raise HTTPException(status_code=503, detail="Search index is loading")
+    if when:
+        time_range = timeindex.parse_time_range(when)
+        if time_range is None:
+            raise HTTPException(status_code=400, detail=f"Unrecognized time expression '{when}'")
+        start, end = time_range.bounds()
+    try:
+        results = search.search(q, limit=limit, session_id=session_id, mood=mood, start=start, end=end)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return responses.json_response(request, results)
+
+@app.get("/search/stats")
+def search_stats():
+    return search.status()
+
+@app.get("/recall")
+def recall_messages(q: str = Query(..., description="Text containing a time expression, e.g. 'last friday evening'")):
+    """
+    Shows what a chat turn mentioning `q` would recall: the resolved UTC range, the
+    messages taken from its time buckets and the bucket summaries. Unlike chat turns,
+    `q` needs no recall cue.
+    """
+    recall = timeindex.recall(q, require_cue=False)
+    if recall is None:
+        raise HTTPException(status_code=404, detail="No time expression found")
+    return recall.to_dict()
+
+@app.get("/ready")
+def readiness():
+    """
+    200 once the background warmup has built the storage and LLM clients, 503 before that
+    (or if a step failed), with per-step timings either way.
+    """
+    status_code = 200 if _warmup["state"] == "ready" else 503
+    return JSONResponse(_warmup, status_code=status_code)
 
-    threading.Thread(target=background_gemini, daemon=True).start()
-    return StreamingResponse(stream, media_type="text/plain")
+@app.get("/llm/stats")
+def llm_stats():
+    """
+    Rolling latency percentiles, error rate and circuit state per dialog backend.
+    """
+    return {"backends": llm.get_router().snapshot(), "response_cache": llm.response_cache.stats}
+
+@app.get("/jobs/stats")
+def job_stats():
+    """
+    Pending, running and failed job counts and recent enqueue-to-done latency (seconds).
+    """
+    return jobs.stats()
 
 @app.post("/gemini/context")
 def gemini_context(session_id: str = Body(...), topic: str = Body(...)):
     """
     Returns Gemini-generated summary/context for a given topic and session.
     """
-    return {"context": llm.get_gemini_context(session_id, topic)}
\ No newline at end of file
+    return {"context": llm.get_gemini_context(session_id, topic)}
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def prometheus_metrics():
+    """
+    Prometheus text exposition: span, LLM phase and request histograms plus the counters
+    and gauges already kept by the caches, the job queue and the dialog router.
+    """
+    lines = metrics.render()
+    lines += metrics.render_samples(
+        "nova_session_cache_events_total", "Session and recent-message cache lookups.", "counter",
+        [({"event": event}, value) for event, value in firebase.get_cache_stats().items()],
+    )
+    lines += metrics.render_samples(
+        "nova_summary_cache_events_total", "Session summary memo lookups.", "counter",
+        [({"event": event}, value) for event, value in llm.summary_cache.stats.items()],
+    )
+    response_stats = dict(llm.response_cache.stats)
+    lines += metrics.render_samples(
+        "nova_response_cache_events_total", "Response cache lookups.", "counter",
+        [({"event": event}, value) for event, value in response_stats.items() if event != "latency_saved_seconds"],
+    )
+    lines += metrics.render_samples(
+        "nova_response_cache_latency_saved_seconds_total", "LLM latency avoided by response cache hits.", "counter",
+        [({}, response_stats.get("latency_saved_seconds"))],
+    )
+    job_stats = jobs.stats()
+    lines += metrics.render_samples(
+        "nova_jobs", "Pending, running and failed background jobs.", "gauge",
+        [({"status": status}, count) for status, count in job_stats["depth"].items()],
+    )
+    lines += metrics.render_samples(
+        "nova_job_latency_seconds", "Enqueue-to-done latency of recent jobs.", "gauge",
+        [({"quantile": "0.5"}, job_stats.get("latency_p50")), ({"quantile": "0.95"}, job_stats.get("latency_p95"))],
+    )
+    lines += metrics.render_samples(
+        "nova_postprocess_queue_depth", "Exchanges waiting for post-processing.", "gauge",
+        [({}, _postprocess_queue.qsize())],
+    )
+    backends = llm.get_router().snapshot()
+    lines += metrics.render_samples(
+        "nova_llm_backend_latency_seconds", "Router's rolling latency window per dialog backend.", "gauge",
+        [({"backend": name, "quantile": q}, snap[key]) for name, snap in backends.items()
+         for q, key in (("0.5", "p50"), ("0.95", "p95"))],
+    )
+    lines += metrics.render_samples(
+        "nova_llm_backend_first_token_seconds", "Router's rolling time-to-first-token window per dialog backend.", "gauge",
+        [({"backend": name, "quantile": q}, snap[key]) for name, snap in backends.items()
+         for q, key in (("0.5", "first_token_p50"), ("0.95", "first_token_p95"))],
+    )
+    lines += metrics.render_samples(
+        "nova_llm_backend_error_rate", "Router's rolling error rate per dialog backend.", "gauge",
+        [({"backend": name}, snap["error_rate"]) for name, snap in backends.items()],
+    )
+    lines += metrics.render_samples(
+        "nova_llm_backend_circuit_open", "1 while a backend's circuit breaker is open.", "gauge",
+        [({"backend": name}, int(snap["circuit_open"])) for name, snap in backends.items()],
+    )
+    return PlainTextResponse("\n".join(lines) + "\n", media_type="text/plain; version=0.0.4")
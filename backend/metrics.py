@@ -0,0 +1,254 @@
+from typing import Dict, Iterable, List, Sequence, Tuple
+from bisect import bisect_left
+from contextvars import ContextVar
+from collections.abc import Iterator
+import functools
+import os
+import random
+import threading
+import time
+
+# --- Tracing ---
+# Spans time hot-path work (storage operations, LLM calls and their phases, prompt assembly)
+# into histograms that /metrics serves in Prometheus text format. Each HTTP request is
+# sampled with probability NOVA_TRACE_SAMPLE_RATE when it starts; spans of unsampled requests
+# cost one context lookup and record nothing. Work outside a request (job workers, background
+# threads) is sampled per span. With NOVA_SERVER_TIMING=1, sampled requests also get a
+# Server-Timing header summing their spans up to the moment the response headers are sent.
+TRACE_SAMPLE_RATE = float(os.environ.get("NOVA_TRACE_SAMPLE_RATE", "1.0"))
+SERVER_TIMING = os.environ.get("NOVA_SERVER_TIMING", "0") == "1"
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+class Histogram:
+    """
+    Thread-safe Prometheus histogram with fixed buckets and positional label values.
+    """
+    def __init__(self, name: str, help: str, labelnames: Sequence[str], buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series: Dict[Tuple[str, ...], list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels: str):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                # Per-bucket counts (last slot is +Inf), then sum
+                series = self._series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = {labels: list(values) for labels, values in self._series.items()}
+        for labels, values in sorted(series.items()):
+            base = list(zip(self.labelnames, labels))
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), values):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f"{self.name}_bucket{format_labels(base + [('le', le)])} {cumulative}")
+            lines.append(f"{self.name}_sum{format_labels(base)} {values[-1]}")
+            lines.append(f"{self.name}_count{format_labels(base)} {cumulative}")
+        return lines
+
+def format_labels(pairs: Iterable[Tuple[str, str]]) -> str:
+    pairs = list(pairs)
+    if not pairs:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n") for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+def render_samples(name: str, help: str, kind: str, samples: Iterable[Tuple[dict, float]]) -> List[str]:
+    """
+    Renders already-aggregated values (counters or gauges kept elsewhere) as one metric family.
+    Samples whose value is None are skipped.
+    """
+    lines = [f"# HELP {name} {help}", f"# TYPE {name} {kind}"]
+    for labels, value in samples:
+        if value is None:
+            continue
+        lines.append(f"{name}{format_labels(labels.items())} {float(value)}")
+    return lines
+
+SPAN_SECONDS = Histogram("nova_span_seconds", "Duration of traced operations.", ("span",))
+LLM_PHASE_SECONDS = Histogram(
+    "nova_llm_phase_seconds",
+    "LLM call phases: queue (pool or rate-limit wait), connect, first_token and total.",
+    ("backend", "phase"),
+)
+REQUEST_SECONDS = Histogram("nova_request_seconds", "HTTP request duration.", ("method", "route", "status"))
+_histograms = [REQUEST_SECONDS, SPAN_SECONDS, LLM_PHASE_SECONDS]
+
+def render() -> List[str]:
+    lines = []
+    for histogram in _histograms:
+        lines += histogram.render()
+    return lines
+
+class Trace:
+    """
+    Per-request span totals, used for the Server-Timing header.
+    """
+    def __init__(self):
+        self.spans: Dict[str, list] = {}
+        self._lock = threading.Lock()
+
+    def add(self, name: str, seconds: float):
+        with self._lock:
+            entry = self.spans.setdefault(name, [0.0, 0])
+            entry[0] += seconds
+            entry[1] += 1
+
+    def server_timing(self, total: float) -> str:
+        with self._lock:
+            parts = [f"{name};dur={seconds * 1000:.1f}" for name, (seconds, _) in self.spans.items()]
+        parts.append(f"total;dur={total * 1000:.1f}")
+        return ", ".join(parts)
+
+# None: outside any request; _UNSAMPLED: inside a request that was not sampled
+_UNSAMPLED = object()
+_current: ContextVar = ContextVar("nova_trace", default=None)
+
+def _sample() -> bool:
+    return TRACE_SAMPLE_RATE >= 1.0 or random.random() < TRACE_SAMPLE_RATE
+
+def current_trace():
+    """
+    Returns the current Trace, None when tracing outside a request, or False when this
+    work is not being sampled.
+    """
+    trace = _current.get()
+    if trace is _UNSAMPLED or (trace is None and not _sample()):
+        return False
+    return trace
+
+def record(name: str, seconds: float, trace=None):
+    SPAN_SECONDS.observe(seconds, name)
+    if trace:
+        trace.add(name, seconds)
+
+def record_llm_phase(backend: str, phase: str, seconds: float, trace=None):
+    LLM_PHASE_SECONDS.observe(seconds, backend, phase)
+    if trace:
+        trace.add(f"llm.{phase}", seconds)
+
+class span:
+    """
+    Context manager timing a block as the span `name`:
+
+        with metrics.span("storage.save_messages"):
+            ...
+    """
+    __slots__ = ("name", "trace", "start")
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self):
+        self.trace = current_trace()
+        self.start = time.perf_counter() if self.trace is not False else None
+        return self
+
+    def __exit__(self, *exc):
+        if self.start is not None:
+            record(self.name, time.perf_counter() - self.start, self.trace)
+        return False
+
+def timed(name: str):
+    """
+    Decorator form of span.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def _timed_iter(name: str, iterator, trace, elapsed: float):
+    """
+    Times only the work of producing items, not the consumer's work between them.
+    """
+    try:
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                elapsed += time.perf_counter() - start
+            yield item
+    finally:
+        record(name, elapsed, trace)
+
+class Traced:
+    """
+    Proxy wrapping every public method of `target` in a span named `<prefix>.<method>`.
+    Methods returning iterators are timed across the production of all their items.
+    """
+    def __init__(self, target, prefix: str):
+        self._target = target
+        self._prefix = prefix
+
+    def __getattr__(self, name: str):
+        attr = getattr(self._target, name)
+        if name.startswith("_") or not callable(attr):
+            return attr
+        span_name = f"{self._prefix}.{name}"
+
+        def call(*args, **kwargs):
+            trace = current_trace()
+            if trace is False:
+                return attr(*args, **kwargs)
+            start = time.perf_counter()
+            result = attr(*args, **kwargs)
+            elapsed = time.perf_counter() - start
+            if isinstance(result, Iterator):
+                return _timed_iter(span_name, result, trace, elapsed)
+            record(span_name, elapsed, trace)
+            return result
+
+        self.__dict__[name] = call
+        return call
+
+class TracingMiddleware:
+    """
+    ASGI middleware: decides sampling per request, records request duration by route, and
+    adds the Server-Timing header when enabled. Written against raw ASGI so streamed
+    responses pass through untouched.
+    """
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        trace = Trace() if _sample() else _UNSAMPLED
+        token = _current.set(trace)
+        start = time.perf_counter()
+        status = 500
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if SERVER_TIMING and trace is not _UNSAMPLED:
+                    header = trace.server_timing(time.perf_counter() - start)
+                    message["headers"] = list(message.get("headers", [])) + [(b"server-timing", header.encode("latin-1"))]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _current.reset(token)
+            if trace is not _UNSAMPLED:
+                route = getattr(scope.get("route"), "path", None) or "unmatched"
+                REQUEST_SECONDS.observe(time.perf_counter() - start, scope["method"], route, str(status))
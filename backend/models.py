@@ -30,9 +30,35 @@ class SessionSummary(BaseModel):
     topics: List[str]
     session_id: str 
 
+class SummaryCacheEntry(BaseModel):
+    session_id: str
+    fingerprint: str
+    last_timestamp: str
+    message_count: int
+    summary: SessionSummary
+
+class TopicSession(BaseModel):
+    session_id: str
+    summary: List[str]
+    timestamp: str
+    message_ids: List[str] = []
+
 class Thread(BaseModel):
     thread_id: str
+    session_id: Optional[str] = None
     topic: str
     messages: List[Message]
     created_at: str
+    updated_at: str
+
+# Stored form of a thread: ordered message-id references plus metadata. Message bodies live
+# only in /messages and are hydrated into a Thread on demand.
+class ThreadHeader(BaseModel):
+    thread_id: str
+    session_id: Optional[str] = None
+    topic: str
+    message_ids: List[str] = []
+    message_count: int = 0
+    last_message_at: Optional[str] = None
+    created_at: str
     updated_at: str 
\ No newline at end of file
@@ -0,0 +1,123 @@
+from fastapi import Request
+from fastapi.responses import Response, StreamingResponse
+from pydantic import BaseModel
+from typing import Iterable, Iterator, Optional
+import os
+import zlib
+import orjson
+
+# --- Fast Responses ---
+# Endpoints returning large lists of stored documents (messages, threads, summaries) build
+# their response here instead of through `response_model`: the models were already validated
+# when they were built from storage, so FastAPI's second validation pass is skipped and the
+# body is encoded with orjson. Models are serialized from their __dict__, which is exact for
+# models without aliases or custom serializers (all of backend/models.py).
+#
+# Bodies of at least NOVA_COMPRESS_MIN_BYTES are compressed when the client accepts it:
+# brotli when the client prefers it (the `brotli` package is in requirements.txt; without it
+# responses fall back to gzip), else gzip.
+# NOVA_RESPONSE_COMPRESSION=0 turns compression off (e.g. behind a compressing proxy).
+COMPRESSION = os.environ.get("NOVA_RESPONSE_COMPRESSION", "1") == "1"
+COMPRESS_MIN_BYTES = int(os.environ.get("NOVA_COMPRESS_MIN_BYTES", "1024"))
+GZIP_LEVEL = int(os.environ.get("NOVA_GZIP_LEVEL", "1"))
+BROTLI_QUALITY = int(os.environ.get("NOVA_BROTLI_QUALITY", "4"))
+# Streamed NDJSON is flushed in chunks of about this size
+STREAM_CHUNK_BYTES = 64 * 1024
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+def _default(obj):
+    if isinstance(obj, BaseModel):
+        return obj.__dict__
+    raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+
+def dumps(content) -> bytes:
+    return orjson.dumps(content, default=_default)
+
+def negotiate_encoding(request: Optional[Request]) -> Optional[str]:
+    """
+    Picks "br", "gzip" or None from the request's Accept-Encoding, honoring q-values.
+    """
+    if not COMPRESSION or request is None:
+        return None
+    accepted = {}
+    for part in request.headers.get("accept-encoding", "").split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        accepted[name.strip().lower()] = q
+    wildcard = accepted.get("*", 0.0)
+    candidates = (["br"] if brotli is not None else []) + ["gzip"]
+    best = max(candidates, key=lambda name: accepted.get(name, wildcard))
+    return best if accepted.get(best, wildcard) > 0 else None
+
+class Compressor:
+    """
+    Incremental gzip or brotli encoder. Every compress() call is flushed, so each chunk
+    can be decoded as soon as it arrives.
+    """
+    def __init__(self, encoding: str):
+        self.encoding = encoding
+        if encoding == "br":
+            self._brotli = brotli.Compressor(quality=BROTLI_QUALITY)
+        else:
+            self._zlib = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes, final: bool = False) -> bytes:
+        if self.encoding == "br":
+            out = self._brotli.process(data)
+            return out + (self._brotli.finish() if final else self._brotli.flush())
+        return self._zlib.compress(data) + self._zlib.flush(zlib.Z_FINISH if final else zlib.Z_SYNC_FLUSH)
+
+def _headers(encoding: Optional[str]) -> dict:
+    headers = {"Vary": "Accept-Encoding"}
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    return headers
+
+def json_response(request: Optional[Request], content, status_code: int = 200) -> Response:
+    """
+    orjson-encoded JSON response, compressed when the client accepts it.
+    """
+    body = dumps(content)
+    encoding = negotiate_encoding(request) if len(body) >= COMPRESS_MIN_BYTES else None
+    if encoding:
+        body = Compressor(encoding).compress(body, final=True)
+    return Response(body, status_code=status_code, media_type="application/json", headers=_headers(encoding))
+
+def ndjson_chunks(items: Iterable, encoding: Optional[str] = None) -> Iterator[bytes]:
+    """
+    One JSON document per line, yielded in chunks of about STREAM_CHUNK_BYTES, each
+    compressed with `encoding` if given.
+    """
+    compressor = Compressor(encoding) if encoding else None
+    buffer = []
+    size = 0
+    for item in items:
+        line = dumps(item) + b"\n"
+        buffer.append(line)
+        size += len(line)
+        if size >= STREAM_CHUNK_BYTES:
+            data = b"".join(buffer)
+            yield compressor.compress(data) if compressor else data
+            buffer, size = [], 0
+    data = b"".join(buffer)
+    if compressor:
+        yield compressor.compress(data, final=True)
+    elif data:
+        yield data
+
+def ndjson_response(request: Optional[Request], items: Iterable) -> StreamingResponse:
+    """
+    Streams items as NDJSON, compressed chunk by chunk when the client accepts it.
+    """
+    encoding = negotiate_encoding(request)
+    return StreamingResponse(ndjson_chunks(items, encoding), media_type="application/x-ndjson", headers=_headers(encoding))
@@ -0,0 +1,201 @@
+from backend import models
+from typing import Dict, List, Optional, Tuple
+from collections import OrderedDict
+import logging
+import os
+import re
+import threading
+import zlib
+import numpy as np
+
+logger = logging.getLogger("nova-retrieval")
+
+# --- Embedders ---
+# Every message is embedded once when it is saved. The default embedder is a CPU-only
+# feature-hashing vectorizer so retrieval needs no model download or network call;
+# anything with the same embed() signature can be swapped in with set_embedder.
+EMBEDDING_DIM = int(os.environ.get("NOVA_EMBEDDING_DIM", "512"))
+MAX_INDEXED_SESSIONS = int(os.environ.get("NOVA_MAX_INDEXED_SESSIONS", "512"))
+MIN_SIMILARITY = 0.1
+
+_TOKEN_RE = re.compile(r"[a-z0-9']+")
+# Same tokens matched on the original text, so offsets stay valid when lower() changes lengths
+_TOKEN_SPAN_RE = re.compile(r"[a-z0-9']+", re.IGNORECASE)
+
+def tokenize(text: str) -> List[str]:
+    return _TOKEN_RE.findall(text.lower())
+
+def token_spans(text: str) -> List[Tuple[str, int, int]]:
+    """
+    Tokens of `text` as (token, start, end) character offsets, for highlighting.
+    """
+    return [(m.group(0).lower(), m.start(), m.end()) for m in _TOKEN_SPAN_RE.finditer(text)]
+
+class HashingEmbedder:
+    """
+    Signed feature hashing over unigrams and bigrams, L2-normalized.
+    Uses crc32 rather than hash() so vectors are stable across processes.
+    """
+    def __init__(self, dim: int = EMBEDDING_DIM):
+        self.dim = dim
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            tokens = tokenize(text)
+            features = tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+            for feature in features:
+                h = zlib.crc32(feature.encode("utf-8"))
+                vectors[row, h % self.dim] += 1.0 if h & 0x80000000 else -1.0
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+
+# --- Vector Index ---
+class VectorIndex:
+    """
+    Append-only matrix of unit vectors with parallel message payloads.
+    Search is one matrix-vector product plus a partial sort.
+    """
+    def __init__(self, dim: int, capacity: int = 64):
+        self._vectors = np.zeros((capacity, dim), dtype=np.float32)
+        self._payloads: List[models.Message] = []
+        self._ids = set()
+
+    def __len__(self):
+        return len(self._payloads)
+
+    def __contains__(self, message_id: str):
+        return message_id in self._ids
+
+    def add(self, messages: List[models.Message], vectors: np.ndarray):
+        for message, vector in zip(messages, vectors):
+            if message.message_id in self._ids:
+                continue
+            n = len(self._payloads)
+            if n == len(self._vectors):
+                grown = np.zeros((n * 2, self._vectors.shape[1]), dtype=np.float32)
+                grown[:n] = self._vectors
+                self._vectors = grown
+            self._vectors[n] = vector
+            self._payloads.append(message)
+            self._ids.add(message.message_id)
+
+    def search(self, query: np.ndarray, k: int, exclude: Tuple[str, ...] = ()) -> List[Tuple[models.Message, float]]:
+        n = len(self._payloads)
+        if n == 0 or k <= 0:
+            return []
+        scores = self._vectors[:n] @ query
+        take = min(n, k + len(exclude))
+        top = np.argpartition(-scores, take - 1)[:take]
+        top = top[np.argsort(-scores[top])]
+        results = []
+        for i in top:
+            message = self._payloads[i]
+            if message.message_id in exclude:
+                continue
+            results.append((message, float(scores[i])))
+            if len(results) == k:
+                break
+        return results
+
+# --- Retrieval Store ---
+class RetrievalStore:
+    """
+    Holds one VectorIndex per session (LRU-bounded) and one per topic tag.
+    Sessions are marked loaded once their full history has been indexed, so a
+    restart backfills each session at most once.
+    """
+    def __init__(self, embedder=None):
+        self.embedder = embedder or HashingEmbedder()
+        self._lock = threading.Lock()
+        self._sessions: "OrderedDict[str, VectorIndex]" = OrderedDict()
+        self._topics: Dict[str, VectorIndex] = {}
+        self._loaded = set()
+
+    def _session_index(self, session_id: str) -> VectorIndex:
+        index = self._sessions.get(session_id)
+        if index is None:
+            index = self._sessions[session_id] = VectorIndex(self.embedder.dim)
+            while len(self._sessions) > MAX_INDEXED_SESSIONS:
+                evicted, _ = self._sessions.popitem(last=False)
+                self._loaded.discard(evicted)
+        self._sessions.move_to_end(session_id)
+        return index
+
+    def add_messages(self, messages: List[models.Message]):
+        messages = [m for m in messages if m.text]
+        if not messages:
+            return
+        vectors = self.embedder.embed([m.text for m in messages])
+        with self._lock:
+            for message, vector in zip(messages, vectors):
+                self._session_index(message.session_id).add([message], vector[None, :])
+                for tag in message.tags or []:
+                    self._topics.setdefault(tag, VectorIndex(self.embedder.dim)).add([message], vector[None, :])
+
+    def mark_loaded(self, session_id: str):
+        with self._lock:
+            self._loaded.add(session_id)
+
+    def is_loaded(self, session_id: str) -> bool:
+        with self._lock:
+            return session_id in self._loaded
+
+    def search(
+        self,
+        query: str,
+        session_id: Optional[str] = None,
+        topic: Optional[str] = None,
+        k: int = 8,
+        exclude: Tuple[str, ...] = (),
+    ) -> List[Tuple[models.Message, float]]:
+        """
+        Top-k cosine search within a session or a topic, best match first.
+        """
+        vector = self.embedder.embed([query])[0]
+        with self._lock:
+            if topic is not None:
+                index = self._topics.get(topic)
+            else:
+                index = self._sessions.get(session_id)
+            if index is None:
+                return []
+            return index.search(vector, k, exclude=exclude)
+
+    def clear(self):
+        with self._lock:
+            self._sessions.clear()
+            self._topics.clear()
+            self._loaded.clear()
+
+store = RetrievalStore()
+
+def set_embedder(embedder):
+    """
+    Replaces the embedder and drops existing vectors, which are not comparable across embedders.
+    """
+    global store
+    store = RetrievalStore(embedder)
+
+def index_messages(messages: List[models.Message]):
+    """
+    Embeds and indexes newly saved messages. Called from firebase.save_messages_batch.
+    """
+    try:
+        store.add_messages(messages)
+    except Exception as e:
+        logger.error(f"Failed to index {len(messages)} messages: {e}")
+
+def retrieve_context(session_id: str, query: str, k: int = 8, exclude: Tuple[str, ...] = ()) -> List[models.Message]:
+    """
+    Returns the k session messages most similar to `query`, in chronological order.
+    The first call for a session not indexed in this process backfills it from storage.
+    """
+    if not store.is_loaded(session_id):
+        from backend import firebase
+        store.add_messages(firebase.get_messages(session_id=session_id))
+        store.mark_loaded(session_id)
+    hits = store.search(query, session_id=session_id, k=k, exclude=exclude)
+    relevant = [m for m, score in hits if score >= MIN_SIMILARITY]
+    return sorted(relevant, key=lambda m: m.timestamp)
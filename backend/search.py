@@ -0,0 +1,469 @@
+from backend import models, retrieval, jobs
+from typing import Dict, List, Optional, Tuple
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+import logging
+import math
+import os
+import threading
+import time
+import numpy as np
+
+logger = logging.getLogger("nova-search")
+
+# --- Full-text Search ---
+# An inverted index over the text of every saved message, kept in memory and updated by
+# firebase.save_messages_batch. Each message gets a dense document number; each term maps
+# to its postings, a 2 x n int32 array of document numbers (ascending) and term frequencies.
+# Per-document session, timestamp, mood and length live in parallel arrays, so filters and
+# BM25 scoring are vectorized over a term's postings. Only the top-k results are hydrated
+# (through the message cache) to compute highlights.
+#
+# The index is snapshotted to NOVA_SEARCH_SNAPSHOT (a .npz of flat arrays) every
+# NOVA_SEARCH_SNAPSHOT_EVERY new messages and at shutdown. At startup the snapshot is loaded
+# and only messages newer than its watermark are read from storage. The memory storage
+# backend never snapshots.
+SEARCH_SNAPSHOT_PATH = os.environ.get("NOVA_SEARCH_SNAPSHOT", "nova_search.npz")
+SEARCH_SNAPSHOT_EVERY = int(os.environ.get("NOVA_SEARCH_SNAPSHOT_EVERY", "5000"))
+SEARCH_MAX_LIMIT = 100
+BM25_K1 = 1.2
+BM25_B = 0.75
+COMMON_TERM_RATIO = 0.05
+COMMON_TERM_MIN_DF = 1000
+SNAPSHOT_VERSION = 2
+# Messages are saved slightly out of timestamp order (ids and timestamps are assigned before
+# the reply is streamed), so catch-up re-reads this much before the watermark
+CATCHUP_MARGIN = timedelta(minutes=10)
+CATCHUP_CHUNK = 1000
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+def to_micros(timestamp: str) -> int:
+    """
+    Microseconds since the epoch of an ISO timestamp; values without an offset are UTC.
+    """
+    dt = datetime.fromisoformat(timestamp)
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return (dt - _EPOCH) // timedelta(microseconds=1)
+
+def _storage_identity() -> str:
+    from backend import storage
+    if storage.STORAGE_BACKEND == "sqlite":
+        return f"sqlite:{os.path.abspath(storage.SQLITE_PATH)}"
+    return storage.STORAGE_BACKEND
+
+def _pack(strings: List[str]) -> tuple:
+    """
+    Strings as one UTF-8 blob plus offsets. numpy string arrays are fixed-width, so a single
+    long token would make every entry that long.
+    """
+    encoded = [s.encode("utf-8") for s in strings]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(b) for b in encoded], out=offsets[1:])
+    return np.frombuffer(b"".join(encoded), dtype=np.uint8), offsets
+
+def _unpack(blob: np.ndarray, offsets: np.ndarray) -> List[str]:
+    data = blob.tobytes()
+    bounds = offsets.tolist()
+    return [data[bounds[i]:bounds[i + 1]].decode("utf-8") for i in range(len(bounds) - 1)]
+
+class SearchIndex:
+    """
+    Append-only inverted index with BM25 ranking. All methods are thread-safe.
+    """
+    def __init__(self, capacity: int = 1024):
+        self._lock = threading.RLock()
+        self._postings: Dict[str, list] = {}  # term -> [int32 array (2, capacity), size]
+        self._doc_of: Dict[str, int] = {}
+        self.message_ids: List[str] = []
+        self._session_codes: Dict[str, int] = {}
+        self._session_ids: List[str] = []
+        self._mood_codes: Dict[str, int] = {}
+        self._moods: List[str] = []
+        self._doc_session = np.zeros(capacity, dtype=np.int32)
+        self._doc_time = np.zeros(capacity, dtype=np.int64)
+        self._doc_mood = np.zeros(capacity, dtype=np.int16)
+        self._doc_length = np.zeros(capacity, dtype=np.int32)
+        self._total_length = 0
+        self.watermark = ""
+
+    def __len__(self):
+        return len(self.message_ids)
+
+    def __contains__(self, message_id: str):
+        return message_id in self._doc_of
+
+    @staticmethod
+    def _code(codes: Dict[str, int], names: List[str], name: str) -> int:
+        code = codes.get(name)
+        if code is None:
+            code = codes[name] = len(names)
+            names.append(name)
+        return code
+
+    def _grow_docs(self):
+        n = len(self._doc_session)
+        for attr in ("_doc_session", "_doc_time", "_doc_mood", "_doc_length"):
+            old = getattr(self, attr)
+            grown = np.zeros(n * 2, dtype=old.dtype)
+            grown[:n] = old
+            setattr(self, attr, grown)
+
+    def add(self, messages: List[models.Message]) -> int:
+        """
+        Indexes messages not indexed yet. Returns how many were added.
+        """
+        added = 0
+        with self._lock:
+            for message in messages:
+                if not message.text or message.message_id in self._doc_of:
+                    continue
+                terms = Counter(retrieval.tokenize(message.text))
+                if not terms:
+                    continue
+                doc = len(self.message_ids)
+                if doc == len(self._doc_session):
+                    self._grow_docs()
+                self._doc_of[message.message_id] = doc
+                self.message_ids.append(message.message_id)
+                self._doc_session[doc] = self._code(self._session_codes, self._session_ids, message.session_id)
+                self._doc_time[doc] = to_micros(message.timestamp)
+                self._doc_mood[doc] = self._code(self._mood_codes, self._moods, message.mood or "user")
+                length = sum(terms.values())
+                self._doc_length[doc] = length
+                self._total_length += length
+                for term, tf in terms.items():
+                    entry = self._postings.get(term)
+                    if entry is None:
+                        entry = self._postings[term] = [np.empty((2, 4), dtype=np.int32), 0]
+                    postings, size = entry
+                    if size == postings.shape[1]:
+                        grown = np.empty((2, size * 2), dtype=np.int32)
+                        grown[:, :size] = postings
+                        postings = entry[0] = grown
+                    postings[0, size] = doc
+                    postings[1, size] = tf
+                    entry[1] = size + 1
+                self.watermark = max(self.watermark, message.timestamp)
+                added += 1
+        return added
+
+    def search(
+        self,
+        terms: List[str],
+        k: int = 20,
+        session_id: Optional[str] = None,
+        mood: Optional[str] = None,
+        start: Optional[int] = None,
+        end: Optional[int] = None,
+    ) -> Tuple[int, List[Tuple[str, float]]]:
+        """
+        BM25 over documents containing any of `terms`, restricted to a session, a mood and a
+        [start, end) range in epoch microseconds. Returns (number of matches, top-k
+        (message_id, score) best first).
+        """
+        with self._lock:
+            n = len(self.message_ids)
+            if n == 0 or k <= 0:
+                return 0, []
+            session_code = mood_code = None
+            if session_id is not None:
+                session_code = self._session_codes.get(session_id)
+                if session_code is None:
+                    return 0, []
+            if mood is not None:
+                mood_code = self._mood_codes.get(mood)
+                if mood_code is None:
+                    return 0, []
+            entries = sorted(
+                (self._postings[term] for term in dict.fromkeys(terms) if term in self._postings),
+                key=lambda entry: entry[1],
+            )
+            if not entries:
+                return 0, []
+            # Terms in more than COMMON_TERM_RATIO of all messages ("the", "i") only add to the
+            # score of messages matched by the rarer query terms, unless every term is common
+            common = max(COMMON_TERM_MIN_DF, n * COMMON_TERM_RATIO)
+            driving = [entry for entry in entries if entry[1] <= common] or entries
+            scoring = entries[len(driving):]
+            length_norm = np.float32(BM25_K1 * BM25_B * n / self._total_length)
+            doc_parts, score_parts = [], []
+            for postings, size in driving:
+                docs = postings[0, :size]
+                tf = postings[1, :size]
+                mask = None
+                if session_code is not None:
+                    mask = self._doc_session[docs] == session_code
+                if mood_code is not None:
+                    mask = (self._doc_mood[docs] == mood_code) if mask is None else mask & (self._doc_mood[docs] == mood_code)
+                if start is not None or end is not None:
+                    times = self._doc_time[docs]
+                    in_range = np.ones(size, dtype=bool)
+                    if start is not None:
+                        in_range &= times >= start
+                    if end is not None:
+                        in_range &= times < end
+                    mask = in_range if mask is None else mask & in_range
+                if mask is not None:
+                    docs, tf = docs[mask], tf[mask]
+                if len(docs):
+                    doc_parts.append(docs)
+                    score_parts.append(self._bm25(tf, docs, n, size, length_norm))
+            if not doc_parts:
+                return 0, []
+            if len(doc_parts) == 1:
+                docs, scores = doc_parts[0], score_parts[0]
+            elif sum(len(part) for part in doc_parts) > n // 8:
+                # Dense accumulation beats sorting when the postings cover much of the index
+                dense = np.zeros(n, dtype=np.float32)
+                for part, part_scores in zip(doc_parts, score_parts):
+                    dense[part] += part_scores
+                docs = np.flatnonzero(dense)
+                scores = dense[docs]
+            else:
+                docs, inverse = np.unique(np.concatenate(doc_parts), return_inverse=True)
+                scores = np.bincount(inverse, weights=np.concatenate(score_parts)).astype(np.float32)
+            for postings, size in scoring:
+                # Postings are sorted by document, so membership is a binary search
+                term_docs = postings[0, :size]
+                positions = np.minimum(np.searchsorted(term_docs, docs), size - 1)
+                hit = term_docs[positions] == docs
+                if hit.any():
+                    scores[hit] += self._bm25(postings[1, positions[hit]], docs[hit], n, size, length_norm)
+            take = min(k, len(docs))
+            top = np.argpartition(-scores, take - 1)[:take]
+            # Ties go to the newer message
+            top = top[np.lexsort((-docs[top], -scores[top]))]
+            return len(docs), [(self.message_ids[docs[i]], float(scores[i])) for i in top]
+
+    def _bm25(self, tf: np.ndarray, docs: np.ndarray, n: int, df: int, length_norm: np.float32) -> np.ndarray:
+        idf = np.float32(math.log(1 + (n - df + 0.5) / (df + 0.5)))
+        tf = tf.astype(np.float32)
+        norm = tf + np.float32(BM25_K1 * (1 - BM25_B)) + length_norm * self._doc_length[docs]
+        return idf * np.float32(BM25_K1 + 1) * tf / norm
+
+    # --- Snapshots ---
+    def to_arrays(self) -> Dict[str, np.ndarray]:
+        """
+        The index as flat arrays: postings of all terms concatenated, sliced by `offsets`.
+        """
+        with self._lock:
+            n = len(self.message_ids)
+            terms = list(self._postings)
+            sizes = np.fromiter((self._postings[t][1] for t in terms), dtype=np.int64, count=len(terms))
+            offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+            np.cumsum(sizes, out=offsets[1:])
+            postings = np.empty((2, int(offsets[-1])), dtype=np.int32)
+            for i, term in enumerate(terms):
+                entry = self._postings[term]
+                postings[:, offsets[i]:offsets[i + 1]] = entry[0][:, :entry[1]]
+            arrays = {
+                "version": np.array(SNAPSHOT_VERSION),
+                "storage": np.array(_storage_identity()),
+                "watermark": np.array(self.watermark),
+                "offsets": offsets,
+                "postings": postings,
+                "doc_session": self._doc_session[:n].copy(),
+                "doc_time": self._doc_time[:n].copy(),
+                "doc_mood": self._doc_mood[:n].copy(),
+                "doc_length": self._doc_length[:n].copy(),
+            }
+            for name, strings in (("terms", terms), ("message_ids", self.message_ids), ("session_ids", self._session_ids), ("moods", self._moods)):
+                arrays[name], arrays[f"{name}_offsets"] = _pack(strings)
+            return arrays
+
+    @classmethod
+    def from_arrays(cls, arrays) -> "SearchIndex":
+        strings = {name: _unpack(arrays[name], arrays[f"{name}_offsets"]) for name in ("terms", "message_ids", "session_ids", "moods")}
+        index = cls(capacity=max(1024, len(strings["message_ids"])))
+        index.message_ids = strings["message_ids"]
+        index._doc_of = {message_id: doc for doc, message_id in enumerate(index.message_ids)}
+        index._session_ids = strings["session_ids"]
+        index._session_codes = {session_id: code for code, session_id in enumerate(index._session_ids)}
+        index._moods = strings["moods"]
+        index._mood_codes = {mood: code for code, mood in enumerate(index._moods)}
+        n = len(index.message_ids)
+        for attr in ("doc_session", "doc_time", "doc_mood", "doc_length"):
+            getattr(index, f"_{attr}")[:n] = arrays[attr]
+        index._total_length = int(arrays["doc_length"].sum())
+        index.watermark = str(arrays["watermark"])
+        # Postings stay views into the loaded array until a term's first append copies them
+        postings, offsets = arrays["postings"], arrays["offsets"].tolist()
+        for i, term in enumerate(strings["terms"]):
+            index._postings[term] = [postings[:, offsets[i]:offsets[i + 1]], offsets[i + 1] - offsets[i]]
+        return index
+
+    def save(self, path: str):
+        """
+        Writes the snapshot atomically (temporary file, then rename).
+        """
+        arrays = self.to_arrays()
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            np.savez(f, **arrays)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str) -> Optional["SearchIndex"]:
+        """
+        Returns the snapshot at `path`, or None if it is missing or was built from other storage.
+        """
+        if not os.path.exists(path):
+            return None
+        with np.load(path, allow_pickle=False) as arrays:
+            if int(arrays["version"]) != SNAPSHOT_VERSION or str(arrays["storage"]) != _storage_identity():
+                logger.info(f"Ignoring search snapshot {path} built for other storage or format")
+                return None
+            return cls.from_arrays({name: arrays[name] for name in arrays.files})
+
+index = SearchIndex()
+# "pending": never loaded (the index holds only messages saved by this process)
+_state = {"state": "pending", "seconds": None, "messages": 0, "caught_up": 0, "snapshot_at": None}
+_state_lock = threading.Lock()
+_snapshot_lock = threading.Lock()
+# Messages saved while load_index runs, replayed into the loaded index
+_saved_while_loading: Optional[List[models.Message]] = None
+_last_snapshot_size = 0
+# At most one snapshot job is queued or running; index_messages checks this in memory, so
+# saves below the threshold or while a snapshot is pending never touch the job queue
+_snapshot_queued = False
+
+def snapshot_path() -> Optional[str]:
+    from backend import storage
+    if not SEARCH_SNAPSHOT_PATH or storage.STORAGE_BACKEND == "memory":
+        return None
+    return SEARCH_SNAPSHOT_PATH
+
+def index_messages(messages: List[models.Message]):
+    """
+    Adds newly saved messages to the index. Called from firebase.save_messages_batch.
+    """
+    try:
+        with _state_lock:
+            if _saved_while_loading is not None:
+                _saved_while_loading.extend(messages)
+            current = index
+        current.add(messages)
+        _maybe_enqueue_snapshot(current)
+    except Exception as e:
+        logger.error(f"Failed to add {len(messages)} messages to the search index: {e}")
+
+def _maybe_enqueue_snapshot(current: SearchIndex):
+    global _snapshot_queued
+    with _state_lock:
+        if _snapshot_queued or not snapshot_path() or len(current) - _last_snapshot_size < SEARCH_SNAPSHOT_EVERY:
+            return
+        _snapshot_queued = True
+    # Job keys are permanent, so each snapshot gets its own
+    if not jobs.enqueue("search_snapshot", {}, key=f"search_snapshot:{current.watermark}:{len(current)}"):
+        with _state_lock:
+            _snapshot_queued = False
+
+def load_index():
+    """
+    Loads the snapshot (if any) and indexes every stored message newer than its watermark,
+    or all messages when there is no snapshot. Runs in the background at startup.
+    """
+    global index, _saved_while_loading, _last_snapshot_size
+    from backend import firebase
+    start = time.monotonic()
+    with _state_lock:
+        _saved_while_loading = []
+        _state["state"] = "loading"
+    try:
+        path = snapshot_path()
+        loaded = SearchIndex.load(path) if path else None
+        if loaded is None:
+            loaded = SearchIndex()
+        else:
+            _last_snapshot_size = len(loaded)
+        after = None
+        if loaded.watermark:
+            after = (datetime.fromisoformat(loaded.watermark) - CATCHUP_MARGIN).isoformat(timespec="microseconds")
+        caught_up = 0
+        chunk = []
+        for doc in firebase.get_storage().query_messages(after=after):
+            chunk.append(models.Message(**doc))
+            if len(chunk) >= CATCHUP_CHUNK:
+                caught_up += loaded.add(chunk)
+                chunk = []
+        caught_up += loaded.add(chunk)
+        with _state_lock:
+            loaded.add(_saved_while_loading)
+            index = loaded
+            _saved_while_loading = None
+            _state.update(state="ready", seconds=round(time.monotonic() - start, 3), messages=len(loaded), caught_up=caught_up)
+        logger.info(f"Search index ready: {len(loaded)} messages ({caught_up} read from storage) in {_state['seconds']}s")
+        if caught_up and path:
+            save_snapshot()
+    except Exception as e:
+        with _state_lock:
+            _saved_while_loading = None
+            _state.update(state="failed", error=str(e))
+        logger.error(f"Failed to load the search index: {e}")
+
+def save_snapshot():
+    global _last_snapshot_size
+    path = snapshot_path()
+    if not path:
+        return
+    with _snapshot_lock:
+        current = index
+        start = time.monotonic()
+        size = len(current)
+        current.save(path)
+        _last_snapshot_size = size
+        _state["snapshot_at"] = current.watermark
+        logger.info(f"Saved search snapshot of {size} messages to {path} in {time.monotonic() - start:.2f}s")
+
+def status() -> dict:
+    with _state_lock:
+        return dict(_state, messages=len(index))
+
+def highlights(text: str, terms: List[str]) -> List[List[int]]:
+    """
+    [start, end] character offsets of the query terms in `text`.
+    """
+    wanted = set(terms)
+    return [[start, end] for token, start, end in retrieval.token_spans(text) if token in wanted]
+
+def search(
+    query: str,
+    limit: int = 20,
+    session_id: Optional[str] = None,
+    mood: Optional[str] = None,
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+) -> dict:
+    """
+    Ranked messages matching `query` with highlight offsets. `start`/`end` are ISO timestamps.
+    """
+    from backend import firebase
+    began = time.perf_counter()
+    terms = retrieval.tokenize(query)
+    total, hits = index.search(
+        terms,
+        k=min(limit, SEARCH_MAX_LIMIT),
+        session_id=session_id,
+        mood=mood,
+        start=to_micros(start) if start else None,
+        end=to_micros(end) if end else None,
+    )
+    messages = {m.message_id: m for m in firebase.get_messages_by_ids([message_id for message_id, _ in hits])}
+    results = [
+        {"message": messages[message_id], "score": round(score, 4), "highlights": highlights(messages[message_id].text, terms)}
+        for message_id, score in hits
+        if message_id in messages
+    ]
+    return {"total": total, "results": results, "took_ms": round((time.perf_counter() - began) * 1000, 2)}
+
+def snapshot_job(payload: dict):
+    global _snapshot_queued
+    try:
+        save_snapshot()
+    finally:
+        with _state_lock:
+            _snapshot_queued = False
+
+jobs.register("search_snapshot", snapshot_job)
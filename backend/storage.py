@@ -0,0 +1,696 @@
+from typing import Dict, Iterator, List, Optional
+from abc import ABC, abstractmethod
+import json
+import logging
+import os
+import sqlite3
+import threading
+
+logger = logging.getLogger("nova-storage")
+
+# --- Storage Backends ---
+# backend/firebase.py keeps the app-facing API (caching, batching, models); the raw reads and
+# writes go through one of these backends, selected with NOVA_STORAGE_BACKEND:
+# - "firestore" (default): the Firebase project from YOUR_FIREBASE_CREDENTIALS_JSON
+# - "sqlite": a local SQLite file (NOVA_SQLITE_PATH) in WAL mode, no network at all
+# - "memory": SQLite in memory, for benchmarks and throwaway runs
+# Documents are plain dicts shaped like the models in backend/models.py.
+STORAGE_BACKEND = os.environ.get("NOVA_STORAGE_BACKEND", "firestore")
+SQLITE_PATH = os.environ.get("NOVA_SQLITE_PATH", "nova.sqlite3")
+# Point reads by id are issued in chunks of this many documents per round trip
+GET_ALL_BATCH = 300
+# Bulk export and import (backend/archive.py). Collections are listed in restore order.
+# Time buckets are not exported: importing messages rebuilds them.
+ARCHIVE_COLLECTIONS = ("sessions", "messages", "summaries", "summary_cache", "threads", "topic_sessions")
+EXPORT_PAGE_SIZE = 1000
+
+class Storage(ABC):
+    """
+    Interface implemented by every storage backend; a backend missing a method fails at
+    instantiation. Query methods return documents in the requested order;
+    `limit`/`before`/`after` are timestamp cursors as in firebase.get_messages_page.
+    """
+    # Sessions
+    @abstractmethod
+    def latest_session(self) -> Optional[dict]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def create_session(self, session: dict):
+        raise NotImplementedError
+
+    @abstractmethod
+    def update_session_activity(self, activity: Dict[str, str]):
+        """Sets last_activity for each session_id -> timestamp, in one write."""
+        raise NotImplementedError
+
+    # Messages
+    @abstractmethod
+    def save_messages(self, messages: List[dict], activity: Dict[str, str], buckets: Optional[Dict[str, dict]] = None):
+        """
+        Writes messages, the last_activity updates and the time bucket entries (bucket_id ->
+        {granularity, start, end, message_ids, timestamps}, see timeindex.buckets_for) atomically.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def query_messages(
+        self,
+        session_id: Optional[str] = None,
+        limit: Optional[int] = None,
+        before: Optional[str] = None,
+        after: Optional[str] = None,
+        descending: bool = False,
+    ) -> Iterator[dict]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_messages_by_ids(self, message_ids: List[str]) -> Iterator[dict]:
+        """Batched point reads. Missing ids are skipped; order is not guaranteed."""
+        raise NotImplementedError
+
+    # Time buckets
+    @abstractmethod
+    def query_time_buckets(self, granularity: str, start: str, end: str) -> Iterator[dict]:
+        """
+        Buckets of `granularity` starting in [start, end), oldest first, with their
+        message_ids (in time order), summary and summarized_count.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def set_bucket_summary(self, bucket_id: str, summary: List[str], summarized_count: int):
+        raise NotImplementedError
+
+    # Summaries
+    @abstractmethod
+    def add_summary(self, summary: dict):
+        raise NotImplementedError
+
+    @abstractmethod
+    def query_summaries(self, session_id: Optional[str] = None) -> Iterator[dict]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_summary_cache(self, session_id: str) -> Optional[dict]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def set_summary_cache(self, session_id: str, entry: dict):
+        raise NotImplementedError
+
+    # Threads (stored as headers: message ids plus metadata, see models.ThreadHeader)
+    @abstractmethod
+    def save_thread(self, thread: dict):
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_thread(self, thread_id: str) -> Optional[dict]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def query_threads(self, topic: Optional[str] = None, session_id: Optional[str] = None) -> Iterator[dict]:
+        raise NotImplementedError
+
+    # Topics
+    @abstractmethod
+    def upsert_topic_session(self, topic: str, session: dict):
+        raise NotImplementedError
+
+    @abstractmethod
+    def query_topic_sessions(self, topic: str, limit: int, before: Optional[str] = None) -> Iterator[dict]:
+        """Newest first."""
+        raise NotImplementedError
+
+    def migrate_legacy_topics(self) -> int:
+        return 0
+
+    # Bulk export and import
+    @abstractmethod
+    def export_documents(self, collection: str, page_size: int = EXPORT_PAGE_SIZE) -> Iterator[dict]:
+        """
+        Every document of `collection` (one of ARCHIVE_COLLECTIONS) in a stable order, read
+        in pages of `page_size` so memory stays bounded. Messages come in timestamp order;
+        topic_sessions documents carry their `topic`.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def import_documents(self, collection: str, documents: List[dict]):
+        """
+        Upserts a batch of exported documents. Summaries have no natural key and are
+        appended, so import into an empty store.
+        """
+        raise NotImplementedError
+
+def _activity(session_id: str, timestamp: str) -> dict:
+    # Merged rather than updated: an update of a missing session document would fail the
+    # whole batch, including the messages written with it
+    return {"session_id": session_id, "last_activity": timestamp}
+
+class FirestoreStorage(Storage):
+    def __init__(self, cred_path: Optional[str] = None):
+        import firebase_admin
+        from firebase_admin import credentials, firestore
+        self._firestore = firestore
+        if not firebase_admin._apps:
+            cred = credentials.Certificate(cred_path or os.environ.get("YOUR_FIREBASE_CREDENTIALS_JSON"))
+            firebase_admin.initialize_app(cred)
+        self.db = firestore.client()
+
+    def latest_session(self):
+        query = self.db.collection("sessions").order_by("last_activity", direction=self._firestore.Query.DESCENDING).limit(1)
+        docs = list(query.stream())
+        return docs[0].to_dict() if docs else None
+
+    def create_session(self, session):
+        self.db.collection("sessions").document(session["session_id"]).set(session)
+
+    def update_session_activity(self, activity):
+        if len(activity) == 1:
+            (session_id, timestamp), = activity.items()
+            self.db.collection("sessions").document(session_id).set(_activity(session_id, timestamp), merge=True)
+            return
+        batch = self.db.batch()
+        for session_id, timestamp in activity.items():
+            batch.set(self.db.collection("sessions").document(session_id), _activity(session_id, timestamp), merge=True)
+        batch.commit()
+
+    def save_messages(self, messages, activity, buckets=None):
+        batch = self.db.batch()
+        for message in messages:
+            batch.set(self.db.collection("messages").document(message["message_id"]), message)
+        for session_id, timestamp in activity.items():
+            batch.set(self.db.collection("sessions").document(session_id), _activity(session_id, timestamp), merge=True)
+        for bucket_id, bucket in (buckets or {}).items():
+            batch.set(
+                self.db.collection("time_buckets").document(bucket_id),
+                {
+                    "bucket_id": bucket_id,
+                    "granularity": bucket["granularity"],
+                    "start": bucket["start"],
+                    "end": bucket["end"],
+                    "message_ids": self._firestore.ArrayUnion(bucket["message_ids"]),
+                },
+                merge=True,
+            )
+        batch.commit()
+
+    def query_messages(self, session_id=None, limit=None, before=None, after=None, descending=False):
+        query = self.db.collection("messages")
+        if session_id:
+            query = query.where("session_id", "==", session_id)
+        if after:
+            query = query.where("timestamp", ">", after)
+        if before:
+            query = query.where("timestamp", "<", before)
+        direction = self._firestore.Query.DESCENDING if descending else self._firestore.Query.ASCENDING
+        query = query.order_by("timestamp", direction=direction)
+        if limit:
+            query = query.limit(limit)
+        for doc in query.stream():
+            yield doc.to_dict()
+
+    def get_messages_by_ids(self, message_ids):
+        refs = [self.db.collection("messages").document(message_id) for message_id in message_ids]
+        for start in range(0, len(refs), GET_ALL_BATCH):
+            for doc in self.db.get_all(refs[start:start + GET_ALL_BATCH]):
+                if doc.exists:
+                    yield doc.to_dict()
+
+    def query_time_buckets(self, granularity, start, end):
+        # Needs the composite index time_buckets (granularity ASC, start ASC). message_ids are
+        # in write order, which is time order for everything but backfills.
+        query = (
+            self.db.collection("time_buckets")
+            .where("granularity", "==", granularity)
+            .where("start", ">=", start)
+            .where("start", "<", end)
+            .order_by("start")
+        )
+        for doc in query.stream():
+            bucket = doc.to_dict()
+            bucket.setdefault("message_ids", [])
+            bucket.setdefault("summary", None)
+            bucket.setdefault("summarized_count", 0)
+            yield bucket
+
+    def set_bucket_summary(self, bucket_id, summary, summarized_count):
+        self.db.collection("time_buckets").document(bucket_id).set(
+            {"summary": summary, "summarized_count": summarized_count}, merge=True
+        )
+
+    def add_summary(self, summary):
+        self.db.collection("summaries").add(summary)
+
+    def query_summaries(self, session_id=None):
+        query = self.db.collection("summaries")
+        if session_id:
+            query = query.where("session_id", "==", session_id)
+        for doc in query.order_by("timestamp").stream():
+            yield doc.to_dict()
+
+    def get_summary_cache(self, session_id):
+        doc = self.db.collection("summary_cache").document(session_id).get()
+        return doc.to_dict() if doc.exists else None
+
+    def set_summary_cache(self, session_id, entry):
+        self.db.collection("summary_cache").document(session_id).set(entry)
+
+    def save_thread(self, thread):
+        self.db.collection("threads").document(thread["thread_id"]).set(thread)
+
+    def get_thread(self, thread_id):
+        doc = self.db.collection("threads").document(thread_id).get()
+        return doc.to_dict() if doc.exists else None
+
+    def query_threads(self, topic=None, session_id=None):
+        query = self.db.collection("threads")
+        if topic is not None:
+            query = query.where("topic", "==", topic)
+        if session_id is not None:
+            query = query.where("session_id", "==", session_id)
+        for doc in query.stream():
+            yield doc.to_dict()
+
+    def upsert_topic_session(self, topic, session):
+        topic_ref = self.db.collection("topics").document(topic)
+        batch = self.db.batch()
+        batch.set(topic_ref, {"topic": topic, "updated_at": session["timestamp"]}, merge=True)
+        batch.set(topic_ref.collection("sessions").document(session["session_id"]), session)
+        batch.commit()
+
+    def query_topic_sessions(self, topic, limit, before=None):
+        query = self.db.collection("topics").document(topic).collection("sessions")
+        if before:
+            query = query.where("timestamp", "<", before)
+        query = query.order_by("timestamp", direction=self._firestore.Query.DESCENDING).limit(limit)
+        for doc in query.stream():
+            yield doc.to_dict()
+
+    def migrate_legacy_topics(self):
+        moved = 0
+        for doc in self.db.collection("topics").stream():
+            data = doc.to_dict()
+            legacy = data.get("sessions")
+            if not legacy:
+                continue
+            batch = self.db.batch()
+            for s in legacy:
+                batch.set(doc.reference.collection("sessions").document(s["session_id"]), s)
+            batch.update(doc.reference, {"sessions": self._firestore.DELETE_FIELD})
+            batch.commit()
+            moved += len(legacy)
+            logger.info(f"Migrated {len(legacy)} legacy session summaries for topic '{data.get('topic', doc.id)}'")
+        return moved
+
+    def _pages(self, query, page_size):
+        """
+        Streams a query in pages, resuming each page after the last document of the previous one.
+        """
+        last = None
+        while True:
+            page = query.limit(page_size)
+            if last is not None:
+                page = page.start_after(last)
+            docs = list(page.stream())
+            yield from docs
+            if len(docs) < page_size:
+                return
+            last = docs[-1]
+
+    def export_documents(self, collection, page_size=EXPORT_PAGE_SIZE):
+        if collection == "topic_sessions":
+            for topic in self._pages(self.db.collection("topics").order_by("__name__"), page_size):
+                for doc in self._pages(topic.reference.collection("sessions").order_by("__name__"), page_size):
+                    yield dict(doc.to_dict(), topic=topic.id)
+            return
+        query = self.db.collection(collection)
+        if collection == "messages":
+            query = query.order_by("timestamp")
+        for doc in self._pages(query.order_by("__name__"), page_size):
+            yield doc.to_dict()
+
+    def import_documents(self, collection, documents):
+        writer = self.db.bulk_writer()
+        for doc in documents:
+            if collection == "topic_sessions":
+                topic_ref = self.db.collection("topics").document(doc["topic"])
+                session = {k: v for k, v in doc.items() if k != "topic"}
+                writer.set(topic_ref, {"topic": doc["topic"], "updated_at": session["timestamp"]}, merge=True)
+                writer.set(topic_ref.collection("sessions").document(session["session_id"]), session)
+            elif collection == "summaries":
+                writer.create(self.db.collection("summaries").document(), doc)
+            else:
+                key = {"sessions": "session_id", "messages": "message_id", "summary_cache": "session_id", "threads": "thread_id"}[collection]
+                writer.set(self.db.collection(collection).document(doc[key]), doc)
+        writer.close()
+
+_SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    session_id TEXT PRIMARY KEY,
+    created_at TEXT NOT NULL,
+    last_activity TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS sessions_last_activity ON sessions (last_activity);
+CREATE TABLE IF NOT EXISTS messages (
+    message_id TEXT PRIMARY KEY,
+    session_id TEXT NOT NULL,
+    timestamp TEXT NOT NULL,
+    doc TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS messages_session_timestamp ON messages (session_id, timestamp);
+CREATE INDEX IF NOT EXISTS messages_timestamp ON messages (timestamp);
+CREATE TABLE IF NOT EXISTS time_buckets (
+    bucket_id TEXT PRIMARY KEY,
+    granularity TEXT NOT NULL,
+    start_at TEXT NOT NULL,
+    end_at TEXT NOT NULL,
+    summary TEXT,
+    summarized_count INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS time_buckets_granularity_start ON time_buckets (granularity, start_at);
+CREATE TABLE IF NOT EXISTS bucket_messages (
+    bucket_id TEXT NOT NULL,
+    message_id TEXT NOT NULL,
+    timestamp TEXT NOT NULL,
+    PRIMARY KEY (bucket_id, message_id)
+);
+CREATE INDEX IF NOT EXISTS bucket_messages_timestamp ON bucket_messages (bucket_id, timestamp);
+CREATE TABLE IF NOT EXISTS summaries (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    session_id TEXT NOT NULL,
+    timestamp TEXT NOT NULL,
+    doc TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS summaries_session_timestamp ON summaries (session_id, timestamp);
+CREATE TABLE IF NOT EXISTS summary_cache (
+    session_id TEXT PRIMARY KEY,
+    doc TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS threads (
+    thread_id TEXT PRIMARY KEY,
+    topic TEXT NOT NULL,
+    session_id TEXT,
+    doc TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS threads_topic ON threads (topic);
+CREATE INDEX IF NOT EXISTS threads_session ON threads (session_id);
+CREATE TABLE IF NOT EXISTS topics (
+    topic TEXT PRIMARY KEY,
+    updated_at TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS topic_sessions (
+    topic TEXT NOT NULL,
+    session_id TEXT NOT NULL,
+    timestamp TEXT NOT NULL,
+    doc TEXT NOT NULL,
+    PRIMARY KEY (topic, session_id)
+);
+CREATE INDEX IF NOT EXISTS topic_sessions_timestamp ON topic_sessions (topic, timestamp);
+"""
+
+# Upsert, like FirestoreStorage's merge: activity for a session missing from the table (e.g. a
+# client-supplied session_id after a local reset) creates it instead of being dropped
+_SQLITE_ACTIVITY = (
+    "INSERT INTO sessions (session_id, created_at, last_activity) VALUES (?, ?, ?)"
+    " ON CONFLICT (session_id) DO UPDATE SET last_activity = excluded.last_activity"
+)
+
+class SQLiteStorage(Storage):
+    """
+    Local backend on one SQLite connection (WAL mode, serialized by a lock). Filterable
+    fields are real indexed columns; the full document is kept as JSON alongside.
+    """
+    def __init__(self, path: str = SQLITE_PATH):
+        self.path = path
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        if path != ":memory:":
+            self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SQLITE_SCHEMA)
+
+    def _rows(self, sql: str, params=()) -> list:
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def _write(self, statements):
+        """
+        Runs [(sql, params), ...] in one transaction.
+        """
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                for sql, params in statements:
+                    self._conn.execute(sql, params)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def latest_session(self):
+        rows = self._rows("SELECT session_id, created_at, last_activity FROM sessions ORDER BY last_activity DESC LIMIT 1")
+        return dict(zip(("session_id", "created_at", "last_activity"), rows[0])) if rows else None
+
+    def create_session(self, session):
+        self._write([(
+            "INSERT OR REPLACE INTO sessions (session_id, created_at, last_activity) VALUES (?, ?, ?)",
+            (session["session_id"], session["created_at"], session["last_activity"]),
+        )])
+
+    def update_session_activity(self, activity):
+        self._write([
+            (_SQLITE_ACTIVITY, (session_id, timestamp, timestamp))
+            for session_id, timestamp in activity.items()
+        ])
+
+    def save_messages(self, messages, activity, buckets=None):
+        statements = [
+            (
+                "INSERT OR REPLACE INTO messages (message_id, session_id, timestamp, doc) VALUES (?, ?, ?, ?)",
+                (m["message_id"], m["session_id"], m["timestamp"], json.dumps(m)),
+            )
+            for m in messages
+        ]
+        statements += [
+            (_SQLITE_ACTIVITY, (session_id, timestamp, timestamp))
+            for session_id, timestamp in activity.items()
+        ]
+        for bucket_id, bucket in (buckets or {}).items():
+            statements.append((
+                "INSERT OR IGNORE INTO time_buckets (bucket_id, granularity, start_at, end_at) VALUES (?, ?, ?, ?)",
+                (bucket_id, bucket["granularity"], bucket["start"], bucket["end"]),
+            ))
+            statements += [
+                ("INSERT OR IGNORE INTO bucket_messages (bucket_id, message_id, timestamp) VALUES (?, ?, ?)", (bucket_id, message_id, timestamp))
+                for message_id, timestamp in zip(bucket["message_ids"], bucket["timestamps"])
+            ]
+        self._write(statements)
+
+    def query_messages(self, session_id=None, limit=None, before=None, after=None, descending=False):
+        clauses, params = [], []
+        if session_id:
+            clauses.append("session_id = ?")
+            params.append(session_id)
+        if after:
+            clauses.append("timestamp > ?")
+            params.append(after)
+        if before:
+            clauses.append("timestamp < ?")
+            params.append(before)
+        sql = "SELECT doc FROM messages"
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        sql += " ORDER BY timestamp DESC" if descending else " ORDER BY timestamp"
+        if limit:
+            sql += " LIMIT ?"
+            params.append(limit)
+        for (doc,) in self._rows(sql, params):
+            yield json.loads(doc)
+
+    def get_messages_by_ids(self, message_ids):
+        message_ids = list(message_ids)
+        for start in range(0, len(message_ids), GET_ALL_BATCH):
+            chunk = message_ids[start:start + GET_ALL_BATCH]
+            sql = f"SELECT doc FROM messages WHERE message_id IN ({','.join('?' * len(chunk))})"
+            for (doc,) in self._rows(sql, chunk):
+                yield json.loads(doc)
+
+    def query_time_buckets(self, granularity, start, end):
+        params = (granularity, start, end)
+        where = "WHERE b.granularity = ? AND b.start_at >= ? AND b.start_at < ?"
+        message_ids = {}
+        for bucket_id, message_id in self._rows(
+            f"SELECT m.bucket_id, m.message_id FROM bucket_messages m JOIN time_buckets b ON b.bucket_id = m.bucket_id {where} ORDER BY m.timestamp",
+            params,
+        ):
+            message_ids.setdefault(bucket_id, []).append(message_id)
+        rows = self._rows(
+            f"SELECT b.bucket_id, b.granularity, b.start_at, b.end_at, b.summary, b.summarized_count FROM time_buckets b {where} ORDER BY b.start_at",
+            params,
+        )
+        for bucket_id, granularity, start_at, end_at, summary, summarized_count in rows:
+            yield {
+                "bucket_id": bucket_id,
+                "granularity": granularity,
+                "start": start_at,
+                "end": end_at,
+                "message_ids": message_ids.get(bucket_id, []),
+                "summary": json.loads(summary) if summary else None,
+                "summarized_count": summarized_count,
+            }
+
+    def set_bucket_summary(self, bucket_id, summary, summarized_count):
+        self._write([(
+            "UPDATE time_buckets SET summary = ?, summarized_count = ? WHERE bucket_id = ?",
+            (json.dumps(summary), summarized_count, bucket_id),
+        )])
+
+    def add_summary(self, summary):
+        self._write([(
+            "INSERT INTO summaries (session_id, timestamp, doc) VALUES (?, ?, ?)",
+            (summary["session_id"], summary["timestamp"], json.dumps(summary)),
+        )])
+
+    def query_summaries(self, session_id=None):
+        if session_id:
+            rows = self._rows("SELECT doc FROM summaries WHERE session_id = ? ORDER BY timestamp", (session_id,))
+        else:
+            rows = self._rows("SELECT doc FROM summaries ORDER BY timestamp")
+        for (doc,) in rows:
+            yield json.loads(doc)
+
+    def get_summary_cache(self, session_id):
+        rows = self._rows("SELECT doc FROM summary_cache WHERE session_id = ?", (session_id,))
+        return json.loads(rows[0][0]) if rows else None
+
+    def set_summary_cache(self, session_id, entry):
+        self._write([("INSERT OR REPLACE INTO summary_cache (session_id, doc) VALUES (?, ?)", (session_id, json.dumps(entry)))])
+
+    def save_thread(self, thread):
+        self._write([(
+            "INSERT OR REPLACE INTO threads (thread_id, topic, session_id, doc) VALUES (?, ?, ?, ?)",
+            (thread["thread_id"], thread["topic"], thread.get("session_id"), json.dumps(thread)),
+        )])
+
+    def get_thread(self, thread_id):
+        rows = self._rows("SELECT doc FROM threads WHERE thread_id = ?", (thread_id,))
+        return json.loads(rows[0][0]) if rows else None
+
+    def query_threads(self, topic=None, session_id=None):
+        clauses, params = [], []
+        if topic is not None:
+            clauses.append("topic = ?")
+            params.append(topic)
+        if session_id is not None:
+            clauses.append("session_id = ?")
+            params.append(session_id)
+        sql = "SELECT doc FROM threads"
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        for (doc,) in self._rows(sql, params):
+            yield json.loads(doc)
+
+    def upsert_topic_session(self, topic, session):
+        self._write([
+            ("INSERT OR REPLACE INTO topics (topic, updated_at) VALUES (?, ?)", (topic, session["timestamp"])),
+            (
+                "INSERT OR REPLACE INTO topic_sessions (topic, session_id, timestamp, doc) VALUES (?, ?, ?, ?)",
+                (topic, session["session_id"], session["timestamp"], json.dumps(session)),
+            ),
+        ])
+
+    def query_topic_sessions(self, topic, limit, before=None):
+        if before:
+            rows = self._rows(
+                "SELECT doc FROM topic_sessions WHERE topic = ? AND timestamp < ? ORDER BY timestamp DESC LIMIT ?",
+                (topic, before, limit),
+            )
+        else:
+            rows = self._rows("SELECT doc FROM topic_sessions WHERE topic = ? ORDER BY timestamp DESC LIMIT ?", (topic, limit))
+        for (doc,) in rows:
+            yield json.loads(doc)
+
+    # Keyset pagination per collection: (select, key columns); the key values are the
+    # leading columns of each row and the document JSON is the last
+    _EXPORT_QUERIES = {
+        "sessions": ("SELECT session_id, session_id, created_at, last_activity FROM sessions", ("session_id",)),
+        "messages": ("SELECT timestamp, message_id, doc FROM messages", ("timestamp", "message_id")),
+        "summaries": ("SELECT id, doc FROM summaries", ("id",)),
+        "summary_cache": ("SELECT session_id, doc FROM summary_cache", ("session_id",)),
+        "threads": ("SELECT thread_id, doc FROM threads", ("thread_id",)),
+        "topic_sessions": ("SELECT topic, session_id, doc FROM topic_sessions", ("topic", "session_id")),
+    }
+
+    def export_documents(self, collection, page_size=EXPORT_PAGE_SIZE):
+        select, keys = self._EXPORT_QUERIES[collection]
+        order = ", ".join(keys)
+        cursor = None
+        while True:
+            if cursor is None:
+                rows = self._rows(f"{select} ORDER BY {order} LIMIT ?", (page_size,))
+            else:
+                rows = self._rows(f"{select} WHERE ({order}) > ({', '.join('?' * len(keys))}) ORDER BY {order} LIMIT ?", (*cursor, page_size))
+            for row in rows:
+                if collection == "sessions":
+                    yield dict(zip(("session_id", "created_at", "last_activity"), row[1:]))
+                elif collection == "topic_sessions":
+                    yield dict(json.loads(row[-1]), topic=row[0])
+                else:
+                    yield json.loads(row[-1])
+            if len(rows) < page_size:
+                return
+            cursor = rows[-1][:len(keys)]
+
+    def import_documents(self, collection, documents):
+        if collection == "sessions":
+            statements = [(
+                "INSERT OR REPLACE INTO sessions (session_id, created_at, last_activity) VALUES (?, ?, ?)",
+                # Firestore sessions first seen through an activity bump have no created_at
+                (d["session_id"], d.get("created_at") or d["last_activity"], d["last_activity"]),
+            ) for d in documents]
+        elif collection == "messages":
+            statements = [(
+                "INSERT OR REPLACE INTO messages (message_id, session_id, timestamp, doc) VALUES (?, ?, ?, ?)",
+                (d["message_id"], d["session_id"], d["timestamp"], json.dumps(d)),
+            ) for d in documents]
+        elif collection == "summaries":
+            statements = [(
+                "INSERT INTO summaries (session_id, timestamp, doc) VALUES (?, ?, ?)",
+                (d["session_id"], d["timestamp"], json.dumps(d)),
+            ) for d in documents]
+        elif collection == "summary_cache":
+            statements = [(
+                "INSERT OR REPLACE INTO summary_cache (session_id, doc) VALUES (?, ?)", (d["session_id"], json.dumps(d)),
+            ) for d in documents]
+        elif collection == "threads":
+            statements = [(
+                "INSERT OR REPLACE INTO threads (thread_id, topic, session_id, doc) VALUES (?, ?, ?, ?)",
+                (d["thread_id"], d["topic"], d.get("session_id"), json.dumps(d)),
+            ) for d in documents]
+        elif collection == "topic_sessions":
+            statements = []
+            for d in documents:
+                session = {k: v for k, v in d.items() if k != "topic"}
+                statements.append((
+                    "INSERT INTO topics (topic, updated_at) VALUES (?, ?)"
+                    " ON CONFLICT (topic) DO UPDATE SET updated_at = MAX(updated_at, excluded.updated_at)",
+                    (d["topic"], session["timestamp"]),
+                ))
+                statements.append((
+                    "INSERT OR REPLACE INTO topic_sessions (topic, session_id, timestamp, doc) VALUES (?, ?, ?, ?)",
+                    (d["topic"], session["session_id"], session["timestamp"], json.dumps(session)),
+                ))
+        else:
+            raise ValueError(f"Unknown collection '{collection}'")
+        self._write(statements)
+
+def create_storage(backend: str = STORAGE_BACKEND) -> Storage:
+    if backend == "sqlite":
+        return SQLiteStorage(SQLITE_PATH)
+    if backend == "memory":
+        return SQLiteStorage(":memory:")
+    if backend == "firestore":
+        return FirestoreStorage()
+    raise ValueError(f"Unknown NOVA_STORAGE_BACKEND '{backend}'")
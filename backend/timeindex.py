@@ -0,0 +1,339 @@
+from backend import models, jobs
+from typing import Dict, List, Optional
+from datetime import datetime, timedelta, timezone
+import hashlib
+import json
+import logging
+import os
+import re
+
+logger = logging.getLogger("nova-timeindex")
+
+# --- Time Expressions ---
+# Resolves phrases like "yesterday", "last friday", "this morning", "3 days ago" or
+# "past 2 weeks" to a UTC range. Calendar words are interpreted in NOVA_TIMEZONE (the user's
+# zone, default UTC) so "yesterday" means the user's yesterday, not the server's.
+TIMEZONE = os.environ.get("NOVA_TIMEZONE", "UTC")
+
+def _load_timezone(name: str):
+    if name in ("", "UTC"):
+        return timezone.utc
+    from zoneinfo import ZoneInfo
+    return ZoneInfo(name)
+
+USER_TZ = _load_timezone(TIMEZONE)
+
+_WEEKDAYS = ["monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday"]
+_MONTHS = ["january", "february", "march", "april", "may", "june", "july", "august", "september", "october", "november", "december"]
+_NUMBER_WORDS = {
+    "a": 1, "an": 1, "one": 1, "two": 2, "three": 3, "four": 4, "five": 5, "six": 6, "seven": 7,
+    "eight": 8, "nine": 9, "ten": 10, "a couple of": 2, "couple of": 2, "a few": 3, "few": 3, "several": 3,
+}
+# Hours after midnight; the night runs into the next morning
+_PARTS_OF_DAY = {"morning": (6, 12), "afternoon": (12, 18), "evening": (18, 24), "night": (18, 30)}
+_UNITS = {
+    "minute": timedelta(minutes=1), "hour": timedelta(hours=1), "day": timedelta(days=1),
+    "week": timedelta(weeks=1), "month": timedelta(days=30), "year": timedelta(days=365),
+}
+
+_NUM = r"(\d+|a couple of|couple of|a few|few|several|an|a|one|two|three|four|five|six|seven|eight|nine|ten)"
+_UNIT = r"(minute|hour|day|week|month|year)s?"
+_WEEKDAY = "(" + "|".join(_WEEKDAYS) + ")"
+_MONTH = "(" + "|".join(m for m in _MONTHS) + "|" + "|".join(m[:3] for m in _MONTHS) + r")\.?"
+_PART = r"(?:\s+(morning|afternoon|evening|night))?"
+
+_AGO_RE = re.compile(rf"\b{_NUM}\s+{_UNIT}\s+ago\b")
+_ROLLING_RE = re.compile(rf"\b(?:last|past)\s+(?:{_NUM}\s+)?{_UNIT}\b")
+_DAY_BEFORE_RE = re.compile(r"\bday before yesterday\b")
+_YESTERDAY_RE = re.compile(rf"\byesterday{_PART}\b")
+_LAST_NIGHT_RE = re.compile(r"\blast night\b")
+_TODAY_PART_RE = re.compile(r"\b(?:this\s+(morning|afternoon|evening)|(tonight)|(earlier today|today))\b")
+_WEEKEND_RE = re.compile(r"\b(last|this)\s+weekend\b")
+_CALENDAR_RE = re.compile(r"\b(last|this)\s+(week|month|year)\b")
+_WEEKDAY_RE = re.compile(rf"\b(?:(?:last|on|this past)\s+)?{_WEEKDAY}{_PART}\b")
+_YEAR = r"(?:,?\s+(\d{4}))?"
+_MONTH_DAY_RE = re.compile(rf"\b(?:{_MONTH}\s+(\d{{1,2}})(st|nd|rd|th)?|(\d{{1,2}})(?:st|nd|rd|th)?\s+(?:of\s+)?{_MONTH}){_YEAR}\b")
+# Month names that are also common words ("I may 2x it") need a day-first form, an ordinal
+# ("may 2nd") or a year ("may 2, 2024")
+_AMBIGUOUS_MONTHS = {"may", "mar"}
+
+# Chat turns mention times all the time ("I'm flying on friday", "I ran last friday"); only
+# turns with a recall verb or a question about the conversation trigger a recall. Time words
+# alone ("last", "ago", "earlier") are not cues.
+_RECALL_CUE_RE = re.compile(
+    r"\b(?:remember|recall|remind|recap|what (?:did|were|was)|did (?:i|we|you)|"
+    r"(?:i|we|you) (?:said|told|mentioned|talked|discussed|spoke)|talk(?:ed)? about|discuss(?:ed)?|"
+    r"mention(?:ed)?)\b"
+)
+
+class TimeRange:
+    """
+    Half-open [start, end) range in UTC plus the phrase it was parsed from.
+    """
+    def __init__(self, start: datetime, end: datetime, label: str):
+        self.start = start.astimezone(timezone.utc)
+        self.end = end.astimezone(timezone.utc)
+        self.label = label
+
+    def bounds(self) -> tuple:
+        """
+        ISO strings comparable with stored message timestamps.
+        """
+        return iso(self.start), iso(self.end)
+
+    def to_dict(self) -> dict:
+        start, end = self.bounds()
+        return {"label": self.label, "start": start, "end": end}
+
+def iso(dt: datetime) -> str:
+    return dt.astimezone(timezone.utc).isoformat(timespec="microseconds")
+
+def _number(word: Optional[str]) -> int:
+    if not word:
+        return 1
+    return int(word) if word.isdigit() else _NUMBER_WORDS[word]
+
+def _day_part(day: datetime, part: Optional[str]) -> tuple:
+    if not part:
+        return day, day + timedelta(days=1)
+    start_hour, end_hour = _PARTS_OF_DAY[part]
+    return day + timedelta(hours=start_hour), day + timedelta(hours=end_hour)
+
+def parse_time_range(text: str, now: Optional[datetime] = None) -> Optional[TimeRange]:
+    """
+    Returns the time range referred to by the first recognized expression in `text`,
+    or None (also for periods that have not started yet, like "tonight" at noon). More
+    specific expressions win over generic ones ("last night" over "night").
+    """
+    text = text.lower()
+    now = (now or datetime.now(timezone.utc)).astimezone(USER_TZ)
+    midnight = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    monday = midnight - timedelta(days=now.weekday())
+
+    def result(start, end, match):
+        if start >= now:
+            return None
+        return TimeRange(start, min(end, now), match.group(0))
+
+    match = _AGO_RE.search(text)
+    if match:
+        n, unit = _number(match.group(1)), match.group(2)
+        center = now - n * _UNITS[unit]
+        if unit in ("minute", "hour"):
+            return result(center - _UNITS[unit], center + _UNITS[unit], match)
+        day = center.replace(hour=0, minute=0, second=0, microsecond=0)
+        slack = {"day": timedelta(0), "week": timedelta(days=2), "month": timedelta(days=7), "year": timedelta(days=30)}[unit]
+        return result(day - slack, day + timedelta(days=1) + slack, match)
+    match = _DAY_BEFORE_RE.search(text)
+    if match:
+        return result(midnight - timedelta(days=2), midnight - timedelta(days=1), match)
+    match = _LAST_NIGHT_RE.search(text)
+    if match:
+        return result(*_day_part(midnight - timedelta(days=1), "night"), match)
+    match = _YESTERDAY_RE.search(text)
+    if match:
+        return result(*_day_part(midnight - timedelta(days=1), match.group(1)), match)
+    match = _TODAY_PART_RE.search(text)
+    if match:
+        part = match.group(1) or ("evening" if match.group(2) else None)
+        return result(*_day_part(midnight, part), match)
+    match = _WEEKEND_RE.search(text)
+    if match:
+        saturday = monday - timedelta(days=2) if match.group(1) == "last" else monday + timedelta(days=5)
+        return result(saturday, saturday + timedelta(days=2), match)
+    match = _CALENDAR_RE.search(text)
+    if match:
+        which, unit = match.groups()
+        if unit == "week":
+            start = monday if which == "this" else monday - timedelta(weeks=1)
+            return result(start, start + timedelta(weeks=1), match)
+        if unit == "month":
+            first = midnight.replace(day=1)
+            if which == "this":
+                return result(first, now, match)
+            previous = (first - timedelta(days=1)).replace(day=1)
+            return result(previous, first, match)
+        first = midnight.replace(month=1, day=1)
+        if which == "this":
+            return result(first, now, match)
+        return result(first.replace(year=first.year - 1), first, match)
+    match = _ROLLING_RE.search(text)
+    if match:
+        n, unit = _number(match.group(1)), match.group(2)
+        return result(now - n * _UNITS[unit], now, match)
+    match = _WEEKDAY_RE.search(text)
+    if match:
+        weekday = _WEEKDAYS.index(match.group(1))
+        days_back = (now.weekday() - weekday) % 7 or 7
+        return result(*_day_part(midnight - timedelta(days=days_back), match.group(2)), match)
+    for match in _MONTH_DAY_RE.finditer(text):
+        month_first, day_first, year = match.group(1), match.group(5), match.group(6)
+        if month_first in _AMBIGUOUS_MONTHS and not match.group(3) and not year:
+            continue
+        month_name = month_first or day_first
+        day_number = int(match.group(2) or match.group(4))
+        month = next(i for i, m in enumerate(_MONTHS, 1) if m.startswith(month_name.rstrip(".")[:3]))
+        try:
+            day = midnight.replace(year=int(year) if year else midnight.year, month=month, day=day_number)
+        except ValueError:
+            return None
+        if day > now and not year:
+            day = day.replace(year=day.year - 1)
+        return result(day, day + timedelta(days=1), match)
+    return None
+
+def has_recall_cue(text: str) -> bool:
+    """
+    Whether `text` looks back at the conversation ("what did we discuss", "remember", "you said").
+    """
+    return _RECALL_CUE_RE.search(text.lower()) is not None
+
+# --- Time Buckets ---
+# Every saved message is also listed in one hour bucket and one day bucket (UTC), written in
+# the same batch as the message itself. A bucket holds the ids of its messages and, once
+# requested, a short Gemini summary. Recall reads only the buckets overlapping a range
+# (an indexed range query on granularity + start) instead of scanning history.
+GRANULARITIES = {"hour": timedelta(hours=1), "day": timedelta(days=1)}
+
+def bucket_start(timestamp: datetime, granularity: str) -> datetime:
+    timestamp = timestamp.astimezone(timezone.utc)
+    if granularity == "hour":
+        return timestamp.replace(minute=0, second=0, microsecond=0)
+    return timestamp.replace(hour=0, minute=0, second=0, microsecond=0)
+
+def bucket_id(start: datetime, granularity: str) -> str:
+    return f"{granularity}:{start:%Y-%m-%dT%H}" if granularity == "hour" else f"{granularity}:{start:%Y-%m-%d}"
+
+def buckets_for(messages: List[models.Message]) -> Dict[str, dict]:
+    """
+    Groups messages into the bucket documents they belong to, for save_messages.
+    """
+    buckets = {}
+    for message in messages:
+        timestamp = datetime.fromisoformat(message.timestamp)
+        for granularity, span in GRANULARITIES.items():
+            start = bucket_start(timestamp, granularity)
+            key = bucket_id(start, granularity)
+            if key not in buckets:
+                buckets[key] = {"granularity": granularity, "start": iso(start), "end": iso(start + span), "message_ids": [], "timestamps": []}
+            buckets[key]["message_ids"].append(message.message_id)
+            buckets[key]["timestamps"].append(message.timestamp)
+    return buckets
+
+# --- Time-range Recall ---
+# Ranges up to HOUR_BUCKETS_MAX_SPAN are read from hour buckets, longer ones from day buckets.
+# At most TIME_RECALL_MAX_MESSAGES messages are quoted, newest buckets first; older buckets
+# contribute their summary instead, and a summary is queued for any bucket that lacks a
+# current one, so the next question about that period gets it.
+TIME_RECALL_MAX_MESSAGES = int(os.environ.get("NOVA_TIME_RECALL_MAX_MESSAGES", "40"))
+HOUR_BUCKETS_MAX_SPAN = timedelta(hours=36)
+
+def _local_label(timestamp: str, with_time: bool = True) -> str:
+    local = datetime.fromisoformat(timestamp).astimezone(USER_TZ)
+    return local.strftime("%a %d %b %H:%M" if with_time else "%a %d %b")
+
+class Recall:
+    def __init__(self, time_range: TimeRange, messages: List[models.Message], summaries: List[str], total: int):
+        self.time_range = time_range
+        self.messages = messages
+        self.summaries = summaries
+        self.total = total
+
+    def context(self) -> List[dict]:
+        """
+        Recalled messages as history entries for assemble_prompt, each prefixed with its local time.
+        """
+        return [
+            {"message_id": m.message_id, "text": f"[{_local_label(m.timestamp)}] {m.text}", "mood": m.mood or "user"}
+            for m in self.messages
+        ]
+
+    def cache_key(self) -> str:
+        """
+        What a cached reply would depend on: the range and exactly which messages were recalled.
+        """
+        ids = hashlib.sha1(",".join(m.message_id for m in self.messages).encode("utf-8")).hexdigest()[:16]
+        return f"{self.time_range.label}|{ids}|{len(self.summaries)}"
+
+    def to_dict(self) -> dict:
+        return {
+            "range": self.time_range.to_dict(),
+            "total_messages": self.total,
+            "messages": [m.model_dump() for m in self.messages],
+            "summaries": self.summaries,
+        }
+
+def recall(text: str, now: Optional[datetime] = None, max_messages: int = TIME_RECALL_MAX_MESSAGES, require_cue: bool = True) -> Optional[Recall]:
+    """
+    Returns the messages and bucket summaries for the time expression in `text`, or None
+    when the text does not refer to a time. With require_cue (chat turns) the text must
+    also contain a recall cue, see has_recall_cue.
+    """
+    if require_cue and not has_recall_cue(text):
+        return None
+    time_range = parse_time_range(text, now)
+    if time_range is None:
+        return None
+    from backend import firebase
+    granularity = "hour" if time_range.end - time_range.start <= HOUR_BUCKETS_MAX_SPAN else "day"
+    start, end = time_range.bounds()
+    buckets = firebase.get_time_buckets(granularity, iso(bucket_start(time_range.start, granularity)), end)
+    ids = []
+    summaries = []
+    budget = max_messages
+    for bucket in reversed(buckets):
+        bucket_ids = bucket.get("message_ids") or []
+        if budget > 0:
+            taken = bucket_ids[-budget:]
+            ids = taken + ids
+            budget -= len(taken)
+            if len(taken) == len(bucket_ids):
+                continue
+        if bucket.get("summary"):
+            label = _local_label(bucket["start"], with_time=granularity == "hour")
+            summaries = [f"{label}: {point}" for point in bucket["summary"]] + summaries
+        if bucket.get("summarized_count", 0) < len(bucket_ids):
+            request_summary(bucket)
+    messages = [m for m in firebase.get_messages_by_ids(ids) if start <= m.timestamp < end]
+    messages.sort(key=lambda m: m.timestamp)
+    total = sum(len(bucket.get("message_ids") or []) for bucket in buckets)
+    logger.debug("Recalled %d of %d messages for '%s' (%s buckets)", len(messages), total, time_range.label, granularity)
+    return Recall(time_range, messages, summaries, total)
+
+def request_summary(bucket: dict):
+    count = len(bucket.get("message_ids") or [])
+    try:
+        jobs.enqueue(
+            "summarize_bucket",
+            {"bucket_id": bucket["bucket_id"], "granularity": bucket["granularity"], "start": bucket["start"], "end": bucket["end"]},
+            key=f"summarize_bucket:{bucket['bucket_id']}:{count}",
+        )
+    except Exception as e:
+        logger.error(f"Failed to enqueue summary of bucket {bucket['bucket_id']}: {e}")
+
+def summarize_bucket(payload: dict):
+    """
+    Job handler: summarizes the messages of one bucket with Gemini and stores the bullets.
+    """
+    from backend import firebase, llm
+    buckets = [b for b in firebase.get_time_buckets(payload["granularity"], payload["start"], payload["end"]) if b["bucket_id"] == payload["bucket_id"]]
+    if not buckets:
+        return
+    bucket = buckets[0]
+    messages = sorted(firebase.get_messages_by_ids(bucket.get("message_ids") or []), key=lambda m: m.timestamp)
+    if not messages:
+        return
+    prompt = (
+        "You are a memory agent for a chat system.\n"
+        "Summarize what was discussed in the following part of a conversation in 2-5 short bullet points.\n"
+        "Respond in strict JSON as a list of strings.\n"
+        f"Chat:\n{llm._chat_text(messages)}"
+    )
+    text = llm.gemini_generate(prompt)
+    try:
+        summary = [str(point) for point in json.loads(text)]
+    except Exception:
+        summary = [text.strip()]
+    firebase.set_time_bucket_summary(bucket["bucket_id"], summary, len(messages))
+
+jobs.register("summarize_bucket", summarize_bucket)
@@ -0,0 +1,129 @@
+"""
+Benchmark for history archives (backend/archive.py): export throughput and compression
+ratio from a SQLite store, random-access and time-range reads through the memory-mapped
+reader, and import throughput into a fresh store (time buckets included).
+
+    python -m bench.bench_archive --messages 1000000 --output bench/results/archive.json
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+os.environ.setdefault("NOVA_STORAGE_BACKEND", "memory")
+os.environ.setdefault("NOVA_JOBS_DB", ":memory:")
+
+from backend import archive, storage
+from bench.bench_chat import SAMPLE_MESSAGES, distribution_ms
+
+
+def populate(store: storage.SQLiteStorage, messages: int, sessions: int, seed: int):
+    """
+    Fills the store with chat-like messages spread over the last year, oldest first.
+    """
+    rng = random.Random(seed)
+    start = datetime.now(timezone.utc) - timedelta(days=365)
+    step = timedelta(days=365) / messages
+    for s in range(sessions):
+        timestamp = (start + s * messages // sessions * step).isoformat(timespec="microseconds")
+        store.create_session({"session_id": f"s{s}", "created_at": timestamp, "last_activity": timestamp})
+    batch = []
+    for i in range(messages):
+        batch.append({
+            "message_id": str(uuid.UUID(int=rng.getrandbits(128))),
+            "session_id": f"s{i * sessions // messages}",
+            "text": " ".join(rng.choice(SAMPLE_MESSAGES) for _ in range(rng.randint(1, 3))),
+            "quoted_reply_to": None,
+            "quoted_text": None,
+            "timestamp": (start + i * step).isoformat(timespec="microseconds"),
+            "tags": [],
+            "mood": "user" if i % 2 == 0 else "nova",
+        })
+        if len(batch) == storage.EXPORT_PAGE_SIZE:
+            store.import_documents("messages", batch)
+            batch = []
+    if batch:
+        store.import_documents("messages", batch)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--messages", type=int, default=200_000)
+    parser.add_argument("--sessions", type=int, default=2_000)
+    parser.add_argument("--codec", choices=("zstd", "zlib"), default=archive.default_codec())
+    parser.add_argument("--reads", type=int, default=1000, help="random document reads")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--output", help="write the JSON report here")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="nova-bench-")
+    source = storage.SQLiteStorage(os.path.join(workdir, "source.sqlite3"))
+    populate(source, args.messages, args.sessions, args.seed)
+    print(f"populated {args.messages} messages", file=sys.stderr)
+
+    path = os.path.join(workdir, "history.jsonl.zst" if args.codec == "zstd" else "history.jsonl.zlib")
+    began = time.perf_counter()
+    index = archive.export_archive(path, storage=source, codec=args.codec)
+    exported = time.perf_counter() - began
+    raw_bytes = sum(chunk["raw_bytes"] for chunk in index["chunks"])
+    size = os.path.getsize(path)
+
+    rng = random.Random(args.seed)
+    with archive.ArchiveReader(path) as reader:
+        count = reader.count("messages")
+        latencies = []
+        for _ in range(args.reads):
+            position = rng.randrange(count)
+            began = time.perf_counter()
+            reader.document("messages", position)
+            latencies.append(time.perf_counter() - began)
+        first = reader.document("messages", 0)["timestamp"]
+        day_start = (datetime.fromisoformat(first) + timedelta(days=180)).isoformat()
+        day_end = (datetime.fromisoformat(first) + timedelta(days=181)).isoformat()
+        began = time.perf_counter()
+        day = sum(1 for _ in reader.iter_range("messages", day_start, day_end))
+        day_seconds = time.perf_counter() - began
+        began = time.perf_counter()
+        scanned = sum(1 for _ in reader.iter_documents("messages"))
+        scan_seconds = time.perf_counter() - began
+
+    target = storage.SQLiteStorage(os.path.join(workdir, "target.sqlite3"))
+    began = time.perf_counter()
+    imported = archive.import_archive(path, storage=target)
+    import_seconds = time.perf_counter() - began
+
+    report = {
+        "messages": args.messages,
+        "codec": index["codec"],
+        "chunks": len(index["chunks"]),
+        "export": {
+            "seconds": round(exported, 2),
+            "documents_per_second": round(sum(index["collections"].values()) / exported),
+            "bytes": size,
+            "raw_bytes": raw_bytes,
+            "ratio": round(raw_bytes / size, 2),
+        },
+        "read": {
+            "random_document_ms": distribution_ms(latencies),
+            "one_day_range": {"messages": day, "ms": round(day_seconds * 1000, 1)},
+            "full_scan": {"seconds": round(scan_seconds, 2), "messages_per_second": round(scanned / scan_seconds)},
+        },
+        "import": {
+            "seconds": round(import_seconds, 2),
+            "documents_per_second": round(sum(imported.values()) / import_seconds),
+        },
+    }
+    print(json.dumps(report, indent=2))
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,320 @@
+"""
+Load test for the chat endpoints (/message, /message-smart, /chat/stream, /messages).
+The app runs under uvicorn against a local fake Groq server, a fake Gemini provider and
+in-memory storage, and is driven by concurrent simulated users. No external calls are made.
+
+    python -m bench.bench_chat --users 32 --turns 10 --output bench/results/chat.json
+    python -m bench.bench_chat --users 32 --turns 10 --baseline bench/results/chat.json
+
+Each endpoint runs as its own phase so upstream calls can be attributed per turn. Results
+(throughput, p50/p95/p99 latency, time to first token, upstream calls per turn) are printed
+and optionally written as JSON so runs can be diffed between commits.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import socket
+import subprocess
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+
+ENDPOINTS = ("message", "message-smart", "chat-stream", "messages")
+SAMPLE_MESSAGES = [
+    "hey, how was your day?",
+    "I went hiking near the lake this morning and my legs are done",
+    "can you remind me what we said about the trip budget?",
+    "thanks!",
+    "my cat knocked the plant over again",
+    "what should I cook tonight with rice and spinach",
+    "ok",
+    "I'm nervous about the interview on friday",
+]
+
+
+# --- Fake Groq Server ---
+class FakeGroqHandler(BaseHTTPRequestHandler):
+    """
+    OpenAI-compatible chat completions. Waits `latency` seconds before the first token, then
+    produces `reply_tokens` tokens at `tokens_per_second`, streamed as SSE when asked to.
+    """
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        server = self.server
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        server.record(body.get("model", ""))
+        tokens = [f"tok{i} " for i in range(server.reply_tokens)]
+        gap = 1.0 / server.tokens_per_second if server.tokens_per_second > 0 else 0.0
+        time.sleep(server.latency)
+        if not body.get("stream"):
+            time.sleep(gap * len(tokens))
+            payload = json.dumps({"choices": [{"message": {"content": "".join(tokens)}}]}).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for token in tokens:
+            self._chunk(f"data: {json.dumps({'choices': [{'delta': {'content': token}}]})}\n\n")
+            time.sleep(gap)
+        self._chunk("data: [DONE]\n\n")
+        self.wfile.write(b"0\r\n\r\n")
+
+    def _chunk(self, text: str):
+        data = text.encode("utf-8")
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+        self.wfile.flush()
+
+
+class FakeGroqServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, latency: float, tokens_per_second: float, reply_tokens: int):
+        super().__init__(("127.0.0.1", 0), FakeGroqHandler)
+        self.latency = latency
+        self.tokens_per_second = tokens_per_second
+        self.reply_tokens = reply_tokens
+        self.calls = {}
+        self._lock = threading.Lock()
+
+    def record(self, model: str):
+        with self._lock:
+            self.calls[model] = self.calls.get(model, 0) + 1
+
+    def total_calls(self) -> int:
+        with self._lock:
+            return sum(self.calls.values())
+
+
+# --- App Under Test ---
+def start_app(groq: FakeGroqServer, gemini_latency: float, response_cache: bool):
+    """
+    Points the backend at the fakes, then serves the app with uvicorn on a free local port.
+    Environment variables must be set before backend is imported, since it reads them at import.
+    """
+    os.environ["YOUR_GROQ_API_KEY"] = "bench"
+    os.environ["YOUR_GEMINI_API_KEY"] = "bench"
+    os.environ["NOVA_GROQ_API_URL"] = f"http://127.0.0.1:{groq.server_port}/v1/chat/completions"
+    os.environ.setdefault("NOVA_STORAGE_BACKEND", "memory")
+    os.environ.setdefault("NOVA_JOBS_DB", os.path.join(tempfile.mkdtemp(prefix="nova-bench-"), "jobs.sqlite3"))
+    os.environ["NOVA_RESPONSE_CACHE"] = "1" if response_cache else "0"
+    import uvicorn
+    from backend import llm, main as app_module
+    from bench.bench_topic_analysis import FakeGemini
+
+    # Keep the console for results; per-request logging would also skew the numbers
+    logging.disable(logging.INFO)
+    gemini = FakeGemini(gemini_latency, 0.0)
+    llm._gemini_provider = gemini
+
+    sock = socket.socket()
+    sock.bind(("127.0.0.1", 0))
+    server = uvicorn.Server(uvicorn.Config(app_module.app, log_level="warning", lifespan="on"))
+    thread = threading.Thread(target=server.run, kwargs={"sockets": [sock]}, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.05)
+    return server, thread, f"http://127.0.0.1:{sock.getsockname()[1]}", gemini, app_module
+
+
+def seed_sessions(sessions, history: int):
+    from backend import firebase, models
+    for session_id in sessions:
+        messages = [
+            firebase.new_message(models.MessageCreate(
+                session_id=session_id, text=SAMPLE_MESSAGES[i % len(SAMPLE_MESSAGES)], mood="user" if i % 2 == 0 else "nova",
+            ))
+            for i in range(history)
+        ]
+        if messages:
+            firebase.save_messages_batch(messages)
+
+
+# --- Simulated Users ---
+async def one_turn(client: httpx.AsyncClient, endpoint: str, session_id: str, text: str, history: list) -> dict:
+    """
+    Runs one request and returns {"ok", "latency"} plus "ttft" for streamed replies (seconds).
+    """
+    start = time.perf_counter()
+    result = {"ok": False}
+    if endpoint == "chat-stream":
+        body = {"user_message": text, "local_history": history[-20:], "session_id": session_id}
+        async with client.stream("POST", "/chat/stream", json=body) as resp:
+            event = None
+            async for line in resp.aiter_lines():
+                if line.startswith("event: "):
+                    event = line[7:]
+                    if event == "delta" and "ttft" not in result:
+                        result["ttft"] = time.perf_counter() - start
+                    elif event == "saved":
+                        result["ok"] = resp.status_code == 200
+                    elif event == "error":
+                        break
+    elif endpoint == "messages":
+        resp = await client.get("/messages", params={"session_id": session_id, "limit": 100})
+        result["ok"] = resp.status_code == 200
+    else:
+        resp = await client.post(f"/{endpoint}", json={"session_id": session_id, "text": text})
+        result["ok"] = resp.status_code == 200
+    result["latency"] = time.perf_counter() - start
+    return result
+
+
+async def simulated_user(client, endpoint: str, session_id: str, turns: int, think: float, offset: int, results: list):
+    history = []
+    for turn in range(turns):
+        text = SAMPLE_MESSAGES[(offset + turn) % len(SAMPLE_MESSAGES)]
+        history.append({"text": text, "mood": "user"})
+        try:
+            results.append(await one_turn(client, endpoint, session_id, text, history))
+        except httpx.HTTPError:
+            results.append({"ok": False, "latency": 0.0})
+        if think:
+            await asyncio.sleep(think)
+
+
+def percentile(values, pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered))) - 1))]
+
+
+def distribution_ms(values) -> dict:
+    return {f"p{p}": round(percentile(values, p) * 1000, 1) for p in (50, 95, 99)} | {"max": round(max(values, default=0.0) * 1000, 1)}
+
+
+def wait_for_postprocessing(app_module, timeout: float = 30.0):
+    deadline = time.monotonic() + timeout
+    while app_module._postprocess_queue.unfinished_tasks and time.monotonic() < deadline:
+        time.sleep(0.05)
+
+
+async def run_phase(base_url: str, endpoint: str, sessions, args, groq, gemini, app_module) -> dict:
+    groq_before, gemini_before = groq.total_calls(), gemini.calls
+    results = []
+    limits = httpx.Limits(max_connections=len(sessions), max_keepalive_connections=len(sessions))
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=120) as client:
+        start = time.perf_counter()
+        await asyncio.gather(*[
+            simulated_user(client, endpoint, session_id, args.turns, args.think, i, results)
+            for i, session_id in enumerate(sessions)
+        ])
+        elapsed = time.perf_counter() - start
+    await asyncio.to_thread(wait_for_postprocessing, app_module)
+    ok = [r for r in results if r["ok"]]
+    phase = {
+        "requests": len(results),
+        "errors": len(results) - len(ok),
+        "seconds": round(elapsed, 3),
+        "throughput_rps": round(len(ok) / elapsed, 2) if elapsed else 0.0,
+        "latency_ms": distribution_ms([r["latency"] for r in ok]),
+    }
+    ttfts = [r["ttft"] for r in ok if "ttft" in r]
+    if ttfts:
+        phase["ttft_ms"] = distribution_ms(ttfts)
+    turns = len(results) or 1
+    phase["upstream_calls_per_turn"] = {
+        "groq": round((groq.total_calls() - groq_before) / turns, 3),
+        "gemini": round((gemini.calls - gemini_before) / turns, 3),
+    }
+    return phase
+
+
+# --- Reporting ---
+def git_revision() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except Exception:
+        return "unknown"
+
+
+def print_report(report: dict, baseline: dict = None):
+    print(f"\nrev {report['git_revision']}  users {report['config']['users']}  turns {report['config']['turns']}")
+    header = f"{'endpoint':<15}{'rps':>9}{'p50':>9}{'p95':>9}{'p99':>9}{'ttft95':>9}{'groq/t':>8}{'gem/t':>8}{'err':>6}"
+    print(header)
+    for endpoint, phase in report["phases"].items():
+        lat = phase["latency_ms"]
+        ttft = phase.get("ttft_ms", {}).get("p95", "-")
+        up = phase["upstream_calls_per_turn"]
+        print(f"{endpoint:<15}{phase['throughput_rps']:>9}{lat['p50']:>9}{lat['p95']:>9}{lat['p99']:>9}{ttft:>9}{up['groq']:>8}{up['gemini']:>8}{phase['errors']:>6}")
+        old = (baseline or {}).get("phases", {}).get(endpoint)
+        if old:
+            def delta(new, prev):
+                return f"{(new - prev) / prev * 100:+.1f}%" if prev else "n/a"
+            print(f"{'  vs baseline':<15}{delta(phase['throughput_rps'], old['throughput_rps']):>9}"
+                  f"{delta(lat['p50'], old['latency_ms']['p50']):>9}{delta(lat['p95'], old['latency_ms']['p95']):>9}"
+                  f"{delta(lat['p99'], old['latency_ms']['p99']):>9}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--users", type=int, default=16, help="concurrent simulated users (one session each)")
+    parser.add_argument("--turns", type=int, default=10, help="requests per user per endpoint")
+    parser.add_argument("--think", type=float, default=0.0, help="seconds each user waits between turns")
+    parser.add_argument("--endpoints", default=",".join(ENDPOINTS), help="comma-separated subset of " + ", ".join(ENDPOINTS))
+    parser.add_argument("--history", type=int, default=20, help="messages seeded into each session before the run")
+    parser.add_argument("--groq-latency", type=float, default=0.2, help="seconds before Groq's first token")
+    parser.add_argument("--groq-tps", type=float, default=200.0, help="Groq tokens per second")
+    parser.add_argument("--reply-tokens", type=int, default=40)
+    parser.add_argument("--gemini-latency", type=float, default=0.3, help="seconds per Gemini call")
+    parser.add_argument("--response-cache", action="store_true", help="enable NOVA_RESPONSE_CACHE")
+    parser.add_argument("--output", help="write the JSON report here")
+    parser.add_argument("--baseline", help="JSON report of an earlier run to compare against")
+    args = parser.parse_args()
+
+    endpoints = [e.strip() for e in args.endpoints.split(",") if e.strip()]
+    unknown = set(endpoints) - set(ENDPOINTS)
+    if unknown:
+        parser.error(f"unknown endpoints: {', '.join(sorted(unknown))}")
+
+    groq = FakeGroqServer(args.groq_latency, args.groq_tps, args.reply_tokens)
+    threading.Thread(target=groq.serve_forever, daemon=True).start()
+    server, thread, base_url, gemini, app_module = start_app(groq, args.gemini_latency, args.response_cache)
+    try:
+        phases = {}
+        for endpoint in endpoints:
+            # Fresh sessions per phase so earlier phases do not warm caches for later ones
+            sessions = [f"bench-{endpoint}-{i}" for i in range(args.users)]
+            seed_sessions(sessions, args.history)
+            phases[endpoint] = asyncio.run(run_phase(base_url, endpoint, sessions, args, groq, gemini, app_module))
+    finally:
+        server.should_exit = True
+        thread.join(10)
+        groq.shutdown()
+
+    report = {
+        "git_revision": git_revision(),
+        "python": platform.python_version(),
+        "config": {k: v for k, v in vars(args).items() if k not in ("output", "baseline")},
+        "phases": phases,
+    }
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    print_report(report, baseline)
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nWrote {args.output}")
+
+
+if __name__ == "__main__":
+    main()
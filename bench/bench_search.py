@@ -0,0 +1,137 @@
+"""
+Benchmark for the full-text search index (backend/search.py) on a synthetic corpus:
+build rate, query latency for several query shapes and filters, and snapshot save/load
+time. Words follow a Zipf distribution so common and rare terms behave realistically.
+Storage is not involved; hydrating the top-k for highlights is one batched read on top
+of the index times reported here.
+
+    python -m bench.bench_search --messages 1000000 --output bench/results/search.json
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+
+os.environ.setdefault("NOVA_STORAGE_BACKEND", "memory")
+os.environ.setdefault("NOVA_JOBS_DB", ":memory:")
+
+import numpy as np
+
+from backend import models, search
+from bench.bench_chat import distribution_ms
+
+
+def corpus(messages: int, vocabulary: int, sessions: int, seed: int):
+    """
+    Yields chat-like messages spread over the last year, oldest first.
+    """
+    rng = np.random.default_rng(seed)
+    words = [f"w{i}" for i in range(vocabulary)]
+    ranks = np.minimum(rng.zipf(1.2, size=messages * 30), vocabulary) - 1
+    lengths = rng.integers(3, 25, size=messages)
+    start = datetime.now(timezone.utc) - timedelta(days=365)
+    step = timedelta(days=365) / messages
+    offset = 0
+    for i in range(messages):
+        text = " ".join(words[r] for r in ranks[offset:offset + lengths[i]])
+        offset += lengths[i]
+        yield models.Message(
+            message_id=f"m{i:08d}",
+            session_id=f"s{i * sessions // messages}",
+            text=text,
+            timestamp=(start + i * step).isoformat(timespec="microseconds"),
+            mood="user" if i % 2 == 0 else "nova",
+        )
+
+
+def query_shapes(vocabulary: int, sessions: int, rng: random.Random) -> dict:
+    """
+    Query generators by shape: kwargs for SearchIndex.search.
+    """
+    def word(low, high):
+        return f"w{rng.randrange(low, min(high, vocabulary))}"
+
+    now = datetime.now(timezone.utc)
+    last_week = (search.to_micros((now - timedelta(days=7)).isoformat()), search.to_micros(now.isoformat()))
+    return {
+        "rare_term": lambda: {"terms": [word(1000, vocabulary)]},
+        "common_term": lambda: {"terms": [word(0, 10)]},
+        "two_terms": lambda: {"terms": [word(0, 100), word(100, 5000)]},
+        "four_terms": lambda: {"terms": [word(0, 50), word(50, 500), word(500, 5000), word(5000, vocabulary)]},
+        "common_in_session": lambda: {"terms": [word(0, 10)], "session_id": f"s{rng.randrange(sessions)}"},
+        "common_last_week": lambda: {"terms": [word(0, 10)], "start": last_week[0], "end": last_week[1]},
+        "two_terms_nova": lambda: {"terms": [word(0, 100), word(100, 5000)], "mood": "nova"},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--messages", type=int, default=1_000_000)
+    parser.add_argument("--vocabulary", type=int, default=50_000)
+    parser.add_argument("--sessions", type=int, default=2_000)
+    parser.add_argument("--queries", type=int, default=200, help="queries per shape")
+    parser.add_argument("--k", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--output", help="write the JSON report here")
+    args = parser.parse_args()
+
+    index = search.SearchIndex()
+    start = time.perf_counter()
+    batch = []
+    for message in corpus(args.messages, args.vocabulary, args.sessions, args.seed):
+        batch.append(message)
+        if len(batch) == 1000:
+            index.add(batch)
+            batch = []
+    index.add(batch)
+    build = time.perf_counter() - start
+    print(f"indexed {len(index)} messages in {build:.1f}s", file=sys.stderr)
+
+    rng = random.Random(args.seed)
+    queries = {}
+    for shape, make in query_shapes(args.vocabulary, args.sessions, rng).items():
+        latencies, matches = [], []
+        for _ in range(args.queries):
+            kwargs = make()
+            began = time.perf_counter()
+            total, _ = index.search(k=args.k, **kwargs)
+            latencies.append(time.perf_counter() - began)
+            matches.append(total)
+        queries[shape] = distribution_ms(latencies) | {"median_matches": int(np.median(matches))}
+
+    path = os.path.join(tempfile.mkdtemp(prefix="nova-bench-"), "search.npz")
+    began = time.perf_counter()
+    index.save(path)
+    saved = time.perf_counter() - began
+    began = time.perf_counter()
+    with np.load(path, allow_pickle=False) as arrays:
+        loaded = search.SearchIndex.from_arrays({name: arrays[name] for name in arrays.files})
+        terms = len(arrays["terms_offsets"]) - 1
+    load = time.perf_counter() - began
+    assert len(loaded) == len(index)
+
+    report = {
+        "messages": len(index),
+        "terms": terms,
+        "build_seconds": round(build, 1),
+        "build_messages_per_second": round(len(index) / build),
+        "queries_ms": queries,
+        "snapshot": {
+            "bytes": os.path.getsize(path),
+            "save_seconds": round(saved, 2),
+            "load_seconds": round(load, 2),
+        },
+    }
+    print(json.dumps(report, indent=2))
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
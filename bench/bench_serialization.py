@@ -0,0 +1,114 @@
+"""
+Micro-benchmark for response serialization of large message payloads: FastAPI's
+response_model paths against backend/responses.py, plus the cost and ratio of each
+compression encoding.
+
+    python -m bench.bench_serialization --messages 10000 --output bench/results/serialization.json
+
+Paths compared, per payload of --messages models.Message objects:
+- fastapi_encoder: validate against response_model, dump to Python, json.dumps (FastAPI
+  before the Rust dump_json path, or with any custom response class)
+- fastapi_dump_json: validate, then dump_json in Rust (current FastAPI default)
+- orjson: responses.dumps, no validation (what the read endpoints use now)
+- ndjson_pydantic / ndjson_orjson: the old per-line model_dump_json of /messages against
+  responses.ndjson_response's chunked lines
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import time
+import uuid
+from typing import List
+
+from pydantic import TypeAdapter
+
+from backend import models, responses
+from bench.bench_chat import SAMPLE_MESSAGES
+
+
+def payload(count: int, seed: int) -> List[models.Message]:
+    rng = random.Random(seed)
+    session_id = str(uuid.UUID(int=rng.getrandbits(128)))
+    return [
+        models.Message(
+            message_id=str(uuid.UUID(int=rng.getrandbits(128))),
+            session_id=session_id,
+            text=" ".join(rng.choice(SAMPLE_MESSAGES) for _ in range(rng.randint(1, 3))),
+            quoted_reply_to=None,
+            quoted_text=rng.choice(SAMPLE_MESSAGES) if i % 2 else None,
+            timestamp=f"2026-10-18T{i // 3600 % 24:02d}:{i // 60 % 60:02d}:{i % 60:02d}.{i % 1000000:06d}+00:00",
+            tags=[],
+            mood="nova" if i % 2 else "user",
+        )
+        for i in range(count)
+    ]
+
+
+def measure(func, repeat: int) -> tuple:
+    """
+    Returns (median seconds, output of the last run).
+    """
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        out = func()
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples), out
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--messages", type=int, default=10_000)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--output", help="write the JSON report here")
+    args = parser.parse_args()
+
+    messages = payload(args.messages, args.seed)
+    adapter = TypeAdapter(List[models.Message])
+    encoders = {
+        "fastapi_encoder": lambda: json.dumps(
+            adapter.dump_python(adapter.validate_python(messages, from_attributes=True), mode="json"),
+            ensure_ascii=False, allow_nan=False, separators=(",", ":"),
+        ).encode("utf-8"),
+        "fastapi_dump_json": lambda: adapter.dump_json(adapter.validate_python(messages, from_attributes=True)),
+        "orjson": lambda: responses.dumps(messages),
+        "ndjson_pydantic": lambda: "".join(m.model_dump_json() + "\n" for m in messages).encode("utf-8"),
+        "ndjson_orjson": lambda: b"".join(responses.ndjson_chunks(messages)),
+    }
+
+    report = {"messages": args.messages, "serialize": {}, "compress": {}}
+    baseline = None
+    for name, encode in encoders.items():
+        seconds, body = measure(encode, args.repeat)
+        baseline = baseline or seconds
+        report["serialize"][name] = {
+            "ms": round(seconds * 1000, 2),
+            "messages_per_second": round(args.messages / seconds),
+            "mb_per_second": round(len(body) / seconds / 1e6, 1),
+            "bytes": len(body),
+            "speedup": round(baseline / seconds, 2),
+        }
+
+    body = responses.dumps(messages)
+    encodings = ["gzip"] + (["br"] if responses.brotli is not None else [])
+    for encoding in encodings:
+        seconds, compressed = measure(lambda: responses.Compressor(encoding).compress(body, final=True), args.repeat)
+        report["compress"][encoding] = {
+            "ms": round(seconds * 1000, 2),
+            "mb_per_second": round(len(body) / seconds / 1e6, 1),
+            "ratio": round(len(body) / len(compressed), 2),
+            "bytes": len(compressed),
+        }
+
+    print(json.dumps(report, indent=2))
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
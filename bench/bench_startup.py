@@ -0,0 +1,153 @@
+"""
+Measures cold-start cost of the API and checks it against a budget, so it can run in CI
+and be tracked between commits:
+- import time of backend.main in a fresh interpreter (median of --runs), with the slowest
+  top-level packages from python -X importtime
+- SDKs that must load lazily (Firebase, Gemini, gRPC) but were imported anyway
+- with --serve, time from spawning `uvicorn backend.main:app` to the first HTTP response
+  and to GET /ready returning 200
+
+    python -m bench.bench_startup --budget-ms 800 --serve --output bench/results/startup.json
+
+Exits with status 1 when the import budget is exceeded or a lazy SDK was imported.
+"""
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LAZY_MODULES = ("firebase_admin", "google.cloud.firestore", "google.generativeai", "grpc")
+PROBE = (
+    "import json, sys, time\n"
+    "start = time.perf_counter()\n"
+    "import backend.main\n"
+    "elapsed = time.perf_counter() - start\n"
+    f"lazy = sorted(m for m in {LAZY_MODULES!r} if m in sys.modules)\n"
+    "print(json.dumps({'seconds': elapsed, 'lazy_loaded': lazy}))\n"
+)
+
+
+def bench_env() -> dict:
+    env = dict(os.environ)
+    env.setdefault("NOVA_STORAGE_BACKEND", "memory")
+    env.setdefault("NOVA_JOBS_DB", os.path.join(tempfile.mkdtemp(prefix="nova-bench-"), "jobs.sqlite3"))
+    return env
+
+
+def measure_import(runs: int, env: dict) -> dict:
+    samples = []
+    lazy_loaded = set()
+    for _ in range(runs):
+        out = subprocess.run([sys.executable, "-c", PROBE], cwd=ROOT, env=env, capture_output=True, text=True, check=True)
+        result = json.loads(out.stdout.strip().splitlines()[-1])
+        samples.append(result["seconds"])
+        lazy_loaded.update(result["lazy_loaded"])
+    return {
+        "median_ms": round(statistics.median(samples) * 1000, 1),
+        "min_ms": round(min(samples) * 1000, 1),
+        "max_ms": round(max(samples) * 1000, 1),
+        "lazy_loaded": sorted(lazy_loaded),
+    }
+
+
+def slowest_packages(env: dict, top: int) -> list:
+    """
+    Top-level packages by total self import time, from python -X importtime.
+    """
+    out = subprocess.run([sys.executable, "-X", "importtime", "-c", "import backend.main"], cwd=ROOT, env=env, capture_output=True, text=True, check=True)
+    totals = {}
+    for line in out.stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        self_us, _, name = (part.strip() for part in line[len("import time:"):].split("|"))
+        if not self_us.isdigit():
+            continue
+        package = name.split(".")[0]
+        totals[package] = totals.get(package, 0) + int(self_us)
+    ranked = sorted(totals.items(), key=lambda item: -item[1])[:top]
+    return [{"package": name, "self_ms": round(us / 1000, 1)} for name, us in ranked]
+
+
+def measure_serve(env: dict, timeout: float) -> dict:
+    sock = socket.socket()
+    sock.bind(("127.0.0.1", 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    start = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "backend.main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    result = {"listening_ms": None, "ready_ms": None}
+    try:
+        deadline = start + timeout
+        with httpx.Client(base_url=f"http://127.0.0.1:{port}", timeout=1) as client:
+            while time.perf_counter() < deadline and result["ready_ms"] is None:
+                try:
+                    resp = client.get("/ready")
+                except httpx.HTTPError:
+                    time.sleep(0.01)
+                    continue
+                elapsed = round((time.perf_counter() - start) * 1000, 1)
+                if result["listening_ms"] is None:
+                    result["listening_ms"] = elapsed
+                if resp.status_code == 200:
+                    result["ready_ms"] = elapsed
+                    result["warmup"] = resp.json()
+                elif resp.json().get("state") == "failed":
+                    result["warmup"] = resp.json()
+                    break
+                else:
+                    time.sleep(0.01)
+    finally:
+        proc.terminate()
+        proc.wait(10)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5, help="fresh interpreters to time the import in")
+    parser.add_argument("--budget-ms", type=float, default=800.0, help="maximum median import time of backend.main")
+    parser.add_argument("--top", type=int, default=10, help="slowest top-level packages to report")
+    parser.add_argument("--serve", action="store_true", help="also time uvicorn startup to listening and ready")
+    parser.add_argument("--serve-timeout", type=float, default=30.0)
+    parser.add_argument("--output", help="write the JSON report here")
+    args = parser.parse_args()
+
+    env = bench_env()
+    report = {
+        "python": sys.version.split()[0],
+        "budget_ms": args.budget_ms,
+        "import": measure_import(args.runs, env),
+        "slowest_imports": slowest_packages(env, args.top),
+    }
+    if args.serve:
+        report["serve"] = measure_serve(env, args.serve_timeout)
+    problems = []
+    if report["import"]["median_ms"] > args.budget_ms:
+        problems.append(f"import of backend.main took {report['import']['median_ms']}ms (budget {args.budget_ms}ms)")
+    if report["import"]["lazy_loaded"]:
+        problems.append(f"lazy SDKs imported at startup: {', '.join(report['import']['lazy_loaded'])}")
+    report["ok"] = not problems
+
+    print(json.dumps(report, indent=2))
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    for problem in problems:
+        print(f"FAIL: {problem}", file=sys.stderr)
+    sys.exit(1 if problems else 0)
+
+
+if __name__ == "__main__":
+    main()
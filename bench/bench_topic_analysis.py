@@ -0,0 +1,74 @@
+"""
+Compares the session topic analysis modes (sequential / parallel / batch) against a fake
+Gemini provider with injected latency. No network calls are made.
+
+    NOVA_STORAGE_BACKEND=memory python -m bench.bench_topic_analysis --clusters 8 --latency 0.4
+"""
+import argparse
+import asyncio
+import json
+import threading
+import time
+from backend import llm, models
+
+
+class FakeGemini:
+    """
+    Stands in for llm.GeminiProvider: sleeps for `latency` seconds (plus a per-cluster cost
+    for batch prompts) and answers with well-formed JSON.
+    """
+    def __init__(self, latency: float, per_item: float):
+        self.latency = latency
+        self.per_item = per_item
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def complete_sync(self, prompt: str, timeout: float = None) -> str:
+        with self._lock:
+            self.calls += 1
+        items = prompt.count("Conversation ")
+        time.sleep(self.latency + self.per_item * items)
+        if items:
+            return json.dumps([{"conversation": i, "topic": f"topic {i}", "summary": ["..."]} for i in range(items)])
+        return json.dumps({"topic": "topic", "summary": ["..."]})
+
+    async def complete(self, prompt: str, timeout: float = None) -> str:
+        return await asyncio.to_thread(self.complete_sync, prompt, timeout)
+
+
+def make_clusters(count: int, size: int):
+    return [
+        [models.Message(message_id=f"{c}-{i}", session_id="bench", text=f"message {i} about topic {c}", timestamp=str(i), mood="user")
+         for i in range(size)]
+        for c in range(count)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--clusters", type=int, default=8)
+    parser.add_argument("--size", type=int, default=10, help="messages per cluster")
+    parser.add_argument("--latency", type=float, default=0.4, help="seconds per Gemini call")
+    parser.add_argument("--per-item", type=float, default=0.05, help="extra seconds per cluster in a batch call")
+    args = parser.parse_args()
+
+    clusters = make_clusters(args.clusters, args.size)
+    # Let the bench run at full speed; the limiter is exercised separately in production
+    llm.gemini_rate_limiter.capacity = llm.gemini_rate_limiter._tokens = 10 ** 6
+    results = {}
+    for mode in ("sequential", "parallel", "batch"):
+        fake = FakeGemini(args.latency, args.per_item)
+        llm._gemini_provider = fake
+        start = time.perf_counter()
+        summaries = llm.summarize_clusters(clusters, mode=mode)
+        elapsed = time.perf_counter() - start
+        results[mode] = {
+            "seconds": round(elapsed, 3),
+            "gemini_calls": fake.calls,
+            "summarized": sum(1 for topic, summary in summaries if topic and summary),
+        }
+    print(json.dumps({"clusters": args.clusters, "latency": args.latency, "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
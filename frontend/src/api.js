@@ -2,11 +2,19 @@
 
 const API_BASE = 'http://localhost:8000'; // Change if backend is hosted elsewhere
 
-export async function getMessages(session_id) {
-  const url = session_id ? `${API_BASE}/messages?session_id=${session_id}` : `${API_BASE}/messages`;
-  const res = await fetch(url);
+// GET /messages returns one page as NDJSON. Pass `before` (oldest timestamp seen) to
+// scroll back, or `after` (newest timestamp seen) to fetch only new messages.
+export async function getMessages(session_id, { limit, before, after } = {}) {
+  const params = new URLSearchParams();
+  if (session_id) params.set('session_id', session_id);
+  if (limit) params.set('limit', limit);
+  if (before) params.set('before', before);
+  if (after) params.set('after', after);
+  const query = params.toString();
+  const res = await fetch(query ? `${API_BASE}/messages?${query}` : `${API_BASE}/messages`);
   if (!res.ok) throw new Error('Failed to fetch messages');
-  return await res.json();
+  const text = await res.text();
+  return text.split('\n').filter(line => line.trim()).map(line => JSON.parse(line));
 }
 
 export async function postMessage(message) {
@@ -55,24 +63,34 @@ export async function sendChatMessage({ user_message, local_history, session_id,
   return await res.json();
 }
 
-export async function* sendChatMessageStream({ user_message, local_history, session_id, topic }) {
+// Streams /chat/stream Server-Sent Events. Yields { type, data } for each event:
+// start, first_token, delta ({ text }), saved ({ messages }), error ({ detail }), done.
+export async function* sendChatMessageStream({ user_message, local_history, session_id, quoted_text, quoted_reply_to }) {
   const res = await fetch(`${API_BASE}/chat/stream`, {
     method: 'POST',
-    headers: { 'Content-Type': 'application/json' },
-    body: JSON.stringify({ user_message, local_history, session_id, topic }),
+    headers: { 'Content-Type': 'application/json', Accept: 'text/event-stream' },
+    body: JSON.stringify({ user_message, local_history, session_id, quoted_text, quoted_reply_to }),
   });
   if (!res.ok) throw new Error('Failed to send chat message');
   const reader = res.body.getReader();
   const decoder = new TextDecoder();
-  let done = false;
   let buffer = '';
-  while (!done) {
-    const { value, done: doneReading } = await reader.read();
-    done = doneReading;
-    if (value) {
-      buffer = decoder.decode(value, { stream: true });
-      yield buffer;
+  while (true) {
+    const { value, done } = await reader.read();
+    if (value) buffer += decoder.decode(value, { stream: true });
+    let boundary;
+    while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+      const raw = buffer.slice(0, boundary);
+      buffer = buffer.slice(boundary + 2);
+      let type = 'message';
+      const data = [];
+      for (const line of raw.split('\n')) {
+        if (line.startsWith('event:')) type = line.slice(6).trim();
+        else if (line.startsWith('data:')) data.push(line.slice(5).trim());
+      }
+      yield { type, data: data.length ? JSON.parse(data.join('\n')) : null };
     }
+    if (done) break;
   }
 }
 
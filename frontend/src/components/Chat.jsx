@@ -8,6 +8,8 @@ import { getMessages, getSummaries, generateSummary, createSession, sendChatMess
 
 const CHAT_HISTORY_KEY = 'nova_chat_history';
 const SESSION_TIMEOUT_MINUTES = 30; // Example: 30 minutes
+const PAGE_SIZE = 100; // Messages per /messages page
+const LOAD_OLDER_THRESHOLD_PX = 40; // Load the previous page when scrolled this close to the top
 
 function getSessionIdFromStorage() {
   return localStorage.getItem('nova_session_id');
@@ -35,40 +37,73 @@ export default function Chat() {
   const [error, setError] = useState(null);
   const [summaries, setSummaries] = useState([]);
   const [showSummary, setShowSummary] = useState(false);
+  const [hasOlder, setHasOlder] = useState(false);
+  const [loadingOlder, setLoadingOlder] = useState(false);
   const chatRef = useRef(null);
+  // scrollHeight before older messages were prepended, to keep the viewport in place
+  const prependHeightRef = useRef(null);
 
-  // On mount, fetch all messages from backend (across all sessions)
+  // On mount, resolve the session and fetch its newest page of messages
   useEffect(() => {
     setLoading(true);
-    getMessages() // No session_id: fetches all messages
+    const sidPromise = getSessionIdFromStorage()
+      ? Promise.resolve(getSessionIdFromStorage())
+      : createSession().then(session => {
+          setSessionIdToStorage(session.session_id);
+          return session.session_id;
+        });
+    sidPromise
+      .then(sid => {
+        setSessionId(sid);
+        return getMessages(sid, { limit: PAGE_SIZE });
+      })
       .then(msgs => {
         setMessages(msgs);
         setChatHistoryToStorage(msgs);
+        setHasOlder(msgs.length >= PAGE_SIZE);
         setLoading(false);
       })
       .catch(e => {
         setError('Failed to load messages.');
         setLoading(false);
       });
-    let sid = getSessionIdFromStorage();
-    if (!sid) {
-      createSession().then(session => {
-        sid = session.session_id;
-        setSessionIdToStorage(sid);
-        setSessionId(sid);
-      });
-    } else {
-      setSessionId(sid);
-    }
   }, []);
 
-  // Auto-scroll to bottom on new message
+  // Auto-scroll to bottom on new message; keep the position when older messages are prepended
   useEffect(() => {
-    if (chatRef.current) {
+    if (!chatRef.current) return;
+    if (prependHeightRef.current !== null) {
+      chatRef.current.scrollTop += chatRef.current.scrollHeight - prependHeightRef.current;
+      prependHeightRef.current = null;
+    } else {
       chatRef.current.scrollTop = chatRef.current.scrollHeight;
     }
   }, [messages]);
 
+  // Scroll-back: fetch the page before the oldest loaded message and prepend it
+  const loadOlder = async () => {
+    const oldest = messages.find(m => m.message_id);
+    if (!sessionId || !oldest || loadingOlder || !hasOlder) return;
+    setLoadingOlder(true);
+    try {
+      const older = await getMessages(sessionId, { limit: PAGE_SIZE, before: oldest.timestamp });
+      const known = new Set(messages.map(m => m.message_id));
+      const merged = [...older.filter(m => !known.has(m.message_id)), ...messages];
+      prependHeightRef.current = chatRef.current ? chatRef.current.scrollHeight : null;
+      setMessages(merged);
+      setChatHistoryToStorage(merged);
+      setHasOlder(older.length >= PAGE_SIZE);
+    } catch (e) {
+      setError('Failed to load older messages.');
+    } finally {
+      setLoadingOlder(false);
+    }
+  };
+
+  const handleScroll = (e) => {
+    if (e.currentTarget.scrollTop <= LOAD_OLDER_THRESHOLD_PX) loadOlder();
+  };
+
   // Handler for sending a new message
   const handleSend = async (text) => {
     if (!text.trim()) return;
@@ -115,20 +150,27 @@ export default function Chat() {
       setMessages([...optimisticMsgs, novaMsg]);
       setChatHistoryToStorage([...optimisticMsgs, novaMsg]);
       let streamedText = '';
-      for await (const chunk of sendChatMessageStream({
+      for await (const event of sendChatMessageStream({
         user_message: text,
         local_history: optimisticMsgs,
         session_id: sid,
+        quoted_text: newMsg.quoted_text,
+        quoted_reply_to: newMsg.quoted_reply_to,
       })) {
-        streamedText += chunk;
-        novaMsg.text = streamedText;
-        setMessages([...optimisticMsgs, { ...novaMsg }]);
-        setChatHistoryToStorage([...optimisticMsgs, { ...novaMsg }]);
+        if (event.type === 'delta') {
+          streamedText += event.data.text;
+          novaMsg.text = streamedText;
+          setMessages([...optimisticMsgs, { ...novaMsg }]);
+          setChatHistoryToStorage([...optimisticMsgs, { ...novaMsg }]);
+        } else if (event.type === 'saved') {
+          // Swap the optimistic pair for the persisted messages (real ids and timestamps)
+          const saved = [...optimisticMsgs.slice(0, -1), ...event.data.messages];
+          setMessages(saved);
+          setChatHistoryToStorage(saved);
+        } else if (event.type === 'error') {
+          throw new Error(event.data.detail);
+        }
       }
-      // After sending, fetch all messages again to ensure full history is up to date
-      const allMsgs = await getMessages();
-      setMessages(allMsgs);
-      setChatHistoryToStorage(allMsgs);
       setIsTyping(false);
     } catch (e) {
       setError('Failed to send message.');
@@ -160,8 +202,9 @@ export default function Chat() {
         <div className="nova-header-title">NOVA</div>
         <div className="nova-header-status">Online</div>
       </div>
-      <div className="nova-chat-messages" ref={chatRef}>
+      <div className="nova-chat-messages" ref={chatRef} onScroll={handleScroll}>
         <button className="nova-summary-toggle" onClick={() => setShowSummary(s => !s)} aria-label="Show summaries">📝</button>
+        {loadingOlder && <div className="nova-loading">Loading older messages...</div>}
         {loading ? (
           <div className="nova-loading">Loading messages...</div>
         ) : error ? (
@@ -0,0 +1,7 @@
+import os
+import sys
+
+# Local, in-process backends so importing backend modules needs no credentials or network
+os.environ.setdefault("NOVA_STORAGE_BACKEND", "memory")
+os.environ.setdefault("NOVA_JOBS_DB", ":memory:")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,86 @@
+import os
+
+import pytest
+
+from backend import archive, search, storage
+
+
+def populated_store(path: str, messages: int = 30) -> storage.SQLiteStorage:
+    store = storage.SQLiteStorage(path)
+    store.create_session({"session_id": "s1", "created_at": "2026-01-01T00:00:00+00:00", "last_activity": "2026-01-02T00:00:00+00:00"})
+    store.import_documents("messages", [
+        {
+            "message_id": f"m{i}", "session_id": "s1", "text": f"message {i}", "quoted_reply_to": None,
+            "quoted_text": None, "timestamp": f"2026-01-01T{i // 60:02d}:{i % 60:02d}:00.000000+00:00", "tags": [], "mood": "user",
+        }
+        for i in range(messages)
+    ])
+    return store
+
+
+@pytest.fixture
+def snapshot(tmp_path, monkeypatch):
+    path = tmp_path / "search.npz"
+    path.write_bytes(b"stale")
+    monkeypatch.setattr(search, "snapshot_path", lambda: str(path))
+    return path
+
+
+@pytest.mark.parametrize("codec, name", [("zstd", "backup.jsonl.zst"), ("zlib", "backup.jsonl.zlib")])
+def test_round_trip_and_random_access(tmp_path, snapshot, codec, name):
+    if codec == "zstd" and archive.zstandard is None:
+        pytest.skip("zstandard is not installed")
+    source = populated_store(str(tmp_path / "a.sqlite3"))
+    path = str(tmp_path / name)
+    with archive.ArchiveWriter(path, codec=codec, chunk_documents=7) as writer:
+        for collection in storage.ARCHIVE_COLLECTIONS:
+            writer.write_many(collection, source.export_documents(collection))
+    with archive.ArchiveReader(path) as reader:
+        assert reader.codec == codec
+        assert reader.count("messages") == 30
+        assert reader.document("messages", 17)["message_id"] == "m17"
+        assert [m["message_id"] for m in reader.iter_range("messages", "2026-01-01T00:10", "2026-01-01T00:13")] == ["m10", "m11", "m12"]
+
+    target = storage.SQLiteStorage(str(tmp_path / "b.sqlite3"))
+    assert archive.import_archive(path, storage=target) == {"sessions": 1, "messages": 30}
+    for collection in storage.ARCHIVE_COLLECTIONS:
+        assert list(target.export_documents(collection)) == list(source.export_documents(collection))
+    assert len(list(target.query_time_buckets("hour", "2000", "3000"))) == 1
+    assert not snapshot.exists()
+
+
+def test_import_without_messages_keeps_search_snapshot(tmp_path, snapshot):
+    source = populated_store(str(tmp_path / "a.sqlite3"), messages=0)
+    path = str(tmp_path / "sessions.jsonl.zlib")
+    archive.export_archive(path, collections=["sessions", "messages"], storage=source, codec="zlib")
+    target = storage.SQLiteStorage(str(tmp_path / "b.sqlite3"))
+    assert archive.import_archive(path, storage=target) == {"sessions": 1}
+    assert snapshot.exists()
+
+
+def test_zst_archive_requires_zstandard(tmp_path, monkeypatch):
+    monkeypatch.setattr(archive, "zstandard", None)
+    with pytest.raises(RuntimeError, match="zstandard"):
+        archive.ArchiveWriter(str(tmp_path / "backup.jsonl.zst"))
+    assert not os.listdir(tmp_path)
+    with archive.ArchiveWriter(str(tmp_path / "backup.jsonl.zlib")) as writer:
+        writer.write("sessions", {"session_id": "s1", "created_at": "a", "last_activity": "b"})
+    assert writer.index["codec"] == "zlib"
+
+
+def test_rejects_files_that_are_not_archives(tmp_path):
+    path = tmp_path / "bad"
+    path.write_bytes(b"definitely not an archive")
+    with pytest.raises(ValueError):
+        archive.ArchiveReader(str(path))
+
+
+def test_imports_sessions_without_created_at(tmp_path):
+    path = str(tmp_path / "sessions.jsonl.zlib")
+    with archive.ArchiveWriter(path, codec="zlib") as writer:
+        writer.write("sessions", {"session_id": "merged", "last_activity": "2026-01-02T00:00:00+00:00"})
+    target = storage.SQLiteStorage(str(tmp_path / "b.sqlite3"))
+    assert archive.import_archive(path, storage=target) == {"sessions": 1}
+    assert target.latest_session() == {
+        "session_id": "merged", "created_at": "2026-01-02T00:00:00+00:00", "last_activity": "2026-01-02T00:00:00+00:00",
+    }
@@ -0,0 +1,133 @@
+"""
+/chat/stream's SSE generator against a fake OpenAI-compatible server (httpx.MockTransport):
+frame coalescing, the `saved` event and what is persisted when the client disconnects.
+"""
+import asyncio
+import json
+
+import httpx
+import pytest
+
+from backend import llm, main
+from backend.models import Message
+
+URL = "http://fake-openai.local/v1/chat/completions"
+FRAME = 0.05
+
+
+def sse_line(delta: str) -> bytes:
+    return f"data: {json.dumps({'choices': [{'delta': {'content': delta}}]})}\n\n".encode()
+
+
+def server(*steps):
+    """
+    A handler streaming `steps`: strings are deltas, numbers are pauses in seconds.
+    """
+    async def body():
+        for step in steps:
+            if isinstance(step, str):
+                yield sse_line(step)
+            else:
+                await asyncio.sleep(step)
+        yield b"data: [DONE]\n\n"
+
+    def handler(request):
+        return httpx.Response(200, headers={"content-type": "text/event-stream"}, content=body())
+
+    return handler
+
+
+class FakeRequest:
+    def __init__(self):
+        self.disconnected = False
+
+    async def is_disconnected(self) -> bool:
+        return self.disconnected
+
+
+def message(mood: str, text: str = "") -> Message:
+    return Message(message_id=f"{mood}-1", session_id="s1", text=text, timestamp="2026-10-14T15:30:00+00:00", mood=mood)
+
+
+def parse(frame: str):
+    event, data = frame.strip().split("\n")
+    return event[len("event: "):], json.loads(data[len("data: "):])
+
+
+@pytest.fixture
+def stream(monkeypatch):
+    """
+    Routes dialog calls to a fake server and records saves and post-processing instead of
+    writing them.
+    """
+    saved, queued = [], []
+    monkeypatch.setattr(main, "SSE_FRAME_SECONDS", FRAME)
+    monkeypatch.setattr(llm, "RESPONSE_CACHE_ENABLED", False)
+    monkeypatch.setattr(main.firebase, "save_messages_batch", lambda messages: saved.append(messages))
+    monkeypatch.setattr(main, "enqueue_postprocess", lambda user, nova: queued.append((user, nova)))
+
+    def start(handler, request=None):
+        client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        provider = llm.GroqProvider("test-key", url=URL, model="fake-model", client=client)
+        monkeypatch.setattr(llm, "get_router", lambda: llm.LLMRouter([provider], hedge_delay=10.0))
+        return main.sse_reply_stream(request or FakeRequest(), "prompt", message("user", "hi"), message("nova"))
+
+    start.saved, start.queued = saved, queued
+    return start
+
+
+async def collect(events) -> list:
+    return [parse(frame) async for frame in events]
+
+
+def test_deltas_are_coalesced_into_frames(stream):
+    events = asyncio.run(collect(stream(server("a", "b", "c", FRAME * 4, "d"))))
+    assert [e for e, _ in events] == ["start", "first_token", "delta", "delta", "saved", "done"]
+    assert [data["text"] for e, data in events if e == "delta"] == ["abc", "d"]
+    assert events[-1][1]["chars"] == 4
+
+
+def test_saved_event_carries_both_persisted_messages(stream):
+    events = dict(asyncio.run(collect(stream(server("hello", " there")))))
+    user, nova = events["saved"]["messages"]
+    assert (user["mood"], user["text"]) == ("user", "hi")
+    assert (nova["mood"], nova["text"]) == ("nova", "hello there")
+    assert events["start"] == {"user_message_id": "user-1", "nova_message_id": "nova-1"}
+    assert [[m.text for m in batch] for batch in stream.saved] == [["hi", "hello there"]]
+    assert stream.queued == []
+
+
+def test_disconnect_after_first_frame_queues_the_partial_reply(stream):
+    request = FakeRequest()
+
+    async def run():
+        events = []
+        async for frame in stream(server("partial", FRAME * 4, "never sent"), request):
+            events.append(parse(frame))
+            if events[-1][0] == "delta":
+                request.disconnected = True
+        return events
+
+    events = asyncio.run(run())
+    assert [e for e, _ in events] == ["start", "first_token", "delta", "done"]
+    assert stream.saved == []
+    assert [(user.text, nova.text) for user, nova in stream.queued] == [("hi", "partial")]
+
+
+def test_disconnect_before_first_token_saves_nothing(stream):
+    async def run():
+        task = asyncio.ensure_future(collect(stream(server(1.0, "late"))))
+        await asyncio.sleep(FRAME)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(run())
+    assert stream.saved == []
+    assert stream.queued == []
+
+
+def test_unavailable_backend_sends_error_and_saves_nothing(stream):
+    events = asyncio.run(collect(stream(lambda request: httpx.Response(400))))
+    assert [e for e, _ in events] == ["start", "error", "done"]
+    assert stream.saved == [] and stream.queued == []
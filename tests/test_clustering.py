@@ -0,0 +1,74 @@
+import threading
+import time
+
+import pytest
+
+from backend import clustering, firebase, llm, models
+
+
+@pytest.fixture
+def labels(monkeypatch):
+    """
+    Gemini labeling stub that blocks until released, recording the calls.
+    """
+    calls = []
+    release = threading.Event()
+
+    def label(messages):
+        calls.append(len(messages))
+        release.wait(5)
+        return "hiking"
+
+    monkeypatch.setattr(llm, "gemini_label_topic", label)
+    yield calls, release
+    release.set()
+
+
+def save(session_id: str, texts) -> list:
+    messages = [firebase.new_message(models.MessageCreate(session_id=session_id, text=t)) for t in texts]
+    firebase.save_messages_batch(messages)
+    return messages
+
+
+def test_labeling_does_not_block_other_sessions(labels):
+    calls, release = labels
+    busy = firebase.get_active_session().session_id
+    save(busy, ["hiking trip in the alps"] * clustering.RELABEL_MIN_MESSAGES)
+    engine = clustering.ClusteringEngine()
+    worker = threading.Thread(target=lambda: engine.assign(busy, firebase.get_messages(busy)))
+    worker.start()
+    while not calls:
+        time.sleep(0.01)
+
+    other = "other-session"
+    started = time.monotonic()
+    changed = engine.assign(other, [models.Message(message_id="o1", session_id=other, text="baking bread", timestamp="2026-01-01T00:00:00+00:00")])
+    assert time.monotonic() - started < 1
+    assert [t.topic for t in changed] == ["baking"]
+    # The labeling session's own state is still usable for reads
+    assert engine.threads(busy)
+    release.set()
+    worker.join(5)
+    assert [t.topic for t in engine.threads(busy)] == ["hiking"]
+
+
+def test_session_states_are_bounded():
+    engine = clustering.ClusteringEngine(max_sessions=3)
+    for i in range(10):
+        engine.assign(f"s{i}", [models.Message(message_id=f"m{i}", session_id=f"s{i}", text="hello world", timestamp="2026-01-01T00:00:00+00:00")])
+    assert list(engine._sessions) == ["s7", "s8", "s9"]
+
+
+def test_cluster_session_reads_only_new_messages(monkeypatch):
+    session_id = "watermark-session"
+    save(session_id, ["first message about chess", "second message about chess"])
+    first = clustering.cluster_session(session_id)
+    assert sum(len(t.messages) for t in first) == 2
+
+    def full_read(*args, **kwargs):
+        raise AssertionError("cluster_session re-read the whole session")
+
+    monkeypatch.setattr(firebase, "get_messages", full_read)
+    save(session_id, ["third message about chess"])
+    threads = clustering.cluster_session(session_id)
+    assert sum(len(t.messages) for t in threads) == 3
@@ -0,0 +1,100 @@
+"""
+assemble_prompt: token budget packing, priority between recall and history, oldest-first
+truncation and de-duplication of the message being sent.
+"""
+import pytest
+
+from backend import context
+from backend.models import Message
+
+
+def turn(i: int, mood: str = None) -> dict:
+    return {"message_id": f"m{i}", "text": f"turn number {i} about the garden", "mood": mood or ("user" if i % 2 == 0 else "nova")}
+
+
+def lines(prompt: str) -> list:
+    return prompt.split("\n")
+
+
+def test_small_history_is_kept_whole_in_reading_order():
+    history = [turn(i) for i in range(6)]
+    prompt = context.assemble_prompt("hello", history=history, quoted_text="the garden", budget=1000)
+    assert lines(prompt) == [
+        "User: turn number 0 about the garden",
+        "Nova: turn number 1 about the garden",
+        "User: turn number 2 about the garden",
+        "Nova: turn number 3 about the garden",
+        "User: turn number 4 about the garden",
+        "Nova: turn number 5 about the garden",
+        'Replying to: "the garden"',
+        "User: hello",
+    ]
+
+
+@pytest.mark.parametrize("budget", [6, 11, 20, 40, 50, 100, 120, 400])
+@pytest.mark.parametrize("quoted_text", [None, "the seeds we bought " * 20], ids=["no_quote", "long_quote"])
+def test_prompt_fits_the_budget(budget, quoted_text):
+    history = [turn(i) for i in range(200)]
+    retrieved = [turn(i) for i in range(1000, 1020)] + [{"text": "x y z", "mood": "user"}]
+    summaries = ["a b"] * 5 + [f"point {i} about seeds and soil" for i in range(20)]
+    prompt = context.assemble_prompt("what should I plant?", history, retrieved, summaries, quoted_text, budget=budget)
+    assert context.count_tokens(prompt) <= budget
+    assert lines(prompt)[-1].startswith("User: what")
+
+
+def test_oversized_user_message_is_truncated():
+    prompt = context.assemble_prompt("word " * 500, history=[turn(0)], budget=50)
+    assert prompt.startswith("User: word") and prompt.endswith(" …")
+    assert "turn number" not in prompt
+    assert context.count_tokens(prompt) <= 50
+
+
+def test_history_is_dropped_oldest_first():
+    history = [turn(i) for i in range(40)]
+    prompt = context.assemble_prompt("hello", history=history, budget=100)
+    kept = [line for line in lines(prompt) if "turn number" in line]
+    assert 0 < len(kept) < 40
+    # A contiguous run of the newest turns survives
+    assert kept == [context._turn(item)[1] for item in history[-len(kept):]]
+
+
+def test_recall_outranks_older_history_but_not_recent_turns():
+    history = [turn(i) for i in range(30)]
+    retrieved = [{"message_id": "r1", "text": "we planted tomatoes in may", "mood": "user"}]
+    summaries = ["talked about tomatoes"]
+    recent_cost = sum(context.count_tokens(context._turn(t)[1]) + 1 for t in history[-context.MIN_RECENT_TURNS:])
+    budget = context.count_tokens("User: hello") + recent_cost + 40
+    prompt = context.assemble_prompt("hello", history, retrieved, summaries, budget=budget)
+    assert lines(prompt)[:4] == [
+        "Summary of earlier conversation:",
+        "- talked about tomatoes",
+        "Relevant earlier messages:",
+        "User: we planted tomatoes in may",
+    ]
+    kept = [line for line in lines(prompt) if "turn number" in line]
+    assert kept == [context._turn(item)[1] for item in history[-context.MIN_RECENT_TURNS:]]
+
+
+def test_retrieved_messages_already_in_history_are_not_repeated():
+    history = [turn(i) for i in range(3)]
+    retrieved = [history[0], {"message_id": "r1", "text": "older note", "mood": "nova"}]
+    prompt = context.assemble_prompt("hello", history=history, retrieved=retrieved, budget=1000)
+    assert prompt.count("turn number 0") == 1
+    assert "Relevant earlier messages:\nNova: older note" in prompt
+
+
+def test_default_budget_reserves_system_prompt_and_reply():
+    full = context.default_budget()
+    assert full == context.MODEL_CONTEXT_TOKENS - context.REPLY_TOKENS - context.SAFETY_MARGIN_TOKENS
+    assert context.default_budget("You are Nova. " * 50) == full - context.count_tokens("You are Nova. " * 50)
+
+
+def test_trailing_copy_of_the_user_message_is_dropped():
+    history = [turn(0), turn(1), {"text": "hello", "mood": "user"}]
+    assert context.without_pending_message(history, "hello") == history[:2]
+    # Only a trailing user turn with the same text counts
+    assert context.without_pending_message(history[:2], "hello") == history[:2]
+    nova_echo = [turn(0), {"text": "hello", "mood": "nova"}]
+    assert context.without_pending_message(nova_echo, "hello") == nova_echo
+    message = Message(message_id="m9", session_id="s1", text="hello", timestamp="2026-10-14T15:30:00+00:00", mood="user")
+    assert context.without_pending_message([turn(0), message], "hello") == [turn(0)]
@@ -0,0 +1,167 @@
+"""
+The session and message caches, batched message saves and activity coalescing in
+backend/firebase.py, on an in-memory SQLite store that counts every storage call.
+"""
+import time
+import types
+
+import pytest
+
+from backend import firebase, storage, timeindex
+from backend.models import Message
+
+HOUR = "2026-10-14T15"
+
+
+class CountingStorage:
+    """
+    Forwards to a real store and records the name of every method called.
+    """
+    def __init__(self, inner: storage.Storage):
+        self.inner = inner
+        self.calls = []
+
+    def __getattr__(self, name):
+        method = getattr(self.inner, name)
+
+        def call(*args, **kwargs):
+            self.calls.append(name)
+            return method(*args, **kwargs)
+
+        return call
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+    def advance(self, seconds: float):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(firebase, "time", types.SimpleNamespace(monotonic=clock.monotonic))
+    return clock
+
+
+@pytest.fixture
+def store(monkeypatch, clock):
+    store = CountingStorage(storage.SQLiteStorage(":memory:"))
+    monkeypatch.setattr(firebase, "_storage", store)
+    monkeypatch.setattr(firebase, "activity_coalescer", None)
+    firebase.session_cache.clear()
+    firebase.message_cache.clear()
+    yield store
+    firebase.session_cache.clear()
+    firebase.message_cache.clear()
+
+
+@pytest.fixture
+def coalescer(monkeypatch):
+    coalescers = []
+
+    def start(interval: float) -> firebase.ActivityCoalescer:
+        coalescer = firebase.ActivityCoalescer(interval)
+        coalescers.append(coalescer)
+        monkeypatch.setattr(firebase, "activity_coalescer", coalescer)
+        return coalescer
+
+    yield start
+    for coalescer in coalescers:
+        coalescer._wake.set()
+
+
+def message(session_id: str, minute: int, text: str = None) -> Message:
+    return Message(
+        message_id=f"{session_id}-{minute}",
+        session_id=session_id,
+        text=text or f"message at minute {minute}",
+        timestamp=f"{HOUR}:{minute:02d}:00+00:00",
+        mood="user",
+    )
+
+
+def sessions(store: CountingStorage) -> dict:
+    return {s["session_id"]: s["last_activity"] for s in store.inner.export_documents("sessions")}
+
+
+def test_active_session_is_served_from_cache_within_ttl(store, clock):
+    session = firebase.get_active_session()
+    assert store.calls == ["latest_session", "create_session"]
+    store.calls.clear()
+    clock.advance(firebase.SESSION_CACHE_TTL_SECONDS - 1)
+    assert firebase.get_active_session() == session
+    assert store.calls == []
+    assert firebase.get_cache_stats()["session_hits"] >= 1
+
+
+def test_active_session_is_reread_after_ttl(store, clock):
+    session = firebase.get_active_session()
+    store.calls.clear()
+    clock.advance(firebase.SESSION_CACHE_TTL_SECONDS + 1)
+    assert firebase.get_active_session().session_id == session.session_id
+    assert store.calls == ["latest_session"]
+    store.calls.clear()
+    assert firebase.get_active_session().session_id == session.session_id
+    assert store.calls == []
+
+
+def test_recent_messages_come_from_the_ring_until_it_expires(store, clock):
+    session_id = firebase.get_active_session().session_id
+    firebase.save_messages_batch([message(session_id, 1, "hi"), message(session_id, 2, "hello")])
+    store.calls.clear()
+    assert [m.text for m in firebase.get_recent_messages(session_id, limit=10)] == ["hi", "hello"]
+    assert store.calls == []
+    clock.advance(firebase.MESSAGE_CACHE_TTL_SECONDS + 1)
+    assert [m.text for m in firebase.get_recent_messages(session_id, limit=10)] == ["hi", "hello"]
+    assert store.calls == ["query_messages"]
+
+
+def test_batch_commits_messages_activity_and_buckets_together(store):
+    firebase.save_messages_batch([message("s1", 5), message("s1", 7), message("s2", 6)])
+    assert store.calls == ["save_messages"]
+    assert [m["message_id"] for m in store.inner.query_messages()] == ["s1-5", "s2-6", "s1-7"]
+    assert sessions(store) == {"s1": f"{HOUR}:07:00+00:00", "s2": f"{HOUR}:06:00+00:00"}
+    for granularity in ("hour", "day"):
+        (bucket,) = store.inner.query_time_buckets(granularity, "2026-10-14T00:00:00+00:00", "2026-10-15T00:00:00+00:00")
+        assert bucket["message_ids"] == ["s1-5", "s2-6", "s1-7"]
+
+
+def test_failed_batch_writes_nothing(store, monkeypatch):
+    def broken_buckets(messages):
+        buckets = timeindex.buckets_for(messages)
+        buckets["hour:broken"] = {"granularity": "hour", "start": None, "end": None, "message_ids": [], "timestamps": []}
+        return buckets
+
+    monkeypatch.setattr(firebase.timeindex, "buckets_for", broken_buckets)
+    with pytest.raises(Exception):
+        firebase.save_messages_batch([message("s1", 5)])
+    assert list(store.inner.query_messages()) == []
+    assert sessions(store) == {}
+
+
+def test_coalesced_activity_flushes_newest_timestamp_once(store, coalescer):
+    activity = coalescer(3600)
+    firebase.save_messages_batch([message("s1", 5), message("s1", 9), message("s2", 6)])
+    firebase.save_messages_batch([message("s1", 7)])
+    # Messages are written at once, the activity bumps wait for the flush
+    assert store.calls == ["save_messages", "save_messages"]
+    assert sessions(store) == {}
+    activity.flush()
+    assert store.calls[2:] == ["update_session_activity"]
+    assert sessions(store) == {"s1": f"{HOUR}:09:00+00:00", "s2": f"{HOUR}:06:00+00:00"}
+    activity.flush()
+    assert store.calls[3:] == []
+
+
+def test_coalescer_flushes_in_the_background(store, coalescer):
+    coalescer(0.01).bump("s1", f"{HOUR}:05:00+00:00")
+    deadline = time.monotonic() + 2
+    while not sessions(store) and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert sessions(store) == {"s1": f"{HOUR}:05:00+00:00"}
@@ -0,0 +1,48 @@
+"""
+JobQueue on an in-memory database: idempotency keys, pruning of done jobs and the depth
+counts reported to /metrics.
+"""
+from backend import jobs
+
+
+def run_one(queue: jobs.JobQueue):
+    job_id, kind, payload, attempts, enqueued_at = queue.claim()
+    queue.complete(job_id, enqueued_at)
+
+
+def test_done_jobs_are_pruned_after_retention():
+    queue = jobs.JobQueue(":memory:")
+    assert queue.enqueue("analyze_session", {"session_id": "s1"}, key="analyze_session:s1")
+    assert not queue.enqueue("analyze_session", {"session_id": "s1"}, key="analyze_session:s1")
+    run_one(queue)
+    assert queue.prune() == 0
+    assert queue.prune(max_age=0) == 1
+    # Once pruned, the key can be used again
+    assert queue.enqueue("analyze_session", {"session_id": "s1"}, key="analyze_session:s1")
+
+
+def test_pending_and_failed_jobs_are_never_pruned(monkeypatch):
+    monkeypatch.setattr(jobs, "JOB_MAX_ATTEMPTS", 1)
+    queue = jobs.JobQueue(":memory:")
+    queue.enqueue("a", {}, key="a")
+    queue.enqueue("b", {}, key="b")
+    job_id, *_ = queue.claim()
+    queue.fail(job_id, 1, "boom")
+    assert queue.prune(max_age=0) == 0
+    assert queue.stats()["depth"] == {"pending": 1, "running": 0, "failed": 1}
+
+
+def test_stats_count_only_unfinished_jobs_through_an_index():
+    queue = jobs.JobQueue(":memory:")
+    for i in range(5):
+        queue.enqueue("a", {}, key=f"a{i}")
+    for _ in range(3):
+        run_one(queue)
+    queue.claim()
+    stats = queue.stats()
+    assert stats["depth"] == {"pending": 1, "running": 1, "failed": 0}
+    assert stats["completed_recent"] == 3
+    (plan,) = queue._conn.execute(
+        "EXPLAIN QUERY PLAN SELECT status, COUNT(*) FROM jobs WHERE status IN ('pending', 'running', 'failed') GROUP BY status"
+    )
+    assert plan[-1].startswith("SEARCH jobs USING COVERING INDEX")
@@ -0,0 +1,165 @@
+"""
+GroqProvider against a fake OpenAI-compatible server (httpx.MockTransport): pooling,
+retries on 429/5xx and server-sent event parsing.
+"""
+import asyncio
+import json
+
+import httpx
+import pytest
+
+from backend import llm
+
+URL = "http://fake-openai.local/v1/chat/completions"
+
+
+def completion(text: str) -> dict:
+    return {"choices": [{"message": {"role": "assistant", "content": text}}]}
+
+
+def sse(*deltas: str, done: bool = True) -> bytes:
+    lines = [f"data: {json.dumps({'choices': [{'delta': {'content': d}}]})}\n\n" for d in deltas]
+    if done:
+        lines.append("data: [DONE]\n\n")
+    return "".join(lines).encode()
+
+
+def provider(handler, model: str = "fake-model") -> llm.GroqProvider:
+    client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    return llm.GroqProvider("test-key", url=URL, model=model, client=client)
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(llm, "GROQ_RETRY_BACKOFF", 0.0)
+
+
+def test_complete_sends_openai_payload():
+    seen = []
+
+    def handler(request):
+        seen.append(json.loads(request.content))
+        return httpx.Response(200, json=completion("  hi there  "))
+
+    assert asyncio.run(provider(handler).complete("hello")) == "hi there"
+    assert seen[0]["model"] == "fake-model"
+    assert seen[0]["messages"][-1] == {"role": "user", "content": "hello"}
+    assert "stream" not in seen[0]
+
+
+@pytest.mark.parametrize("status", [429, 500, 502, 503])
+def test_complete_retries_rate_limits_and_server_errors(status):
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        if len(calls) < 3:
+            return httpx.Response(status, headers={"Retry-After": "0"})
+        return httpx.Response(200, json=completion("ok"))
+
+    assert asyncio.run(provider(handler).complete("hello")) == "ok"
+    assert len(calls) == 3
+
+
+def test_complete_gives_up_after_max_retries():
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        return httpx.Response(503)
+
+    with pytest.raises(httpx.HTTPStatusError):
+        asyncio.run(provider(handler).complete("hello"))
+    assert len(calls) == llm.GROQ_MAX_RETRIES + 1
+
+
+def test_complete_does_not_retry_client_errors():
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        return httpx.Response(400, json={"error": "bad request"})
+
+    with pytest.raises(httpx.HTTPStatusError):
+        asyncio.run(provider(handler).complete("hello"))
+    assert len(calls) == 1
+
+
+def test_retry_after_is_capped():
+    resp = httpx.Response(429, headers={"Retry-After": "120"})
+    assert llm.GroqProvider._retry_delay(resp, 0) == llm.GROQ_RETRY_AFTER_MAX
+    assert llm.GroqProvider._retry_delay(httpx.Response(503), 2) == llm.GROQ_RETRY_BACKOFF * 4
+
+
+async def collect(stream) -> list:
+    return [chunk async for chunk in stream]
+
+
+def test_stream_parses_deltas_and_stops_at_done():
+    def handler(request):
+        assert json.loads(request.content)["stream"] is True
+        body = sse("Hel", "", "lo", "!") + b"data: {\"choices\": [{\"delta\": {\"content\": \"after\"}}]}\n\n"
+        return httpx.Response(200, content=body, headers={"Content-Type": "text/event-stream"})
+
+    assert asyncio.run(collect(provider(handler).stream("hello"))) == ["Hel", "lo", "!"]
+
+
+def test_stream_skips_malformed_lines():
+    def handler(request):
+        body = b": keep-alive\n\ndata: not json\n\n" + sse("a", "b")
+        return httpx.Response(200, content=body)
+
+    assert asyncio.run(collect(provider(handler).stream("hello"))) == ["a", "b"]
+
+
+def test_stream_retries_before_first_byte():
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        if len(calls) == 1:
+            return httpx.Response(429, headers={"Retry-After": "0"})
+        return httpx.Response(200, content=sse("ok"))
+
+    assert asyncio.run(collect(provider(handler).stream("hello"))) == ["ok"]
+    assert len(calls) == 2
+
+
+def test_stream_raises_on_client_error():
+    def handler(request):
+        return httpx.Response(401)
+
+    with pytest.raises(httpx.HTTPStatusError):
+        asyncio.run(collect(provider(handler).stream("hello")))
+
+
+def test_concurrent_requests_share_one_pool():
+    in_flight = {"now": 0, "max": 0}
+
+    async def handler(request):
+        in_flight["now"] += 1
+        in_flight["max"] = max(in_flight["max"], in_flight["now"])
+        await asyncio.sleep(0.01)
+        in_flight["now"] -= 1
+        return httpx.Response(200, json=completion(json.loads(request.content)["messages"][-1]["content"]))
+
+    async def run():
+        primary = provider(handler)
+        fallback = llm.GroqProvider("test-key", url=URL, model="other", client=primary.client)
+        replies = await asyncio.gather(*(p.complete(str(i)) for i, p in enumerate([primary, fallback] * 25)))
+        # Providers that borrow a pool leave it open for its owner
+        await fallback.aclose()
+        assert not primary.client.is_closed
+        await primary.client.aclose()
+        return replies
+
+    assert asyncio.run(run()) == [str(i) for i in range(50)]
+    assert in_flight["max"] > 1
+
+
+def test_default_provider_owns_pooled_client():
+    groq = llm.GroqProvider("test-key", url=URL)
+    assert groq._owns_client
+    assert groq.client.headers["authorization"] == "Bearer test-key"
+    asyncio.run(groq.aclose())
+    assert groq.client.is_closed
@@ -0,0 +1,195 @@
+"""
+LLMRouter and BackendStats against local fake backends with injected latency and failures:
+preference order, hedging, failover, SLO demotion and the circuit breaker lifecycle.
+"""
+import asyncio
+import time
+
+import pytest
+
+from backend import llm
+
+COOLDOWN = 0.05
+
+
+class FakeBackend:
+    def __init__(self, name: str, delay: float = 0.0, fail: bool = False, chunks=("hello", " world")):
+        self.name = name
+        self.delay = delay
+        self.fail = fail
+        self.chunks = list(chunks)
+        self.calls = 0
+        self.cancelled = 0
+
+    async def _wait(self):
+        self.calls += 1
+        try:
+            await asyncio.sleep(self.delay)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        if self.fail:
+            raise RuntimeError(f"{self.name} is down")
+
+    async def complete(self, prompt: str) -> str:
+        await self._wait()
+        return f"{self.name}: {prompt}"
+
+    async def stream(self, prompt: str):
+        await self._wait()
+        for chunk in self.chunks:
+            yield chunk
+
+
+@pytest.fixture(autouse=True)
+def fast_breaker(monkeypatch):
+    monkeypatch.setattr(llm, "BREAKER_COOLDOWN", COOLDOWN)
+
+
+def names(backends) -> list:
+    return [b.name for b in backends]
+
+
+def trip(router: llm.LLMRouter):
+    """
+    Fails every call until all breakers are open.
+    """
+    for _ in range(llm.BREAKER_CONSECUTIVE_FAILURES):
+        with pytest.raises(llm.LLMUnavailable):
+            asyncio.run(router.complete("hi"))
+
+
+def test_healthy_primary_keeps_traffic_over_faster_fallbacks():
+    primary = FakeBackend("primary", delay=0.004)
+    fallbacks = [FakeBackend("fallback", delay=0.0), FakeBackend("gemini", delay=0.001)]
+    router = llm.LLMRouter([primary] + fallbacks, hedge_delay=1.0)
+    for _ in range(40):
+        assert asyncio.run(router.complete("hi")) == "primary: hi"
+    assert primary.calls == 40
+    assert [b.calls for b in fallbacks] == [0, 0]
+    assert names(router.ranked()) == ["primary", "fallback", "gemini"]
+
+
+def test_primary_over_slo_is_demoted_until_its_window_is_stale(monkeypatch):
+    monkeypatch.setattr(llm, "SLO_P95", 0.01)
+    primary = FakeBackend("primary", delay=0.02)
+    fallback = FakeBackend("fallback")
+    router = llm.LLMRouter([primary, fallback], hedge_delay=1.0)
+    for _ in range(llm.MIN_SAMPLES):
+        asyncio.run(router.complete("hi"))
+    assert router.snapshot()["primary"]["over_slo"]
+    assert names(router.ranked()) == ["fallback", "primary"]
+    assert asyncio.run(router.complete("hi")) == "fallback: hi"
+    time.sleep(COOLDOWN)
+    assert names(router.ranked()) == ["primary", "fallback"]
+
+
+def test_error_fails_over_to_next_backend():
+    primary = FakeBackend("primary", fail=True)
+    fallback = FakeBackend("fallback")
+    router = llm.LLMRouter([primary, fallback], hedge_delay=1.0)
+    assert asyncio.run(router.complete("hi")) == "fallback: hi"
+    assert router.snapshot()["primary"]["error_rate"] == 1.0
+
+
+def test_all_backends_failing_raises_instead_of_returning_error_text():
+    router = llm.LLMRouter([FakeBackend("a", fail=True), FakeBackend("b", fail=True)], hedge_delay=1.0)
+    with pytest.raises(llm.LLMUnavailable, match="a is down.*b is down"):
+        asyncio.run(router.complete("hi"))
+
+
+def test_slow_backend_is_hedged_and_loser_cancelled():
+    slow = FakeBackend("slow", delay=1.0)
+    fast = FakeBackend("fast", delay=0.0)
+    router = llm.LLMRouter([slow, fast], hedge_delay=0.01)
+    assert asyncio.run(router.complete("hi")) == "fast: hi"
+    assert slow.cancelled == 1
+    # The cancelled loser recorded no outcome
+    assert router.snapshot()["slow"]["error_rate"] == 0.0
+
+
+def test_stream_hedges_on_first_token():
+    slow = FakeBackend("slow", delay=1.0, chunks=["late"])
+    fast = FakeBackend("fast", chunks=["a", "b", "c"])
+    router = llm.LLMRouter([slow, fast], hedge_delay=0.01)
+
+    async def collect():
+        return [chunk async for chunk in router.stream("hi")]
+
+    assert asyncio.run(collect()) == ["a", "b", "c"]
+    assert slow.cancelled == 1
+
+
+def test_ranked_has_no_side_effects_on_half_open_breakers():
+    backends = [FakeBackend("a", fail=True), FakeBackend("b", fail=True), FakeBackend("c", fail=True)]
+    router = llm.LLMRouter(backends, hedge_delay=1.0)
+    trip(router)
+    assert router.ranked() == []
+    time.sleep(COOLDOWN)
+    for _ in range(3):
+        assert names(router.ranked()) == ["a", "b", "c"]
+    assert not any(stats.trial_in_flight for stats in router.stats.values())
+
+
+def test_trip_cooldown_recover():
+    backends = [FakeBackend("a", fail=True), FakeBackend("b", fail=True), FakeBackend("c", fail=True)]
+    router = llm.LLMRouter(backends, hedge_delay=1.0)
+    trip(router)
+    assert all(s["circuit_open"] for s in router.snapshot().values())
+    with pytest.raises(llm.LLMUnavailable, match="no dialog backend available"):
+        asyncio.run(router.complete("hi"))
+
+    time.sleep(COOLDOWN)
+    for backend in backends:
+        backend.fail = False
+    assert asyncio.run(router.complete("hi")) == "a: hi"
+    assert not router.snapshot()["a"]["circuit_open"]
+    # b and c were never launched, so they stay half-open and routable
+    for _ in range(3):
+        assert names(router.ranked()) == ["a", "b", "c"]
+
+    backends[0].fail = True
+    assert asyncio.run(router.complete("hi")) == "b: hi"
+    assert not router.snapshot()["b"]["circuit_open"]
+    assert names(router.ranked()) == ["a", "b", "c"]
+
+
+def test_failed_trial_reopens_breaker_for_another_cooldown():
+    backend = FakeBackend("a", fail=True)
+    router = llm.LLMRouter([backend, FakeBackend("b")], hedge_delay=1.0)
+    for _ in range(llm.BREAKER_CONSECUTIVE_FAILURES):
+        asyncio.run(router.complete("hi"))
+    assert names(router.ranked()) == ["b"]
+    time.sleep(COOLDOWN)
+    calls = backend.calls
+    assert asyncio.run(router.complete("hi")) == "b: hi"
+    assert backend.calls == calls + 1
+    assert names(router.ranked()) == ["b"]
+
+
+def test_cancelled_trial_releases_its_slot():
+    half_open = FakeBackend("a", fail=True)
+    router = llm.LLMRouter([half_open, FakeBackend("b")], hedge_delay=0.01)
+    for _ in range(llm.BREAKER_CONSECUTIVE_FAILURES):
+        asyncio.run(router.complete("hi"))
+    time.sleep(COOLDOWN)
+    half_open.fail, half_open.delay = False, 1.0
+    assert asyncio.run(router.complete("hi")) == "b: hi"
+    assert half_open.cancelled == 1
+    assert not router.stats["a"].trial_in_flight
+    assert names(router.ranked()) == ["a", "b"]
+
+
+def test_half_open_backend_admits_a_single_trial():
+    stats = llm.BackendStats()
+    for _ in range(llm.BREAKER_CONSECUTIVE_FAILURES):
+        stats.record(False)
+    assert not stats.available()
+    time.sleep(COOLDOWN)
+    assert stats.available() and stats.available()
+    assert stats.acquire()
+    assert not stats.available() and not stats.acquire()
+    stats.release_trial()
+    assert stats.acquire()
+    stats.record(True, 0.1)
+    assert stats.opened_at is None and stats.acquire() and stats.acquire()
@@ -0,0 +1,13 @@
+import pytest
+
+from backend import search
+
+
+def test_to_micros_treats_naive_timestamps_as_utc():
+    assert search.to_micros("2024-01-01") == search.to_micros("2024-01-01T00:00:00+00:00")
+    assert search.to_micros("2024-01-01T02:00:00+02:00") == search.to_micros("2024-01-01T00:00:00")
+
+
+def test_to_micros_rejects_garbage_with_value_error():
+    with pytest.raises(ValueError):
+        search.to_micros("garbage")
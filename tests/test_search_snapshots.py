@@ -0,0 +1,55 @@
+from datetime import datetime, timedelta, timezone
+
+from backend import jobs, models, search
+
+START = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+
+def messages(start: int, count: int):
+    return [
+        models.Message(
+            message_id=f"m{i}", session_id="s", text=f"hello number {i}", mood="user",
+            timestamp=(START + timedelta(seconds=i)).isoformat(timespec="microseconds"),
+        )
+        for i in range(start, start + count)
+    ]
+
+
+def test_only_one_snapshot_job_at_a_time(tmp_path, monkeypatch):
+    enqueued = []
+    monkeypatch.setattr(search, "index", search.SearchIndex())
+    monkeypatch.setattr(search, "SEARCH_SNAPSHOT_EVERY", 5)
+    monkeypatch.setattr(search, "_last_snapshot_size", 0)
+    monkeypatch.setattr(search, "_snapshot_queued", False)
+    monkeypatch.setattr(search, "snapshot_path", lambda: str(tmp_path / "search.npz"))
+    monkeypatch.setattr(jobs, "enqueue", lambda kind, payload, key: enqueued.append(key) or True)
+
+    for i in range(40):
+        search.index_messages(messages(i, 1))
+    assert len(enqueued) == 1
+
+    search.snapshot_job({})
+    assert (tmp_path / "search.npz").exists()
+    search.index_messages(messages(40, 1))
+    assert len(enqueued) == 1
+    for i in range(41, 45):
+        search.index_messages(messages(i, 1))
+    assert len(enqueued) == 2
+
+
+def test_snapshot_round_trip_with_a_very_long_token(tmp_path, monkeypatch):
+    index = search.SearchIndex()
+    batch = messages(0, 200)
+    batch[0].text = "ha" * 1000 + " hello café"
+    batch[1].mood = "nova"
+    index.add(batch)
+    path = str(tmp_path / "search.npz")
+    index.save(path)
+    with search.np.load(path) as arrays:
+        sizes = {name: arrays[name].nbytes for name in arrays.files}
+    # One long term must not widen every entry
+    assert sizes["terms"] < 10_000
+    loaded = search.SearchIndex.load(path)
+    assert loaded.message_ids == index.message_ids
+    assert loaded.search(["café"], k=5) == index.search(["café"], k=5)
+    assert loaded.search(["hello"], k=3, mood="nova") == index.search(["hello"], k=3, mood="nova")
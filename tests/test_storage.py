@@ -0,0 +1,25 @@
+import pytest
+
+from backend import storage
+
+
+def test_activity_creates_missing_sqlite_sessions():
+    store = storage.SQLiteStorage(":memory:")
+    store.update_session_activity({"a": "2026-01-01T00:00:00+00:00"})
+    store.save_messages([], {"b": "2026-01-02T00:00:00+00:00"})
+    store.update_session_activity({"a": "2026-01-03T00:00:00+00:00"})
+    sessions = {s["session_id"]: s for s in store.export_documents("sessions")}
+    assert sessions["a"] == {"session_id": "a", "created_at": "2026-01-01T00:00:00+00:00", "last_activity": "2026-01-03T00:00:00+00:00"}
+    assert sessions["b"]["last_activity"] == "2026-01-02T00:00:00+00:00"
+    assert store.latest_session()["session_id"] == "a"
+
+
+def test_incomplete_backend_fails_at_instantiation():
+    class PartialStorage(storage.Storage):
+        def latest_session(self):
+            return None
+
+    with pytest.raises(TypeError, match="abstract"):
+        PartialStorage()
+    assert not storage.SQLiteStorage.__abstractmethods__
+    assert not storage.FirestoreStorage.__abstractmethods__
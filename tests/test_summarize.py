@@ -0,0 +1,33 @@
+import threading
+import time
+
+from backend import llm
+
+
+def test_parallel_summaries_share_one_deadline(monkeypatch):
+    release = threading.Event()
+
+    def summarize(cluster):
+        if cluster == ["hang"]:
+            release.wait(5)
+        return cluster[0], [f"about {cluster[0]}"]
+
+    monkeypatch.setattr(llm, "summarize_cluster", summarize)
+    monkeypatch.setattr(llm, "GEMINI_CALL_TIMEOUT", 0.2)
+    clusters = [["a"], ["hang"], ["hang"], ["b"]]
+    started = time.monotonic()
+    try:
+        results = llm.summarize_clusters(clusters, mode="parallel")
+    finally:
+        release.set()
+    # Four clusters fit in one wave of GEMINI_CONCURRENCY, so one timeout bounds the wait
+    assert time.monotonic() - started < 0.2 * 2
+    assert results == [("a", ["about a"]), (None, None), (None, None), ("b", ["about b"])]
+
+
+def test_parallel_summary_errors_yield_empty_results(monkeypatch):
+    def summarize(cluster):
+        raise ValueError("bad json")
+
+    monkeypatch.setattr(llm, "summarize_cluster", summarize)
+    assert llm.summarize_clusters([["a"], ["b"]], mode="parallel") == [(None, None), (None, None)]
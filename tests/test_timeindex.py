@@ -0,0 +1,60 @@
+from datetime import datetime, timezone
+
+import pytest
+
+from backend import timeindex
+
+# A Wednesday
+NOW = datetime(2026, 10, 14, 15, 30, tzinfo=timezone.utc)
+
+
+def parsed(text: str):
+    time_range = timeindex.parse_time_range(text, NOW)
+    return time_range and time_range.to_dict()
+
+
+@pytest.mark.parametrize("text", [
+    "busy today, talk later",
+    "I'm flying on friday",
+    "see you friday evening",
+    "you may 2x the recipe",
+    "mar 3 points on the board",
+    "will it rain tomorrow?",
+    "I ran last friday",
+    "went hiking 2 days ago",
+    "finished it earlier today",
+    "it rained for the past week",
+])
+def test_ordinary_chat_does_not_trigger_recall(text):
+    assert timeindex.recall(text, NOW) is None
+
+
+@pytest.mark.parametrize("text, label", [
+    ("what did we discuss on friday?", "on friday"),
+    ("remember what I said yesterday evening", "yesterday evening"),
+    ("we talked about it 3 days ago", "3 days ago"),
+    ("earlier today you mentioned a book", "earlier today"),
+    ("what was that song from last week", "last week"),
+])
+def test_recall_cues(text, label):
+    assert timeindex.has_recall_cue(text)
+    assert parsed(text)["label"] == label
+
+
+def test_weekdays_resolve_to_the_past():
+    assert parsed("what did we say on friday")["start"].startswith("2026-10-09")
+    assert parsed("what did we say on wednesday")["start"].startswith("2026-10-07")
+
+
+def test_ambiguous_month_names_need_a_day_form_or_year():
+    assert parsed("you may 2x the recipe") is None
+    assert parsed("mar 3 points") is None
+    assert parsed("what did we discuss on may 2nd")["start"].startswith("2026-05-02")
+    assert parsed("remember 3 march")["start"].startswith("2026-03-03")
+    assert parsed("what did we say on may 2, 2024")["start"].startswith("2024-05-02")
+    assert parsed("what did we say on october 2")["start"].startswith("2026-10-02")
+
+
+def test_future_dates_are_not_ranges():
+    assert parsed("tonight") is None
+    assert parsed("what did we say on december 24, 2026") is None